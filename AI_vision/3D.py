@@ -70,13 +70,9 @@ def motor_control_loop():
         else:
             if last_target is not None and (time.time() - last_detection_time) < detection_timeout:
                 mot1, mot2, mot3 = tr.direc(last_target[0], last_target[1], 320, 240)
-                tr.send_command(mot1)
-                tr.send_command(mot2)
-                tr.send_command(mot3)
+                tr.send_motors(mot1, mot2, mot3)
             else:
-                tr.send_command((1, 0))
-                tr.send_command((2, 0))
-                tr.send_command((3, 0))
+                tr.send_motors((1, 0), (2, 0), (3, 0))
         time.sleep(0.05)
 
 motor_thread = threading.Thread(target=motor_control_loop, daemon=True)
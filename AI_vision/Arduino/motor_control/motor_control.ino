@@ -7,6 +7,39 @@ Adafruit_DCMotor *mot1 = AFMS.getMotor(1);
 Adafruit_DCMotor *mot2 = AFMS.getMotor(2);
 Adafruit_DCMotor *mot3 = AFMS.getMotor(3);
 
+// Binary frame (see AI_vision/protocol.py):
+// 0xAA 0x55 | seq | mot1 mot2 mot3 (int16 little endian) | checksum (XOR of seq + payload)
+const byte SYNC1 = 0xAA;
+const byte SYNC2 = 0x55;
+const int BODY_SIZE = 7;
+
+byte body[BODY_SIZE];
+int state = 0;  // 0: wait SYNC1, 1: wait SYNC2, 2: body, 3: checksum
+int count = 0;
+byte lastSeq = 0;
+
+
+void setMotor(Adafruit_DCMotor *mot, int speed){
+  if(speed>=0){
+    mot->setSpeed(speed);
+    mot->run(FORWARD);
+  }
+  else{
+    mot->setSpeed(-speed);
+    mot->run(BACKWARD);
+  }
+}
+
+int readSpeed(int offset){
+  return (int16_t)(body[offset] | (body[offset + 1] << 8));
+}
+
+void applyFrame(){
+  lastSeq = body[0];
+  setMotor(mot1, constrain(readSpeed(1), -255, 255));
+  setMotor(mot2, constrain(readSpeed(3), -255, 255));
+  setMotor(mot3, constrain(readSpeed(5), -255, 255));
+}
 
 void setup(){
   Serial.begin(9600);
@@ -17,43 +50,27 @@ void setup(){
 }
 
 void loop() {
-  if (Serial.available()>0){
-    String command = Serial.readStringUntil('\n');
-    int id = command.substring(0, command.indexOf(',')).toInt();
-    int speed = command.substring(command.indexOf(',') + 1).toInt();
-    switch(id){
+  while (Serial.available()>0){
+    byte b = Serial.read();
+    switch(state){
+      case 0:
+        if(b == SYNC1) state = 1;
+        break;
       case 1:
-        if(speed>=0){
-          mot1->setSpeed(speed);
-          mot1->run(FORWARD);
-        }
-        else{
-          mot1->setSpeed(-speed);
-          mot1->run(BACKWARD);
-        }
+        if(b == SYNC2) state = 2, count = 0;
+        else if(b != SYNC1) state = 0;
         break;
       case 2:
-        if(speed>=0){
-          mot2->setSpeed(speed);
-          mot2->run(FORWARD);
-        }
-        else{
-          mot2->setSpeed(-speed);
-          mot2->run(BACKWARD);
-        }
-        break;
-      case 3:
-        if(speed>=0){
-          mot3->setSpeed(speed);
-          mot3->run(FORWARD);
-        }
-        else{
-          mot3->setSpeed(-speed);
-          mot3->run(BACKWARD);
-        }
+        body[count++] = b;
+        if(count == BODY_SIZE) state = 3;
         break;
-      default :
+      case 3: {
+        byte sum = 0;
+        for(int i = 0; i < BODY_SIZE; i++) sum ^= body[i];
+        if(sum == b) applyFrame();
+        state = 0;
         break;
+      }
     }
   }
 }
@@ -5,29 +5,20 @@ import time
 import threading
 import queue
 import tracking as tr
+from colorTracker import ColorTracker
+from colorLut import ColorLUT
+from viewer import open_viewer
 
 
-def hsv(hsv):
-    h, s, v = hsv
-    opencv_h = int((h / 360) * 179)
-    opencv_s = int((s / 100) * 255)
-    opencv_v = int((v / 100) * 255)
-
-    return [opencv_h, opencv_s, opencv_v]
-
-
-# Specifying upper and lower ranges of color to detect in hsv format
-lower = np.array(hsv((300, 40, 10)))
-upper = np.array(hsv((360, 90, 100)))
-
-#lower = np.array([65, 100, 20])
-#upper = np.array([80, 255, 255])
-
-lower2 = np.array([170, 150, 20])
-upper2 = np.array([179, 255, 255])
+# Colors to detect: the "tracking" palette of colors.json (OpenCV HSV ranges,
+# e.g. hsv((300, 40, 10)) - hsv((360, 90, 100)) and [170, 150, 20] - [179, 255, 255]),
+# classified for all colors at once through a cached lookup table
+tracker = ColorTracker(lut=ColorLUT.load(palette="tracking"), scale=0.25, min_area=200, rotated=True)
 
 # Capturing webcam footage
 webcam_video = cv2.VideoCapture(0)
+# Windows, or headless / MJPEG stream (viewer.py): nothing is drawn when nobody watches
+viewer = open_viewer("window")
 data_queue = queue.Queue()
 
 
@@ -47,50 +38,44 @@ count = 0
 while True:
     success, video = webcam_video.read()  # Reading webcam footage
 
-    img = cv2.cvtColor(video, cv2.COLOR_BGR2HSV)  # Converting BGR image to HSV format
+    # Best blob of each color on a downscaled frame, no per-contour loop
+    blobs = tracker.detect(video)
+    target = tracker.best(blobs)
 
-    mask = cv2.inRange(img, lower, upper)  # Masking the image to find our color
-    mask += cv2.inRange(img, lower2, upper2) # Adding other mask
+    draw = viewer.wants_frame()
+    if draw:
+        cv2.circle(video, (0, 0), 50, (255, 0, 0), -1)
+    if target is not None and rect_type == 1:
+        c_x, c_y = target.box[0] + target.box[2] // 2, target.box[1] + target.box[3] // 2  # center
+        if draw:
+            box = cv2.boxPoints(target.rect)
+            box = np.int64(box)
+            cv2.drawContours(video, [box], 0, (0, 0, 255), 4)
+            cv2.circle(video, (c_x, c_y), 5, (0, 0, 255), -1)  # Red dot at the center
+        count += 1
 
-    mask_contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL,
-                                                cv2.CHAIN_APPROX_SIMPLE)  # Finding contours in mask image
+        # One command per frame, toward the largest blob
+        mot1, mot2, mot3 = tr.direc(c_x, c_y, 320, 240)
+        tr.send_motors(mot1, mot2, mot3)
 
-    # Finding position of all contours
-    cv2.circle(video, (0, 0), 50, (255, 0, 0), -1)
-    if len(mask_contours) != 0:
-        for mask_contour in mask_contours:
-            if cv2.contourArea(mask_contour) > 200 and rect_type == 1:
-                x, y, w, h = cv2.boundingRect(mask_contour)  # Getting the coordinate
+        if count % 10 == 0:
+            print(c_x-320, c_y-240)
 
-                rect = cv2.minAreaRect(mask_contour)
-                box = cv2.boxPoints(rect)
-                box = np.int64(box)
-                cv2.drawContours(video, [box], 0, (0, 0, 255), 4)
-                c_x = x + w // 2  # center in x
-                c_y = y + h // 2
-                cv2.circle(video, (c_x, c_y), 5, (0, 0, 255), -1)  # Red dot at the center
-                count += 1
-
-                mot1, mot2, mot3 = tr.direc(c_x, c_y, 320, 240)
-                tr.send_command(mot1)
-                tr.send_command(mot2)
-                tr.send_command(mot3)
+        # data_queue.put((c_x, c_y))
 
-                if count % 10 == 0:
-                    print(c_x-320, c_y-240)
+    if draw:
+        mask = tracker.masks["target"]
 
-                # data_queue.put((c_x, c_y))
+        viewer.show(mask, "mask image")  # Displaying mask image
 
-    cv2.imshow("mask image", mask)  # Displaying mask image
+        viewer.show(video)  # Displaying webcam image
 
-    cv2.imshow("window", video)  # Displaying webcam image
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        tr.send_command((1, 0))
-        tr.send_command((2, 0))
-        tr.send_command((3, 0))
+    if viewer.poll() == ord('q'):
+        tr.send_motors((1, 0), (2, 0), (3, 0))
         break
 
+viewer.close()
+
 """        for mask_contour in mask_contours:
             if cv2.contourArea(mask_contour) > 300 and rect_type == 0:
                 x, y, w, h = cv2.boundingRect(mask_contour)
@@ -1,7 +1,10 @@
 import serial
 import time
+import protocol
 
 arduino = serial.Serial(port='COM6', baudrate=9600, timeout=1)
+speeds = [0, 0, 0]
+seq = 0
 
 def unocom():
     # Remplacez 'COM3' par le port COM de votre Arduino
@@ -17,13 +20,15 @@ def unocom():
 
 
 def send_command(motor_id, speed):
-    """Envoie une commande au format 'motor_id,speed' à l'Arduino."""
-    if motor_id in [1, 2, 3] and 0 <= speed <= 255:
-        command = f"{motor_id},{speed}\n"
-        arduino.write(command.encode()) # Envoyer la commande encodée en bytes
-        time.sleep(0.1) # Attendre un court instant pour laisser l'Arduino répondre
-        response = arduino.readline().decode('utf-8').rstrip() # Lire la réponse
-        print(f"Arduino: {response}")
+    """Envoie une trame binaire (voir protocol.py) avec la nouvelle vitesse du moteur."""
+    global seq
+    if motor_id in [1, 2, 3] and -255 <= speed <= 255:
+        speeds[motor_id - 1] = speed
+        frame = protocol.encode_motors(speeds, seq)
+        seq = (seq + 1) & 0xFF
+        arduino.write(frame) # Envoyer la trame
+        print(f"Trame envoyée: {frame.hex(' ')} {speeds}")
+        time.sleep(0.1) # Laisser le moteur tourner un court instant
     else:
         print("Commande invalide !")
 
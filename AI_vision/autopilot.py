@@ -0,0 +1,107 @@
+"""
+Decision logic of finalRomarin: detections -> target -> motor commands.
+
+Everything that decides what the submarine does lives here, with the time passed
+in by the caller instead of read from the clock, so the live script and the
+replay of a recorded dive (replay.py) run exactly the same code:
+
+    autopilot = Autopilot(model.names, sorting="cell phone", detection_timeout=1.0)
+    autopilot.on_detections(detections, t)      # model output for the frame taken at t
+    box = autopilot.on_frame(image, t, now)     # every frame: tracker, stale cache
+    box = autopilot.on_tracked(box, now)        # or with a tracker box from a recording
+    command = autopilot.motor_step(keys, now)   # motor tick -> motor tuples or None
+"""
+from multiTracker import MultiTracker
+from tracker import TargetTracker
+from pid import MotorController
+from control import manual_commands
+
+
+class Autopilot:
+    """
+    names: class names of the model. sorting: only this class is followed (None = all).
+    detection_timeout: seconds after the last detection before the target is dropped.
+    """
+
+    def __init__(self, names, sorting=None, detection_timeout=1.0, controller=None, tracker=None):
+        self.names = names
+        self.sorting = sorting
+        self.detection_timeout = detection_timeout
+        # Multi-object tracker: persistent ids, we keep steering toward the same track
+        self.mot = MultiTracker()
+        # Kalman + optical flow tracker: updates the target on every frame between detections
+        self.tracker = tracker or TargetTracker(timeout=detection_timeout)
+        # PID steering with slew-rate limit; only emits commands that changed meaningfully
+        self.controller = controller or MotorController()
+        self.target_id = None
+        # Cached detection info:
+        # - last_target: the center (x, y) of the target
+        # - last_bbox: bounding box info for drawing (x1, y1, x2, y2, class_name, confidence)
+        self.last_target = None
+        self.last_bbox = None
+        self.last_detection_time = 0.0
+        # Stats
+        self.stale_timeouts = 0
+        self.target_changes = 0
+
+    def candidates(self, detections):
+        """Detections passing the sorting filter (e.g., only "cell phone")."""
+        return [det for det in detections if self.sorting is None or self.names[det[5]] == self.sorting]
+
+    def select_target(self, detections):
+        """Detection belonging to the current target track (used by RoiDetector to lock the ROI)."""
+        return self.mot.match_target(self.candidates(detections))
+
+    def on_detections(self, detections, t):
+        """New model output for the frame captured at t."""
+        self.mot.update(self.candidates(detections))
+        track = self.mot.select()
+        if track is None or track.misses != 0:
+            return
+        if track.id != self.target_id:
+            # New target: don't let the tracker blend it with the previous one
+            self.target_id = track.id
+            self.target_changes += 1
+            self.tracker.reset()
+        x1, y1, x2, y2 = track.box
+        self.last_target = (int((x1 + x2) // 2), int((y1 + y2) // 2))
+        self.last_bbox = (int(x1), int(y1), int(x2), int(y2), self.names[track.cls], round(track.conf, 2))
+        self.last_detection_time = t
+        self.tracker.seed((x1, y1, x2, y2), t)
+
+    def on_frame(self, image, t, now):
+        """Every captured frame (taken at t, processed at now); returns the tracker box or None."""
+        return self.on_tracked(self.tracker.update(image, t), now)
+
+    def on_tracked(self, box, now):
+        """Tracker box (or None) of the current frame, e.g. from a recording; returns it."""
+        # Move the cached target with the tracker so the motor loop steers on fresh positions
+        if box is not None and self.last_bbox is not None:
+            x1, y1, x2, y2 = box
+            self.last_target = (int((x1 + x2) // 2), int((y1 + y2) // 2))
+            self.last_bbox = tuple(int(v) for v in box) + self.last_bbox[4:]
+        # If the last detection is too old, clear cache (stale)
+        if now - self.last_detection_time > self.detection_timeout:
+            if self.last_target is not None:
+                self.stale_timeouts += 1
+            self.last_target = None
+            self.last_bbox = None
+        return box
+
+    def motor_step(self, keys, now):
+        """
+        One motor tick. Manual keys have the highest priority; otherwise steer toward
+        a fresh target or stop. Returns the motor tuples to send, or None (unchanged).
+        """
+        if any(keys):
+            self.controller.override()
+            return manual_commands(keys)
+        if self.last_target is not None and (now - self.last_detection_time) < self.detection_timeout:
+            return self.controller.update(self.last_target, now)
+        # No fresh detection; send stop commands
+        return self.controller.stop(now)
+
+    def stats(self):
+        return {"stale_timeouts": self.stale_timeouts, "target_changes": self.target_changes,
+                "commands": self.controller.updates - self.controller.suppressed,
+                "suppressed": self.controller.suppressed}
@@ -0,0 +1,349 @@
+"""
+Stage-by-stage benchmark of the vision pipelines:
+
+    capture -> preprocess -> inference -> postprocess -> control -> serial encode
+
+on recorded frames (video file, image folder, dive folder written by recorder.py,
+camera) or synthetic ones. Each path reports p50/p95/p99 per stage and per frame,
+frames per second, CPU use and RSS, and everything is saved as JSON so runs can be
+compared:
+
+    python benchmark.py --frames 500 --json bench/before.json
+    python benchmark.py --source dives/20250612-101500 --paths yolo --json bench/after.json --compare bench/before.json
+
+Paths:
+    yolo    OnnxDetector (finalRomarin): letterbox / session run / decode + NMS
+    color   ColorTracker with the HSV ranges of the "tracking" palette (ColorTracking.py)
+    lut     the same tracker classifying through the cached lookup table
+    shapes  code2024: resize + threshold / contours + analyze_shapes / largest shape
+
+The control stage is the MotorController of finalRomarin steering toward the
+target of the frame, the serial stage encodes the resulting speeds as one
+protocol frame. Frames are processed back to back, one path at a time, all in
+the same process: the peak RSS of a path includes the ones run before it.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import cv2
+import numpy as np
+import protocol
+from frameSource import FrameSource, open_source
+from pid import MotorController
+
+STAGES = ("capture", "preprocess", "inference", "postprocess", "control", "serial")
+
+
+# ================================================
+# Frame sources
+# ================================================
+class SyntheticSource(FrameSource):
+    """
+    Dark water with moving objects every path can find: a red-magenta disc (the
+    "tracking" palette), red, green and blue shapes (the code2024 palette).
+    """
+
+    def __init__(self, size=(640, 480), fps=30.0, seed=0, buffers=3, pool_size=4):
+        super().__init__(size, buffers, pool_size)
+        self.fps = fps
+        rng = np.random.default_rng(seed)
+        noise = rng.normal(0, 4, (self.height, self.width, 1))
+        self.background = np.clip(np.array([40, 30, 10]) + noise, 0, 255).astype(np.uint8)
+        self.phase = rng.uniform(0, 2 * np.pi, 5)
+
+    def _position(self, k, t):
+        return (int(self.width * (0.5 + 0.35 * np.sin(0.7 * t + self.phase[k]))),
+                int(self.height * (0.5 + 0.35 * np.cos(0.5 * t + 2 * self.phase[k]))))
+
+    def read(self):
+        t = self.frames / self.fps
+        image = self.next_buffer()
+        if image is None:
+            image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            self.stats.allocated(image.nbytes)
+        np.copyto(image, self.background)
+        cv2.circle(image, self._position(0, t), 40, (60, 20, 220), -1)
+        x, y = self._position(1, t)
+        cv2.fillPoly(image, [np.array([(x, y - 35), (x - 35, y + 30), (x + 35, y + 30)])], (30, 30, 230))
+        x, y = self._position(2, t)
+        cv2.rectangle(image, (x - 30, y - 30), (x + 30, y + 30), (30, 230, 30), -1)
+        x, y = self._position(3, t)
+        cv2.rectangle(image, (x - 45, y - 20), (x + 45, y + 20), (230, 30, 30), -1)
+        self.frames += 1
+        return True, image, t
+
+
+class DiveSource(FrameSource):
+    """Frames of a dive recorded by recorder.py."""
+
+    def __init__(self, path, size=(640, 480), buffers=3, pool_size=4):
+        from recorder import DiveReader
+        super().__init__(size, buffers, pool_size)
+        self.reader = DiveReader(path)
+        self.iterator = self.reader.frames()
+
+    def read(self):
+        item = next(self.iterator, None)
+        if item is None:
+            return False, None, None
+        t, image = item
+        self.frames += 1
+        return True, self.store(image), t
+
+
+def make_source(spec, size, fps, seed):
+    if spec in (None, "synthetic"):
+        return SyntheticSource(size, fps=fps, seed=seed)
+    if os.path.exists(os.path.join(str(spec), "meta.json")):
+        return DiveSource(spec, size)
+    return open_source(spec, size=size)
+
+
+# ================================================
+# Paths: run(image) times its own stages, returns the target center or None
+# ================================================
+class YoloPath:
+    name = "yolo"
+
+    def __init__(self, model, threads=None):
+        from detector import OnnxDetector
+        self.detector = OnnxDetector(model, threads=threads)
+
+    def run(self, image, lap):
+        d = self.detector
+        scale, pad_x, pad_y = d.preprocess(image)
+        lap("preprocess")
+        d.session.run_with_iobinding(d.binding)
+        output = d.output if d.output is not None else d.binding.copy_outputs_to_cpu()[0]
+        lap("inference")
+        detections = d.postprocess(output, scale, pad_x, pad_y, image.shape)
+        target = None
+        if detections:
+            x1, y1, x2, y2, _, _ = max(detections, key=lambda det: det[4])
+            target = (int((x1 + x2) // 2), int((y1 + y2) // 2))
+        lap("postprocess")
+        return target
+
+
+class ColorPath:
+    name = "color"
+
+    def __init__(self, lut=False):
+        from colorTracker import ColorTracker
+        from colorLut import ColorLUT, CONFIG
+        if lut:
+            self.name = "lut"
+            self.tracker = ColorTracker(lut=ColorLUT.load(palette="tracking"), min_area=200, rotated=True)
+        else:
+            with open(CONFIG) as f:
+                colors = json.load(f)["tracking"]["colors"]
+            self.tracker = ColorTracker(colors, min_area=200, rotated=True)
+
+    def run(self, image, lap):
+        tracker = self.tracker
+        tracker._prepare(image)
+        lap("preprocess")
+        blobs = {name: tracker._best_blob(name, tracker.mask(name)) for name in tracker.colors}
+        lap("inference")
+        target = tracker.best(blobs)
+        lap("postprocess")
+        return None if target is None else target.center
+
+
+class ShapePath:
+    name = "shapes"
+
+    def __init__(self, width=300):
+        import code2024
+        self.analyze = code2024.analyze_shapes
+        self.width = width
+
+    def run(self, image, lap):
+        # Same steps as code2024.detect_shapes_and_print_results (imutils.resize = INTER_AREA)
+        ratio = image.shape[1] / float(self.width)
+        resized = cv2.resize(image, (self.width, int(image.shape[0] / ratio)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        thresh = cv2.threshold(blurred, 60, 255, cv2.THRESH_BINARY)[1]
+        lap("preprocess")
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        shapes = self.analyze(image, contours, ratio)
+        lap("inference")
+        target = None
+        if shapes:
+            _, _, target, _, _ = max(shapes, key=lambda shape: cv2.contourArea(shape[0]))
+        lap("postprocess")
+        return target
+
+
+# ================================================
+# Measurements
+# ================================================
+def rss_mb():
+    """Current resident set size (MiB), peak on systems without /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def summarize(samples):
+    """Latency percentiles (ms) of a list of durations (s)."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"count": len(ms), "mean": float(ms.mean()), "p50": float(p50), "p95": float(p95),
+            "p99": float(p99), "max": float(ms.max())}
+
+
+def bench(path, source, frames=300, warmup=20):
+    """Run one path over the source; returns its stats (warm-up frames excluded)."""
+    controller = MotorController(center=(source.width // 2, source.height // 2))
+    times = {stage: [] for stage in STAGES}
+    totals = []
+    targets = 0
+    seq = 0
+    clock = [0.0]
+
+    def lap(stage):
+        now = time.perf_counter()
+        times[stage].append(now - clock[0])
+        clock[0] = now
+
+    n = 0
+    while n < warmup + frames:
+        if n == warmup:
+            # Measured run starts here
+            times = {stage: [] for stage in STAGES}
+            totals.clear()
+            targets = 0
+            wall, cpu = time.perf_counter(), time.process_time()
+        start = clock[0] = time.perf_counter()
+        ok, image, t = source.read()
+        if not ok:
+            break
+        lap("capture")
+        target = path.run(image, lap)
+        t = n / 30.0 if t is None else t
+        command = controller.update(target, t) if target is not None else controller.stop(t)
+        speeds = controller.last_sent if command is None else tuple(s for _, s in command)
+        lap("control")
+        protocol.encode_motors(speeds, seq)
+        seq += 1
+        lap("serial")
+        totals.append(clock[0] - start)
+        targets += target is not None
+        n += 1
+    if n <= warmup:
+        raise RuntimeError(f"{path.name}: only {n} frames, not enough past the {warmup} warm-up frames")
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    measured = n - warmup
+    return {
+        "frames": measured,
+        "fps": measured / wall,
+        "cpu": cpu / wall,                  # cores busy on average (1.0 = one full core)
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+        "target_ratio": targets / measured,
+        "stages": {stage: summarize(samples) for stage, samples in times.items()},
+        "total": summarize(totals),
+    }
+
+
+def environment():
+    info = {"python": platform.python_version(), "machine": platform.machine(),
+            "system": platform.platform(), "cpus": os.cpu_count(),
+            "opencv": cv2.__version__, "numpy": np.__version__}
+    try:
+        import onnxruntime
+        info["onnxruntime"] = onnxruntime.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def make_path(name, args):
+    if name == "yolo":
+        return YoloPath(args.model, threads=args.threads)
+    if name == "color":
+        return ColorPath()
+    if name == "lut":
+        return ColorPath(lut=True)
+    if name == "shapes":
+        return ShapePath()
+    raise ValueError(f"unknown path: {name}")
+
+
+def print_results(results, previous=None):
+    for name, r in results["paths"].items():
+        print(f"{name}: {r['frames']} frames, {r['fps']:.1f} FPS, CPU {r['cpu'] * 100:.0f}%, "
+              f"RSS {r['rss_mb']:.0f} MiB (peak {r['peak_rss_mb']:.0f}), target in {r['target_ratio'] * 100:.0f}%")
+        old = (previous or {}).get("paths", {}).get(name)
+        rows = list(r["stages"].items()) + [("total", r["total"])]
+        for stage, s in rows:
+            if not s["count"]:
+                continue
+            line = f"  {stage:<12} p50 {s['p50']:7.2f}  p95 {s['p95']:7.2f}  p99 {s['p99']:7.2f} ms"
+            before = old["total"] if old and stage == "total" else (old or {}).get("stages", {}).get(stage)
+            if before and before.get("count"):
+                line += f"   p50 {(s['p50'] / before['p50'] - 1) * 100 if before['p50'] else 0:+5.0f}%" \
+                        f"  p95 {(s['p95'] / before['p95'] - 1) * 100 if before['p95'] else 0:+5.0f}%"
+            print(line)
+        if old:
+            print(f"  fps {old['fps']:.1f} -> {r['fps']:.1f}, CPU {old['cpu'] * 100:.0f}% -> {r['cpu'] * 100:.0f}%, "
+                  f"RSS {old['rss_mb']:.0f} -> {r['rss_mb']:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the vision pipelines")
+    parser.add_argument("--source", default="synthetic",
+                        help="synthetic, a video file, an image folder, a dive folder, a camera index or picam")
+    parser.add_argument("--paths", nargs="+", default=["yolo", "color", "lut", "shapes"],
+                        choices=["yolo", "color", "lut", "shapes"])
+    parser.add_argument("--frames", type=int, default=300, help="measured frames per path")
+    parser.add_argument("--warmup", type=int, default=20, help="frames run before measuring")
+    parser.add_argument("--size", type=int, nargs=2, default=(640, 480), metavar=("W", "H"))
+    parser.add_argument("--model", default="../models/best.onnx")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(),
+               "settings": vars(args), "paths": {}}
+    for name in args.paths:
+        if name == "yolo" and not os.path.exists(args.model):
+            print(f"yolo: skipped, no model at {args.model}")
+            continue
+        path = make_path(name, args)
+        source = make_source(args.source, tuple(args.size), 30.0, args.seed)
+        try:
+            results["paths"][name] = bench(path, source, args.frames, args.warmup)
+        finally:
+            source.close()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import cv2  # OpenCV bibliothèque open source spécialisée dans le traitement
 import numpy as np  # simplifier certaines opérations courantes liées au traitement d'images
 import imutils
 import os
+from colorLut import ColorLUT
 
 #detection formes
 class ShapeDetector:
@@ -9,60 +10,87 @@ class ShapeDetector:
         pass
  
     def detect(self, c):
-        shape = "unidentified"
+        vertices, aspect, circularity, _ = shape_features([c])
+        return str(self.classify(vertices, aspect, circularity)[0])
+
+    @staticmethod
+    def classify(vertices, aspect, circularity):
+        """Shape names of many contours at once, from the arrays of shape_features."""
+        conditions = [vertices == 3,
+                      (vertices == 4) & (aspect >= 0.95) & (aspect <= 1.05),
+                      vertices == 4,
+                      vertices == 5,
+                      vertices == 6,
+                      (vertices == 10) | (vertices == 12),
+                      circularity >= 0.7]
+        shapes = ["triangle", "carre", "rectangle", "pentagone", "hexagone", "etoile", "Panneau STOP"]
+        return np.select(conditions, shapes, "unidentified")
+
+def shape_features(contours):
+    """Per contour: vertex count of the approximated polygon, its aspect ratio, circularity and area."""
+    n = len(contours)
+    vertices = np.zeros(n, dtype=int)
+    aspect = np.zeros(n)
+    circularity = np.zeros(n)
+    area = np.zeros(n)
+    for i, c in enumerate(contours):
         peri = cv2.arcLength(c, True)
         approx = cv2.approxPolyDP(c, 0.02 * peri, True)
- 
-        if len(approx) == 3:
-            shape = "triangle"
-        elif len(approx) == 4:
-            (x, y, w, h) = cv2.boundingRect(approx)
-            ar = w / float(h)
-            shape = "carre" if ar >= 0.95 and ar <= 1.05 else "rectangle"
-        elif len(approx) == 5:
-            shape = "pentagone"
-        elif len(approx) == 6:
-            shape = "hexagone"
-        elif len(approx) == 10 or len(approx) == 12:
-            shape = "etoile"
-        else:
-            area = cv2.contourArea(c)
-            perimeter = cv2.arcLength(c, True)
-            circularity = 4 * np.pi * (area / (perimeter ** 2))
-            if circularity >= 0.7:
-                shape = "Panneau STOP"
- 
-        return shape
+        (x, y, w, h) = cv2.boundingRect(approx)
+        vertices[i] = len(approx)
+        aspect[i] = w / float(h) if h else 0.0
+        area[i] = cv2.contourArea(c)
+        circularity[i] = 4 * np.pi * (area[i] / (peri ** 2)) if peri else 0.0
+    return vertices, aspect, circularity, area
 
 #detection couleurs
+# Ranges in the "shapes" palette of colors.json (dominant channel otherwise), through a lookup table
+SHAPE_COLORS = ColorLUT.load(palette="shapes")
+
 def convert_rgb_to_names(rgb_tuple):
-    r, g, b = rgb_tuple
- 
-    red_lower = (200, 0, 0)
-    red_upper = (255, 100, 100)
-    green_lower = (0, 200, 0)
-    green_upper = (100, 255, 100)
-    blue_lower = (0, 0, 200)
-    blue_upper = (100, 100, 255)
- 
-    if red_lower[0] <= r <= red_upper[0] and red_lower[1] <= g <= red_upper[1] and red_lower[2] <= b <= red_upper[2]:
-        return 'rouge'
-    elif green_lower[0] <= r <= green_upper[0] and green_lower[1] <= g <= green_upper[1] and green_lower[2] <= b <= green_upper[2]:
-        return 'vert'
-    elif blue_lower[0] <= r <= blue_upper[0] and blue_lower[1] <= g <= blue_upper[1] and blue_lower[2] <= b <= blue_upper[2]:
-        return 'bleu'
-    else:
-        max_component = max(r, g, b)
-        if max_component == r:
-            return 'rouge'
-        elif max_component == g:
-            return 'vert'
-        else:
-            return 'bleu'
+    return SHAPE_COLORS.name_of_rgb(rgb_tuple)
+
+#analyse de toutes les formes d'une image en une passe
+def analyze_shapes(image, contours, scale=1.0):
+    """
+    Shape, center, mean color and color name of every contour of image (BGR).
+    contours may come from a downscaled copy: they are multiplied by scale, and
+    the mean colors are taken at the resolution of image, as the per-contour
+    masks did. The contours are drawn once into a label image and one reduction
+    over its foreground pixels gives all mean colors. The means are taken before
+    any outline is drawn on image, the old loop mixed the green outlines in.
+    Contours with a zero area are skipped.
+    Returns a list of (scaled contour, shape, (cX, cY), mean RGB, color name).
+    """
+    vertices, aspect, circularity, area = shape_features(contours)
+    keep = np.flatnonzero(area > 0)
+    if len(keep) == 0:
+        return []
+    shapes = ShapeDetector.classify(vertices[keep], aspect[keep], circularity[keep])
+
+    labels = np.zeros(image.shape[:2], dtype=np.int32)
+    scaled, centers = [], []
+    for label, i in enumerate(keep, 1):
+        c = (contours[i].astype("float") * scale).astype("int")
+        cv2.drawContours(labels, [c], -1, label, -1)
+        M = cv2.moments(contours[i])
+        scaled.append(c)
+        centers.append((int((M["m10"] / M["m00"]) * scale), int((M["m01"] / M["m00"]) * scale)))
+    pixels = np.flatnonzero(labels)
+    owner = labels.ravel()[pixels]
+    colors = image.reshape(-1, 3)[pixels]
+    n = len(keep) + 1
+    counts = np.maximum(np.bincount(owner, minlength=n), 1)
+    means_bgr = np.stack([np.bincount(owner, weights=colors[:, k], minlength=n)
+                          for k in range(3)], axis=1)[1:] / counts[1:, None]
+    # All mean colors through the lookup table at once
+    color_labels = SHAPE_COLORS.classify(np.rint(means_bgr).astype(np.uint8))
+    return [(c, str(shape), center, tuple(mean[::-1]),
+             SHAPE_COLORS.names[color - 1] if color else None)
+            for c, shape, center, mean, color in zip(scaled, shapes, centers, means_bgr, color_labels)]
 
 #traitement d'image & tracking
 def detect_shapes_and_print_results():
-    sd = ShapeDetector()
     cap = cv2.VideoCapture(0)  # 0 corresponds to the default webcam
  
     while True:
@@ -79,34 +107,19 @@ def detect_shapes_and_print_results():
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         thresh = cv2.threshold(blurred, 60, 255, cv2.THRESH_BINARY)[1]
  
-        cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         cnts = imutils.grab_contours(cnts)
  
-        for c in cnts:
-            M = cv2.moments(c)
-            if M["m00"] != 0:
-                cX = int((M["m10"] / M["m00"]) * ratio)
-                cY = int((M["m01"] / M["m00"]) * ratio)
- 
-                shape = sd.detect(c)
- 
-                c = c.astype("float")
-                c *= ratio
-                c = c.astype("int")
-                cv2.drawContours(frame, [c], -1, (0, 255, 0), 2)
- 
-                mask = np.zeros(frame.shape[:2], np.uint8)
-                cv2.drawContours(mask, [c], -1, 255, -1)
-                imgRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                mean = cv2.mean(imgRGB, mask=mask)[:3]
-                named_color = convert_rgb_to_names(mean)
+        # Shapes and mean colors of all contours at once, colors on the full frame
+        for c, shape, (cX, cY), mean, named_color in analyze_shapes(frame, cnts, ratio):
+            cv2.drawContours(frame, [c], -1, (0, 255, 0), 2)
  
-                mean2 = (255 - mean[0], 255 - mean[1], 255 - mean[2])
+            mean2 = (255 - mean[0], 255 - mean[1], 255 - mean[2])
  
-                objLbl = shape + " {}".format(named_color)
-                textSize = cv2.getTextSize(objLbl, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-                cv2.putText(frame, objLbl, (int(cX - textSize[0] / 2), int(cY + textSize[1] / 2)), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                            mean2, 2)
+            objLbl = shape + " {}".format(named_color)
+            textSize = cv2.getTextSize(objLbl, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+            cv2.putText(frame, objLbl, (int(cX - textSize[0] / 2), int(cY + textSize[1] / 2)), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        mean2, 2)
  
         cv2.imshow("Frame", frame)
  
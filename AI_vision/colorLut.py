@@ -0,0 +1,101 @@
+"""
+Color classification through a precomputed 3D lookup table.
+
+colors.json holds named palettes. Each one maps color names to ranges, in OpenCV
+HSV ("space": "hsv", H 0-179, S and V 0-255) or in RGB ("space": "rgb"). The
+first matching color wins; "fallback" (names for R, G, B) labels the remaining
+colors by their dominant channel, otherwise they are 0 = no color.
+
+The table is built once for bins^3 quantized BGR colors (32 -> 32 KB) and cached
+on disk, keyed by the palette content. Classifying a whole frame is then one
+fancy-index, whatever the number of colors; the price is that colors within one
+bin (8 levels at 32 bins) of a range border may fall on either side.
+
+    lut = ColorLUT.load("colors.json", "tracking")
+    labels = lut.classify(frame)           # uint8 (h, w), 0 = none, k = lut.names[k - 1]
+    name = lut.name_of_rgb((230, 40, 30))  # 'rouge' with the "shapes" palette
+"""
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "colors.json")
+
+
+class ColorLUT:
+    def __init__(self, names, table):
+        self.names = names                       # label k is names[k - 1]
+        self.table = table                       # uint8 (bins, bins, bins), indexed [b, g, r]
+        self.bins = table.shape[0]
+        self.bits = self.bins.bit_length() - 1
+        self.shift = 8 - self.bits
+        self.flat = table.ravel()
+        self.index_dtype = np.uint16 if 3 * self.bits <= 16 else np.uint32
+
+    @classmethod
+    def build(cls, palette, bins=32):
+        if bins & (bins - 1) or not 2 <= bins <= 256:
+            raise ValueError("bins must be a power of two between 2 and 256")
+        step = 256 // bins
+        centers = (np.arange(bins) * step + step // 2).astype(np.uint8)
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        bgr = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=-1).reshape(-1, 1, 3)
+        if palette.get("space", "hsv") == "hsv":
+            values = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        else:
+            values = np.ascontiguousarray(bgr[..., ::-1])
+
+        names = list(palette["colors"])
+        labels = np.zeros(len(bgr), dtype=np.uint8)
+        for k, name in enumerate(names, 1):
+            for lower, upper in palette["colors"][name]:
+                match = cv2.inRange(values, np.array(lower, dtype=np.uint8),
+                                    np.array(upper, dtype=np.uint8)).ravel() > 0
+                labels[match & (labels == 0)] = k
+        fallback = palette.get("fallback")
+        if fallback:
+            # Dominant channel, ties going to R then G like max(r, g, b)
+            rgb = bgr[:, 0, ::-1]
+            dominant = rgb.argmax(axis=1)
+            channel_labels = np.array([names.index(name) + 1 for name in fallback], dtype=np.uint8)
+            rest = labels == 0
+            labels[rest] = channel_labels[dominant[rest]]
+        return cls(names, labels.reshape(bins, bins, bins))
+
+    @classmethod
+    def load(cls, path=CONFIG, palette="tracking", bins=32, cache_dir=None):
+        """Palette from a colors.json file; the table is cached in cache_dir (lut_cache/ next to it)."""
+        with open(path) as f:
+            config = json.load(f)[palette]
+        key = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+        cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), "lut_cache")
+        cache = os.path.join(cache_dir, f"{palette}_{bins}_{key}.npy")
+        names = list(config["colors"])
+        if os.path.exists(cache):
+            return cls(names, np.load(cache))
+        lut = cls.build(config, bins)
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache, lut.table)
+        return lut
+
+    def classify(self, bgr, out=None):
+        """Label image (uint8, 0 = no color) of a BGR image, in one table lookup."""
+        q = np.right_shift(bgr, self.shift)
+        index = q[..., 0].astype(self.index_dtype)
+        index <<= self.bits
+        index |= q[..., 1]
+        index <<= self.bits
+        index |= q[..., 2]
+        return np.take(self.flat, index, out=out)
+
+    def label_of(self, bgr):
+        """Label of one BGR color (floats allowed, e.g. a mean color)."""
+        b, g, r = (min(max(int(v), 0), 255) >> self.shift for v in bgr[:3])
+        return int(self.table[b, g, r])
+
+    def name_of_rgb(self, rgb):
+        """Color name of one RGB color, or None."""
+        label = self.label_of(tuple(rgb[:3])[::-1])
+        return self.names[label - 1] if label else None
@@ -0,0 +1,133 @@
+"""
+Color tracking engine: best blob of each configured HSV color in one pass per color.
+
+The frame is downscaled first (scale=0.25 -> 160x120 for a 640x480 frame, by
+nearest-neighbor sampling: cheaper than averaging and keeps colors pure), each
+color's mask comes from one or more inRange calls, and connectedComponentsWithStats
+returns the areas, boxes and centroids of all blobs at once, so there is no Python
+loop over contours. Positions are returned in full-resolution pixels.
+
+    tracker = ColorTracker({"red": [((0, 150, 20), (10, 255, 255)), ((170, 150, 20), (179, 255, 255))]})
+    tracker.add_color("magenta", (hsv((300, 40, 10)), hsv((360, 90, 100))))
+    blobs = tracker.detect(frame)          # {"red": Blob or None, "magenta": Blob or None}
+    target = tracker.best(blobs)           # largest blob of any color
+
+With a color lookup table (colorLut.py) the frame is classified for all colors in
+one pass instead, and each mask is a compare on the label image:
+
+    tracker = ColorTracker(lut=ColorLUT.load(palette="tracking"))
+"""
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# center: centroid (x, y), box: (x, y, w, h), rect: minAreaRect or None; all full-resolution
+Blob = namedtuple("Blob", ["name", "area", "center", "box", "rect"])
+
+
+def hsv(hsv):
+    """(hue in degrees, saturation %, value %) -> OpenCV HSV (0-179, 0-255, 0-255)."""
+    h, s, v = hsv
+    opencv_h = int((h / 360) * 179)
+    opencv_s = int((s / 100) * 255)
+    opencv_v = int((v / 100) * 255)
+
+    return [opencv_h, opencv_s, opencv_v]
+
+
+class ColorTracker:
+    """
+    colors: {name: [(lower, upper), ...]} OpenCV HSV ranges, several ranges are OR-ed
+    (e.g. red on both sides of the hue wrap). min_area is in full-resolution pixels.
+    rotated=True also fits a minAreaRect on the best blob of each color.
+    lut: ColorLUT classifying the colors instead of the HSV ranges (colors is then unused).
+    """
+
+    def __init__(self, colors=None, scale=0.25, min_area=200, rotated=False, lut=None):
+        self.colors = {}
+        self.scale = scale
+        self.min_area = min_area
+        self.rotated = rotated
+        self.lut = lut
+        self.small = None          # downscaled BGR frame, reused
+        self.hsv = None            # its HSV conversion, reused
+        self.labels = None         # its LUT label image, reused
+        self.part = None           # scratch mask for multi-range colors
+        self.masks = {}            # last mask of each color (downscaled)
+        if lut is not None:
+            self.colors = {name: k for k, name in enumerate(lut.names, 1)}
+        for name, ranges in (colors or {}).items():
+            self.add_color(name, *ranges)
+
+    def add_color(self, name, *ranges):
+        """Track a color given by one or more (lower, upper) OpenCV HSV ranges."""
+        if self.lut is not None:
+            raise ValueError("colors come from the lookup table, edit colors.json instead")
+        self.colors[name] = [(np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8))
+                             for lower, upper in ranges]
+        self.masks.pop(name, None)
+
+    def remove_color(self, name):
+        self.colors.pop(name, None)
+        self.masks.pop(name, None)
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        size = (max(int(w * self.scale), 1), max(int(h * self.scale), 1))
+        if self.small is None or self.small.shape[1::-1] != size:
+            self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self.hsv = np.empty_like(self.small)
+            self.labels = np.empty((size[1], size[0]), dtype=np.uint8)
+            self.part = np.empty((size[1], size[0]), dtype=np.uint8)
+            self.masks = {}
+        cv2.resize(frame, size, dst=self.small, interpolation=cv2.INTER_NEAREST)
+        if self.lut is not None:
+            self.lut.classify(self.small, out=self.labels)
+        else:
+            cv2.cvtColor(self.small, cv2.COLOR_BGR2HSV, dst=self.hsv)
+
+    def mask(self, name):
+        """Mask of a color on the current downscaled frame."""
+        ranges = self.colors[name]          # label number in LUT mode
+        mask = self.masks.get(name)
+        if mask is None:
+            mask = self.masks[name] = np.empty(self.small.shape[:2], dtype=np.uint8)
+        if self.lut is not None:
+            return cv2.compare(self.labels, ranges, cv2.CMP_EQ, dst=mask)
+        cv2.inRange(self.hsv, ranges[0][0], ranges[0][1], dst=mask)
+        for lower, upper in ranges[1:]:
+            cv2.inRange(self.hsv, lower, upper, dst=self.part)
+            cv2.bitwise_or(mask, self.part, dst=mask)
+        return mask
+
+    def _best_blob(self, name, mask):
+        n, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if n < 2:
+            return None
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        i = int(areas.argmax()) + 1
+        inv = 1.0 / self.scale
+        area = float(stats[i, cv2.CC_STAT_AREA]) * inv * inv
+        if area < self.min_area:
+            return None
+        sx, sy, sw, sh = stats[i, :4].tolist()
+        x, y, w, h = int(sx * inv), int(sy * inv), int(sw * inv), int(sh * inv)
+        cx, cy = (centroids[i] + 0.5) * inv
+        rect = None
+        if self.rotated:
+            # Pixels of this blob, looked up inside its bounding box only
+            points = cv2.findNonZero(cv2.compare(labels[sy:sy + sh, sx:sx + sw], i, cv2.CMP_EQ))
+            (rx, ry), (rw, rh), angle = cv2.minAreaRect(points)
+            rect = (((rx + sx + 0.5) * inv, (ry + sy + 0.5) * inv), ((rw + 1) * inv, (rh + 1) * inv), angle)
+        return Blob(name, area, (int(cx), int(cy)), (x, y, w, h), rect)
+
+    def detect(self, frame):
+        """BGR frame -> {color name: largest Blob above min_area, or None}."""
+        self._prepare(frame)
+        return {name: self._best_blob(name, self.mask(name)) for name in self.colors}
+
+    @staticmethod
+    def best(blobs):
+        """Largest blob over all colors, or None."""
+        found = [blob for blob in blobs.values() if blob is not None]
+        return max(found, key=lambda blob: blob.area) if found else None
@@ -0,0 +1,96 @@
+"""
+Control law: target position in the image -> speeds of the three motors.
+
+Motor 1 and 2 steer left/right (differential), motor 3 moves up/down. Offsets
+inside the dead-band give 0; when the target box is large (close), both side
+motors also get a forward cruise component. With a stereo range (stereo.py) the
+forward component follows the distance instead: full cruise beyond
+full_distance, down to 0 at stop_distance. Everything works on NumPy arrays, so
+a whole recorded track can be evaluated at once, and build_lut() precomputes the
+outputs for every pixel so the per-tick cost is an array index.
+
+    law = ControlLaw()
+    speeds = law.compute(xs, ys, sizes)        # (N, 3) int array
+    mot1, mot2, mot3 = law.direc(x, y)         # ((1, s1), (2, s2), (3, s3))
+"""
+import numpy as np
+
+
+class ControlLaw:
+    def __init__(self, center=(320, 240), dead_band=10, kx=255 / 1280, ky=255 / 480,
+                 cruise=127, size_threshold=50, limit=255, frame_size=(640, 480),
+                 stop_distance=0.5, full_distance=2.0):
+        self.center = center
+        self.dead_band = dead_band
+        self.kx = kx                       # side motors gain (per pixel)
+        self.ky = ky                       # vertical motor gain (per pixel)
+        self.cruise = cruise               # forward speed added when the target is close
+        self.size_threshold = size_threshold
+        self.stop_distance = stop_distance     # m, no forward thrust closer than this
+        self.full_distance = full_distance     # m, full cruise beyond this
+        self.limit = limit
+        self.frame_size = frame_size
+        self.lut = None
+
+    def compute(self, x, y, size=None, distance=None):
+        """
+        x, y: target centers (scalars or arrays), size: box width, its height when the
+        width is 0 (the old tracking.direc test; None = far),
+        distance: stereo range in m (replaces size when given, NaN = unknown).
+        Returns an int array (..., 3) of (mot1, mot2, mot3) speeds.
+        """
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        dx = self.center[0] - x
+        dy = self.center[1] - y
+        dx = np.where(np.abs(dx) > self.dead_band, dx, 0.0)
+        dy = np.where(np.abs(dy) > self.dead_band, dy, 0.0)
+
+        turn = dx * self.kx
+        if distance is not None:
+            ramp = (np.asarray(distance, dtype=np.float64) - self.stop_distance) / (self.full_distance - self.stop_distance)
+            forward = self.cruise * np.clip(np.nan_to_num(ramp), 0.0, 1.0)
+        else:
+            near = np.zeros(x.shape, dtype=bool) if size is None else np.asarray(size) >= self.size_threshold
+            forward = np.where(near, self.cruise, 0.0)
+        moving = forward > 0
+        mot1 = np.where(moving, np.rint(turn / 2 + forward), np.rint(turn))
+        mot2 = np.where(moving, np.rint(-turn / 2 + forward), np.rint(-turn))
+        mot3 = np.rint(dy * self.ky)
+        out = np.stack(np.broadcast_arrays(mot1, mot2, mot3), axis=-1)
+        return np.clip(out, -self.limit, self.limit).astype(np.int16)
+
+    def build_lut(self):
+        """Precompute speeds for every pixel: lut[near, y, x] -> (mot1, mot2, mot3)."""
+        w, h = self.frame_size
+        ys, xs = np.mgrid[0:h, 0:w]
+        self.lut = np.stack([self.compute(xs, ys, None),
+                             self.compute(xs, ys, np.full(xs.shape, self.size_threshold))])
+        return self.lut
+
+    def lookup(self, x, y, size=None):
+        """Speeds for integer pixel coordinates (scalars or arrays) through the LUT."""
+        if self.lut is None:
+            self.build_lut()
+        w, h = self.frame_size
+        x = np.clip(np.asarray(x, dtype=np.intp), 0, w - 1)
+        y = np.clip(np.asarray(y, dtype=np.intp), 0, h - 1)
+        near = 0 if size is None else (np.asarray(size) >= self.size_threshold).astype(np.intp)
+        return self.lut[near, y, x]
+
+    def direc(self, x, y, size=None, distance=None):
+        """Single target -> ((1, mot1), (2, mot2), (3, mot3)), as sent by tracking.send_motors."""
+        if distance is not None:
+            mot1, mot2, mot3 = self.compute(x, y, distance=distance).tolist()
+        elif float(x).is_integer() and float(y).is_integer():
+            mot1, mot2, mot3 = self.lookup(int(x), int(y), size).tolist()
+        else:
+            mot1, mot2, mot3 = self.compute(x, y, size).tolist()
+        return (1, mot1), (2, mot2), (3, mot3)
+
+
+def manual_commands(keys):
+    """Manual control keys (z, q, s, d, c, v, Z, S) pressed or not -> ((1, s1), (2, s2), (3, s3))."""
+    z, q, s, d, c, v, Z, S = keys
+    return ((1, (z+(2*Z)-s-(2*S)+q-d)*125),
+            (2, (z+(2*Z)-s-(2*S)+d-q)*125),
+            (3, (c-v)*200))
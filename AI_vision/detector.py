@@ -0,0 +1,238 @@
+"""
+YOLO detector running an exported ONNX model (Data/model.py) with onnxruntime.
+
+No torch/ultralytics import: letterbox preprocessing and NMS are done here with
+OpenCV/NumPy, and the input/output tensors are allocated once and reused.
+
+    detector = OnnxDetector("../models/best.onnx")
+    for (x1, y1, x2, y2, conf, cls) in detector(img):   # img is BGR uint8
+        print(detector.names[cls], conf)
+
+RoiDetector and MotionGate wrap a detector and are called the same way.
+"""
+import ast
+import time
+import cv2
+import numpy as np
+import onnxruntime as ort
+from boxes import nms
+
+
+class OnnxDetector:
+    def __init__(self, path, conf_threshold=0.25, iou_threshold=0.45, imgsz=640, threads=None):
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads is not None:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        model_output = self.session.get_outputs()[0]
+        _, _, h, w = model_input.shape
+        # Dynamic axes are exported as strings, fall back to imgsz
+        self.height = h if isinstance(h, int) else imgsz
+        self.width = w if isinstance(w, int) else imgsz
+
+        # Class names are stored by the ultralytics exporter in the metadata
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        self.names = ast.literal_eval(names) if names else {}
+
+        # Preallocated buffers: letterbox canvas, NCHW float input, raw output
+        self.canvas = np.full((self.height, self.width, 3), 114, dtype=np.uint8)
+        self.input = np.zeros((1, 3, self.height, self.width), dtype=np.float32)
+        self.binding = self.session.io_binding()
+        self.binding.bind_cpu_input(model_input.name, self.input)
+        if all(isinstance(d, int) for d in model_output.shape):
+            self.output = np.zeros(model_output.shape, dtype=np.float32)
+            self.binding.bind_output(model_output.name, "cpu", 0, np.float32,
+                                     self.output.shape, self.output.ctypes.data)
+        else:
+            self.output = None
+            self.binding.bind_output(model_output.name, "cpu")
+
+    def preprocess(self, img):
+        """Letterbox img into the canvas and fill the input tensor, returns (scale, pad_x, pad_y)."""
+        ih, iw = img.shape[:2]
+        scale = min(self.width / iw, self.height / ih)
+        nw, nh = round(iw * scale), round(ih * scale)
+        pad_x, pad_y = (self.width - nw) // 2, (self.height - nh) // 2
+        if (nw, nh) != (iw, ih):
+            resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        else:
+            resized = img
+        self.canvas[...] = 114
+        self.canvas[pad_y:pad_y + nh, pad_x:pad_x + nw] = resized
+        # BGR HWC uint8 -> RGB CHW float32 [0, 1], written in place
+        np.multiply(self.canvas[..., ::-1].transpose(2, 0, 1), 1 / 255.0,
+                    out=self.input[0], casting="unsafe")
+        return scale, pad_x, pad_y
+
+    def postprocess(self, output, scale, pad_x, pad_y, shape):
+        # (1, 4 + nc, N) -> (N, 4 + nc)
+        pred = output[0].T
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(cls)), cls]
+        mask = conf > self.conf_threshold
+        if not mask.any():
+            return []
+        pred, cls, conf = pred[mask], cls[mask], conf[mask]
+
+        # cx, cy, w, h in letterbox space -> x1, y1, x2, y2 in image space
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        boxes -= (pad_x, pad_y, pad_x, pad_y)
+        boxes /= scale
+        ih, iw = shape[:2]
+        np.clip(boxes[:, 0::2], 0, iw, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, ih, out=boxes[:, 1::2])
+
+        # Class-aware NMS in one pass: shift each class into its own region
+        offsets = cls[:, None].astype(np.float32) * (max(iw, ih) + 1)
+        keep = nms(boxes + offsets, conf, self.iou_threshold)
+        return [(float(b[0]), float(b[1]), float(b[2]), float(b[3]), float(c), int(k))
+                for b, c, k in zip(boxes[keep], conf[keep], cls[keep])]
+
+    def __call__(self, img):
+        """Detect objects in a BGR image, returns a list of (x1, y1, x2, y2, conf, cls)."""
+        scale, pad_x, pad_y = self.preprocess(img)
+        self.session.run_with_iobinding(self.binding)
+        output = self.output if self.output is not None else self.binding.copy_outputs_to_cpu()[0]
+        return self.postprocess(output, scale, pad_x, pad_y, img.shape)
+
+
+class RoiDetector:
+    """
+    Runs the detector on an expanded crop around the locked target instead of the
+    full frame. Falls back to a full-frame search every full_every frames, or as
+    soon as the crop comes back empty. Boxes are always returned in frame space.
+
+    select: detections -> the box to lock on (x1, y1, x2, y2, ...) or None
+    roi_detector: optional detector with a smaller input size used on the crops
+    """
+
+    def __init__(self, detector, select=None, roi_detector=None, expand=2.5, min_size=160, full_every=10):
+        self.detector = detector
+        self.roi_detector = roi_detector or detector
+        self.names = detector.names
+        self.select = select or (lambda detections: detections[0] if detections else None)
+        self.expand = expand
+        self.min_size = min_size
+        self.full_every = full_every
+        self.locked = None          # (x1, y1, x2, y2) of the target in frame space
+        self.since_full = 0
+        # Stats
+        self.roi_runs = 0
+        self.full_runs = 0
+        self.roi_misses = 0
+
+    def window(self, shape):
+        """Square crop (x0, y0, x1, y1) around the locked box, clipped to the frame."""
+        ih, iw = shape[:2]
+        x1, y1, x2, y2 = self.locked[:4]
+        size = int(min(max(self.min_size, self.expand * max(x2 - x1, y2 - y1)), iw, ih))
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        x0 = int(min(max(cx - size / 2, 0), iw - size))
+        y0 = int(min(max(cy - size / 2, 0), ih - size))
+        return x0, y0, x0 + size, y0 + size
+
+    def _full(self, img):
+        self.full_runs += 1
+        self.since_full = 0
+        return self.detector(img)
+
+    def __call__(self, img):
+        detections = None
+        if self.locked is not None and self.since_full < self.full_every:
+            x0, y0, x1, y1 = self.window(img.shape)
+            self.roi_runs += 1
+            self.since_full += 1
+            detections = [(bx1 + x0, by1 + y0, bx2 + x0, by2 + y0, conf, cls)
+                          for (bx1, by1, bx2, by2, conf, cls) in self.roi_detector(img[y0:y1, x0:x1])]
+            if self.select(detections) is None:
+                # Target lost in the crop, search the whole frame right away
+                self.roi_misses += 1
+                detections = None
+        if detections is None:
+            detections = self._full(img)
+        target = self.select(detections)
+        self.locked = tuple(target[:4]) if target is not None else None
+        return detections
+
+
+class MotionGate:
+    """
+    Skips the detector while the scene doesn't change: the frame is shrunk to a
+    small gray thumbnail (size, area averaging also smooths sensor noise) and
+    compared with the thumbnail of the last frame that went through the model.
+    Below threshold (fraction of thumbnail pixels that changed by more than
+    pixel_threshold levels) the previous detections are returned again, but
+    never for longer than max_staleness seconds.
+
+    reused tells whether the last call returned the previous detections. clock
+    gives the current time (replay.py passes the recorded frame times).
+    """
+
+    def __init__(self, detector, threshold=0.005, pixel_threshold=12, max_staleness=1.0, size=(80, 60),
+                 clock=time.time):
+        self.detector = detector
+        self.clock = clock
+        self.names = detector.names
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_staleness = max_staleness
+        self.size = size
+        self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.thumb = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.reference = np.empty_like(self.thumb)   # thumbnail of the last inferred frame
+        self.diff = np.empty_like(self.thumb)
+        self.detections = None
+        self.last_run = 0.0
+        self.reused = False
+        self.change = 1.0                             # changed fraction of the last frame
+        # Stats
+        self.calls = 0
+        self.runs = 0
+        self.saved = 0
+        self.stale_runs = 0                           # runs forced by max_staleness
+
+    def changed(self, img):
+        """Fraction of the thumbnail that changed since the last inferred frame."""
+        cv2.resize(img, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.thumb)
+        if self.detections is None:
+            return 1.0
+        cv2.absdiff(self.thumb, self.reference, dst=self.diff)
+        cv2.threshold(self.diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+        return cv2.countNonZero(self.diff) / self.diff.size
+
+    def __call__(self, img):
+        self.calls += 1
+        now = self.clock()
+        self.change = self.changed(img)
+        if self.change < self.threshold:
+            if now - self.last_run < self.max_staleness:
+                self.saved += 1
+                self.reused = True
+                return self.detections
+            self.stale_runs += 1
+        self.reused = False
+        self.runs += 1
+        self.detections = self.detector(img)
+        self.last_run = now
+        self.reference, self.thumb = self.thumb, self.reference
+        return self.detections
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "runs": self.runs,
+            "saved": self.saved,
+            "saved_ratio": self.saved / self.calls if self.calls else 0.0,
+            "stale_runs": self.stale_runs,
+            "change": self.change,
+        }
@@ -0,0 +1,192 @@
+"""
+Synchronized capture from two cameras: frames are paired by timestamp.
+
+    camera 0 thread --grab()--+
+                              +--> FramePairer --> pairs (latest pair slot)
+    camera 1 thread --grab()--+
+
+Both cameras stream in their own thread, so a pair is ready as soon as the later
+of its two frames is, never one full frame period after. FramePairer merges the
+two timestamp-ordered streams: heads within tolerance become a pair, a head too
+old to ever find a partner is dropped (and counted). The pair stream behaves
+like a FrameSource for grab(), so it plugs into DetectionPipeline (detection runs
+on camera 0, pair.images[1] is the other view).
+
+    dual = DualCamera.picamera(fps=30).start()
+    ok, pair, t = dual.grab()
+    left, right = pair.images
+    pair.release()
+    print(dual.stats())
+"""
+import threading
+from collections import deque
+import numpy as np
+from pipeline import LatestSlot
+
+
+class FramePair:
+    """Two SharedFrames taken at the same time; retain/release apply to both."""
+    __slots__ = ("frames", "timestamps", "images", "image", "timestamp")
+
+    def __init__(self, frame0, t0, frame1, t1):
+        self.frames = (frame0, frame1)
+        self.timestamps = (t0, t1)
+        self.images = (frame0.image, frame1.image)
+        self.image = frame0.image         # main view, what the detector sees
+        self.timestamp = (t0 + t1) / 2
+
+    @property
+    def offset(self):
+        """Capture time of camera 1 minus camera 0 (s)."""
+        return self.timestamps[1] - self.timestamps[0]
+
+    def retain(self):
+        for frame in self.frames:
+            frame.retain()
+        return self
+
+    def release(self):
+        for frame in self.frames:
+            frame.release()
+
+
+class FramePairer:
+    """
+    Pairs two timestamp-ordered frame streams. push() takes one reference on each
+    frame (releasing the ones it drops) and returns the pairs it completed. At most
+    max_queue frames wait for a partner, so a stalled camera doesn't pin buffers.
+    """
+
+    def __init__(self, tolerance=1 / 60, max_queue=3, history=300):
+        self.tolerance = tolerance
+        self.max_queue = max_queue
+        self.queues = (deque(), deque())
+        self.lock = threading.Lock()
+        # Stats
+        self.pairs = 0
+        self.received = [0, 0]
+        self.dropped = [0, 0]
+        self.offsets = deque(maxlen=history)      # (pair time, camera 1 - camera 0)
+
+    def push(self, camera, frame, t):
+        with self.lock:
+            self.received[camera] += 1
+            queue = self.queues[camera]
+            queue.append((frame, t))
+            if len(queue) > self.max_queue:
+                queue.popleft()[0].release()
+                self.dropped[camera] += 1
+            pairs = []
+            q0, q1 = self.queues
+            while q0 and q1:
+                (f0, t0), (f1, t1) = q0[0], q1[0]
+                if abs(t1 - t0) <= self.tolerance:
+                    q0.popleft()
+                    q1.popleft()
+                    pair = FramePair(f0, t0, f1, t1)
+                    self.pairs += 1
+                    self.offsets.append((pair.timestamp, pair.offset))
+                    pairs.append(pair)
+                else:
+                    # The older head can't match anything newer from the other camera
+                    older = 0 if t0 < t1 else 1
+                    frame, _ = self.queues[older].popleft()
+                    self.dropped[older] += 1
+                    frame.release()
+            return pairs
+
+    def clear(self):
+        with self.lock:
+            for q in self.queues:
+                while q:
+                    q.popleft()[0].release()
+
+    def stats(self):
+        """
+        offset: camera 1 - camera 0 capture time (s) of the paired frames.
+        drift: how fast that offset changes (s per s), fitted over the history.
+        """
+        with self.lock:
+            offsets = list(self.offsets)
+            received, dropped = list(self.received), list(self.dropped)
+        stats = {
+            "pairs": self.pairs,
+            "received": received,
+            "dropped": dropped,
+            "drop_rate": [d / r if r else 0.0 for d, r in zip(dropped, received)],
+            "offset_mean": 0.0,
+            "offset_abs_p95": 0.0,
+            "drift": 0.0,
+        }
+        if offsets:
+            t, off = np.array(offsets).T
+            stats["offset_mean"] = float(off.mean())
+            stats["offset_abs_p95"] = float(np.percentile(np.abs(off), 95))
+            if len(offsets) > 1 and t[-1] > t[0]:
+                stats["drift"] = float(np.polyfit(t - t[0], off, 1)[0])
+        return stats
+
+
+class DualCamera:
+    """
+    Two frame sources captured in parallel and served as one stream of FramePairs.
+    tolerance: max capture time difference (s) inside a pair, half a frame period
+    by default.
+    """
+
+    def __init__(self, source0, source1, tolerance=None, fps=30.0):
+        self.sources = (source0, source1)
+        self.pairer = FramePairer(tolerance if tolerance is not None else 0.5 / fps)
+        self.pairs = LatestSlot(refcounted=True)
+        self.version = 0
+        self.running = False
+        self.threads = []
+
+    @classmethod
+    def picamera(cls, size=(640, 480), fps=30.0, tolerance=None):
+        """Both Pi cameras at the same fixed frame rate (extra buffers: pairs hold two frames)."""
+        from frameSource import PicameraSource
+        return cls(PicameraSource(0, size=size, fps=fps, camera_buffers=8),
+                   PicameraSource(1, size=size, fps=fps, camera_buffers=8),
+                   tolerance, fps)
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self._capture_loop, args=(i,), daemon=True)
+                        for i in range(2)]
+        for t in self.threads:
+            t.start()
+        return self
+
+    def _capture_loop(self, camera):
+        source = self.sources[camera]
+        while self.running:
+            ok, frame, t = source.grab()
+            if not ok:
+                break
+            for pair in self.pairer.push(camera, frame, t):
+                self.pairs.put(pair)   # the slot takes over the pair's references
+        self.running = False
+
+    def grab(self, timeout=1.0):
+        """Next pair as (ok, FramePair, timestamp); release() the pair when done."""
+        while self.running:
+            self.version, pair = self.pairs.get(self.version, timeout)
+            if pair is not None:
+                return True, pair, pair.timestamp
+        return False, None, None
+
+    def stats(self):
+        return self.pairer.stats()
+
+    def copy_stats(self):
+        return [source.copy_stats() for source in self.sources]
+
+    def close(self):
+        self.running = False
+        for t in self.threads:
+            t.join(timeout=2)
+        self.pairer.clear()
+        self.pairs.clear()
+        for source in self.sources:
+            source.close()
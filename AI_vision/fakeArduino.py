@@ -0,0 +1,61 @@
+"""
+Fake Arduino on a pseudo-terminal, to test the motor protocol without the board.
+
+    python fakeArduino.py              # prints the pty path
+    ROMARIN_PORT=/dev/pts/N python finalRomarin.py
+"""
+import os
+import time
+import tty
+import threading
+import protocol
+
+
+class FakeArduino:
+    """Opens a pty pair and decodes every motor frame written to the slave side."""
+
+    def __init__(self, on_frame=None):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # no newline/CR translation on binary frames
+        self.port = os.ttyname(self.slave)
+        self.parser = protocol.FrameParser()
+        self.speeds = (0, 0, 0)
+        self.received = []
+        self.on_frame = on_frame
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _read_loop(self):
+        while self.running:
+            try:
+                data = os.read(self.master, 256)
+            except OSError:
+                break
+            for seq, speeds in self.parser.feed(data):
+                self.speeds = speeds
+                self.received.append((time.time(), seq, speeds))
+                if self.on_frame is not None:
+                    self.on_frame(seq, speeds)
+
+    def stop(self):
+        self.running = False
+        os.close(self.slave)
+        os.close(self.master)
+
+
+if __name__ == '__main__':
+    fake = FakeArduino(on_frame=lambda seq, speeds: print(f"#{seq:3d} {speeds}"))
+    fake.start()
+    print(f"Fake Arduino listening on {fake.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n{fake.parser.frames} frames, {fake.parser.errors} errors")
+        fake.stop()
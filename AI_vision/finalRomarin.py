@@ -1,10 +1,17 @@
-from picamera2 import Picamera2
 import cv2
+import os
+import numpy as np
 import time
 import threading
-from ultralytics import YOLO
-from pynput import keyboard
 import tracking as tr
+from pipeline import DetectionPipeline
+from frameSource import PicameraSource
+from detector import OnnxDetector, RoiDetector, MotionGate
+from autopilot import Autopilot
+from scheduler import DetectionScheduler
+from recorder import DiveRecorder
+from telemetry import Telemetry
+from viewer import open_viewer, start_keyboard, StreamViewer
 
 # ================================================
 # ! Global Configuration and State Variables
@@ -12,6 +19,20 @@ import tracking as tr
 # Enable sorting (for specific detection class)
 sorting = False
 
+# Dive recording (recorder.py): video, detections, tracker, keys, motor ticks and every
+# motor command, enabled by setting ROMARIN_RECORD to the folder to record into
+recorder = DiveRecorder(os.environ["ROMARIN_RECORD"]).start() if os.environ.get("ROMARIN_RECORD") else None
+tr.recorder = recorder
+
+# Stage timers and counters (telemetry.py): served on http://127.0.0.1:<port>/ with
+# ROMARIN_TELEMETRY=<port>, printed every N seconds with ROMARIN_TELEMETRY_DUMP=<N>
+telemetry = Telemetry.from_env()
+tr.writer.telemetry = telemetry
+
+# Window, headless (ROMARIN_HEADLESS=1, or no display) or MJPEG stream (ROMARIN_STREAM=<port>):
+# frames are only drawn when something shows them
+viewer = open_viewer("Detection")
+
 # Manual control keys (updated by the keyboard listener)
 keys = {'z': 0, 'q': 0, 's': 0, 'd': 0, 'c': 0, 'v': 0, 'Z': 0, 'S': 0}
 
@@ -19,6 +40,8 @@ def on_press(key):
     try:
         if key.char in keys:
             keys[key.char] = 1
+            if recorder is not None:
+                recorder.keys(time.time(), keys.values())
     except AttributeError:
         pass
 
@@ -26,43 +49,44 @@ def on_release(key):
     try:
         if key.char in keys:
             keys[key.char] = 0
+            if recorder is not None:
+                recorder.keys(time.time(), keys.values())
     except AttributeError:
         pass
 
-# Start keyboard listener in the background (using library listener constructor)
-listener = keyboard.Listener(on_press=on_press, on_release=on_release)
-listener.daemon = True
-listener.start()
+# Start keyboard listener in the background (none when headless: keys stay released)
+listener = start_keyboard(on_press, on_release, viewer)
 
 # ================================================
-# ! Initialize YOLO Model
+# ! Initialize YOLO Model (ONNX Runtime, no torch needed)
 # ================================================
-model = YOLO("../models/best.pt")  # Load your YOLOv8 model
+model = OnnxDetector("../models/best.onnx")  # Exported by Data/model.py
 classNames = model.names
 
-# ================================================
-# ! Initialize Picamera2
-# ================================================
-picam2 = Picamera2()
-# Configure for preview; adjust size and format as needed.
-config = picam2.create_preview_configuration(main={"format": "RGB888", "size": (640, 480)})
-picam2.configure(config)
-picam2.start()
+# Detections -> target -> motor commands (autopilot.py, also used by replay.py)
+detection_timeout = 1.0  # seconds until detection is considered stale
+autopilot = Autopilot(classNames, sorting="cell phone" if sorting else None,
+                      detection_timeout=detection_timeout)
+
+# ROI mode: while a target is locked, only a crop around it goes through the model
+# (the smaller 320x320 export is used for crops when it exists)
+roi_model = OnnxDetector("../models/best_320.onnx") if os.path.exists("../models/best_320.onnx") else None
+roi = RoiDetector(model, select=autopilot.select_target, roi_detector=roi_model, full_every=10)
+# Motion gate: while the scene doesn't change, the previous detections are reused
+# instead of running the model (for at most max_staleness seconds)
+detector = MotionGate(roi, threshold=0.005, max_staleness=1.0)
+
+# Detection rate follows the latency and CPU budgets: more when the target moves
+# fast or was just lost, less in a static scene
+scheduler = DetectionScheduler(latency_budget=0.3, cpu_budget=0.7)
 
 # ================================================
-# ! Detection and Caching Variables
+# ! Initialize Picamera2
 # ================================================
-# Run detection every skip_interval frames (you can adjust this value)
-skip_interval = 15
-frame_count = 0
-
-# Cached detection info:
-# - last_target: the center (x, y) of the detected object
-# - last_bbox: bounding box info for drawing (x1, y1, x2, y2, class_name, confidence)
-last_target = None
-last_bbox = None
-last_detection_time = 0
-detection_timeout = 1.0  # seconds until detection is considered stale
+# BGR 640x480 frames shared without copies between capture, inference and display
+source = PicameraSource(size=(640, 480))
+# Drawing buffer, reused every frame: the shared frames themselves are read-only
+canvas = np.empty((480, 640, 3), dtype=np.uint8)
 
 # Running flag for proper shutdown
 running = True
@@ -71,23 +95,27 @@ running = True
 # ! Motor Control Thread (Manual overrides Auto)
 # ================================================
 def motor_control_loop():
-    global last_target, last_detection_time
+    last_tick = None
     while running:
-        if any(keys.values()):
-            # Manual commands have highest priority:
-            tr.telecom(list(keys.values()))
-        else:
-            # If a fresh detection exists, compute and send motor commands
-            if last_target is not None and (time.time() - last_detection_time) < detection_timeout:
-                mot1, mot2, mot3 = tr.direc(last_target[0], last_target[1], 320, 240)
-                tr.send_command(mot1)
-                tr.send_command(mot2)
-                tr.send_command(mot3)
-            else:
-                # No fresh detection; send stop commands
-                tr.send_command((1, 0))
-                tr.send_command((2, 0))
-                tr.send_command((3, 0))
+        now = time.time()
+        if telemetry is not None:
+            t0 = time.perf_counter()
+            if last_tick is not None:
+                telemetry.add("motor_period", t0 - last_tick)
+            last_tick = t0
+        # Manual keys first, else steer toward a fresh target, else stop
+        command = autopilot.motor_step(list(keys.values()), now)
+        if recorder is not None:
+            recorder.tick(now)
+        if telemetry is not None:
+            t0 = telemetry.lap("control", t0)
+        if command is not None:
+            tr.send_motors(*command)
+            if autopilot.last_target is not None and not any(keys.values()):
+                scheduler.record_command(time.time())
+            if telemetry is not None:
+                telemetry.lap("send", t0)
+                telemetry.count("commands")
         time.sleep(0.05)  # roughly 20 Hz loop rate
 
 # Start the motor control thread
@@ -95,57 +123,124 @@ motor_thread = threading.Thread(target=motor_control_loop, daemon=True)
 motor_thread.start()
 
 # ================================================
-# ! Main Loop: Capture Frames, Run Detection, and Draw
+# ! Detection Pipeline (capture and inference threads)
+# ================================================
+# Inference runs on the freshest frame, as often as the scheduler asks
+pipeline = DetectionPipeline(source, detector, scheduler=scheduler, telemetry=telemetry).start()
+if telemetry is not None:
+    telemetry.watch("pipeline", pipeline.stats)
+    telemetry.watch("autopilot", autopilot.stats)
+    telemetry.watch("motion_gate", detector.stats)
+    telemetry.watch("scheduler", scheduler.metrics)
+    telemetry.watch("serial", tr.writer.stats)
+    if isinstance(viewer, StreamViewer):
+        telemetry.watch("stream", viewer.stats)
+last_frame_version = 0
+last_result_version = 0
+last_stats_time = time.time()
+
+# ================================================
+# ! Main Loop: Use Latest Detection, Draw and Display
 # ================================================
 try:
-    while True:
-        # Capture a frame from Picamera2
-        img = picam2.capture_array()
-        frame_count += 1
-
-        # Run detection every skip_interval frames
-        if frame_count % skip_interval == 0:
-            results = model(img, stream=True)
-            detection_made = False
-            for result in results:
-                for box in result.boxes:
-                    cls = int(box.cls[0])
-                    # Optionally filter detection (e.g., only process "cell phone")
-                    if not sorting or classNames[cls] == "cell phone":
-                        x1, y1, x2, y2 = box.xyxy[0]
-                        conf = float(box.conf[0])
-                        center_x = int((x1 + x2) // 2)
-                        center_y = int((y1 + y2) // 2)
-                        # Cache detection information
-                        last_target = (center_x, center_y)
-                        last_bbox = (int(x1), int(y1), int(x2), int(y2), classNames[cls], round(conf, 2))
-                        last_detection_time = time.time()
-                        detection_made = True
-                        break
-                if detection_made:
-                    break
-
-        # If the last detection is too old, clear cache (stale)
-        if time.time() - last_detection_time > detection_timeout:
-            last_target = None
-            last_bbox = None
-
-        # Draw the cached bounding box on the frame if available
-        if last_bbox is not None:
-            x1, y1, x2, y2, class_name, conf = last_bbox
-            cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
-            center = ((x1 + x2) // 2, (y1 + y2) // 2)
-            cv2.circle(img, center, 3, (0, 0, 255), -1)
-            cv2.putText(img, f"{class_name} {conf}", (x1, y1 - 5),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-
-        # Display the video feed with bounding box
-        cv2.imshow("Detection", img)
-        if cv2.waitKey(1) & 0xFF == ord('n'):
+    while pipeline.running:
+        # Wait for a frame newer than the one displayed
+        last_frame_version, frame = pipeline.frames.get(last_frame_version, timeout=1.0)
+        if frame is None:
+            continue
+        now = time.time()
+        if telemetry is not None:
+            t0 = loop_start = time.perf_counter()
+
+        # Pick up new detections if the inference worker published some
+        result_version, result = pipeline.results.peek()
+        if result_version != last_result_version:
+            last_result_version = result_version
+            if recorder is not None:
+                recorder.detections(result.frame_timestamp, result.detections, now)
+            # Boxes are already in frame coordinates, even when detected in the ROI crop
+            autopilot.on_detections(result.detections, result.frame_timestamp)
+
+        # Move the cached target with the tracker, drop it when the last detection is too old
+        box = autopilot.on_frame(frame.image, frame.timestamp, now)
+        last_bbox = autopilot.last_bbox
+        if telemetry is not None:
+            t0 = telemetry.lap("tracking", t0)
+
+        if recorder is not None:
+            recorder.frame(frame.image, frame.timestamp)
+            recorder.tracker(frame.timestamp, box, autopilot.tracker.velocity, now)
+
+        # Target motion drives the detection rate
+        scheduler.update_target(last_bbox[:4] if last_bbox is not None else None, frame.timestamp,
+                                autopilot.tracker.velocity if box is not None else None)
+
+        # Draw the cached bounding box if available and someone looks at the frame
+        # (on the canvas, the frame is read-only)
+        img = None
+        if viewer.wants_frame():
+            img = frame.image
+            if last_bbox is not None:
+                img = canvas
+                np.copyto(img, frame.image)
+                source.stats.copied(img.nbytes)
+                x1, y1, x2, y2, class_name, conf = last_bbox
+                cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
+                center = ((x1 + x2) // 2, (y1 + y2) // 2)
+                cv2.circle(img, center, 3, (0, 0, 255), -1)
+                cv2.putText(img, f"{class_name} {conf}", (x1, y1 - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            if telemetry is not None:
+                t0 = telemetry.lap("draw", t0)
+
+        # Print pipeline latency every few seconds
+        if time.time() - last_stats_time > 5:
+            last_stats_time = time.time()
+            stats = pipeline.stats()
+            print(f"capture->detection latency {stats['latency_mean']*1000:.0f} ms "
+                  f"(p95 {stats['latency_p95']*1000:.0f} ms), "
+                  f"inference {stats['inference_mean']*1000:.0f} ms, "
+                  f"{stats['inferences']}/{stats['frames_captured']} frames inferred "
+                  f"({stats['reused']} answered by the motion gate), "
+                  f"{roi.roi_runs} ROI / {roi.full_runs} full-frame runs")
+            gate = detector.stats()
+            print(f"motion gate: {gate['saved']}/{gate['calls']} inferences saved "
+                  f"({gate['saved_ratio']*100:.0f}%), {gate['stale_runs']} forced by staleness")
+            sched = scheduler.metrics()
+            print(f"scheduler: {sched['mode']}, detection every {sched['interval']*1000:.0f} ms "
+                  f"(limited by {sched['limit']}), {sched['detection_rate']:.1f} Hz, "
+                  f"model busy {sched['duty_cycle']*100:.0f}%, "
+                  f"detection->command {sched['command_latency_mean']*1000:.0f} ms "
+                  f"(p95 {sched['command_latency_p95']*1000:.0f} ms)")
+            copies = source.copy_stats()
+            print(f"{copies['allocations_per_frame']:.2f} allocations, "
+                  f"{copies['bytes_copied_per_frame'] / 1024:.0f} KiB copied per frame")
+
+        # Display the video feed with bounding box (window or stream)
+        if telemetry is not None:
+            t0 = time.perf_counter()
+        if img is not None:
+            viewer.show(img)
+        frame.release()  # done with the shared frame
+        key = viewer.poll()
+        if telemetry is not None:
+            telemetry.lap("display", t0)
+            telemetry.lap("main_loop", loop_start)
+        if key == ord('n'):
             break
 
+except KeyboardInterrupt:
+    pass                   # Ctrl+C: the way to stop a headless run
+
 finally:
     running = False        # Signal the motor control thread to terminate
+    pipeline.stop()        # Stop the capture and inference threads
     motor_thread.join()    # Wait for the thread to finish
-    picam2.stop()          # Stop the Picamera2 instance
-    cv2.destroyAllWindows()
+    source.close()         # Stop the Picamera2 instance
+    if recorder is not None:
+        recorder.close()   # Write the last segment
+        print(f"Dive recorded in {recorder.path}: {recorder.stats()}")
+    if telemetry is not None:
+        print(telemetry.text())
+        telemetry.close()
+    viewer.close()
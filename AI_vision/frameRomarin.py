@@ -1,8 +1,11 @@
 from ultralytics import YOLO
 import cv2
 import time
+import numpy as np
 import threading
 import tracking as tr
+from pipeline import DetectionPipeline
+from frameSource import VideoCaptureSource
 from pynput import keyboard
 
 # ================================================
@@ -39,14 +42,14 @@ listener.start()
 model = YOLO("yolo11n.pt")
 classNames = model.names
 
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
+try:
+    # Frames are decoded into pooled buffers and shared read-only with the inference thread
+    source = VideoCaptureSource(0)
+except IOError:
     print("Error: Could not open camera.")
     exit()
-
-# Frequency to update detection (YOLO inference every N frames)
-skip_interval = 10
-frame_count = 0
+# Drawing buffer, reused every frame
+canvas = np.empty((source.height, source.width, 3), dtype=np.uint8)
 
 # Variables to cache detection results
 # last_target: center of the detected bounding box (x, y)
@@ -82,14 +85,10 @@ def motor_control_loop():
             # No manual keys, so use the last detection if it's fresh.
             if last_target is not None and (time.time() - last_detection_time) < detection_timeout:
                 mot1, mot2, mot3 = tr.direc(last_target[0], last_target[1], 320, 240)
-                tr.send_command(mot1)
-                tr.send_command(mot2)
-                tr.send_command(mot3)
+                tr.send_motors(mot1, mot2, mot3)
             else:
                 # No detection (or too old); send stop commands.
-                tr.send_command((1, 0))
-                tr.send_command((2, 0))
-                tr.send_command((3, 0))
+                tr.send_motors((1, 0), (2, 0), (3, 0))
         # Tune this sleep interval for motor control frequency (here, ~20 Hz)
         time.sleep(0.05)
 
@@ -98,40 +97,45 @@ motor_thread = threading.Thread(target=motor_control_loop, daemon=True)
 motor_thread.start()
 
 # ================================================
-# Main Loop: Capture Frames, Run Detection, and Draw
+# Detection Pipeline (capture and inference threads)
 # ================================================
-try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not read frame.")
-            break
+def detect(img):
+    """Run the model on one frame, return a list of (x1, y1, x2, y2, conf, cls)."""
+    boxes = []
+    for result in model(img, stream=True, verbose=False):
+        for box in result.boxes:
+            x1, y1, x2, y2 = box.xyxy[0]
+            boxes.append((float(x1), float(y1), float(x2), float(y2), float(box.conf[0]), int(box.cls[0])))
+    return boxes
+
+# The model always works on the freshest frame; the capture thread never waits for it
+pipeline = DetectionPipeline(source, detect).start()
+last_frame_version = 0
+last_result_version = 0
 
-        # Make a copy for drawing purposes.
-        img = frame.copy()
-        frame_count += 1
-
-        # Run detection every 'skip_interval' frames.
-        if frame_count % skip_interval == 0:
-            results = model(img, stream=True)
-            detection_made = False
-            for result in results:
-                for box in result.boxes:
-                    cls = int(box.cls[0])
-                    # Filter detections if sorting is enabled (for example: only "cell phone")
-                    if not sorting or classNames[cls] == "cell phone":
-                        x1, y1, x2, y2 = box.xyxy[0]
-                        conf = float(box.conf[0])
-                        center_x = int((x1 + x2) // 2)
-                        center_y = int((y1 + y2) // 2)
-                        # Update cached target and drawing info
-                        last_target = (center_x, center_y)
-                        last_bbox = (int(x1), int(y1), int(x2), int(y2), classNames[cls], round(conf, 2))
-                        last_detection_time = time.time()
-                        detection_made = True
-                        # Use the first valid detection (or implement a selection method if needed)
-                        break
-                if detection_made:
+# ================================================
+# Main Loop: Use Latest Detection, Draw and Display
+# ================================================
+try:
+    while pipeline.running:
+        last_frame_version, frame = pipeline.frames.get(last_frame_version, timeout=1.0)
+        if frame is None:
+            continue
+
+        # Use new detections as soon as the inference thread publishes them.
+        result_version, result = pipeline.results.peek()
+        if result_version != last_result_version:
+            last_result_version = result_version
+            for (x1, y1, x2, y2, conf, cls) in result.detections:
+                # Filter detections if sorting is enabled (for example: only "cell phone")
+                if not sorting or classNames[cls] == "cell phone":
+                    center_x = int((x1 + x2) // 2)
+                    center_y = int((y1 + y2) // 2)
+                    # Update cached target and drawing info
+                    last_target = (center_x, center_y)
+                    last_bbox = (int(x1), int(y1), int(x2), int(y2), classNames[cls], round(conf, 2))
+                    last_detection_time = result.frame_timestamp
+                    # Use the first valid detection (or implement a selection method if needed)
                     break
 
         # If the last detection is too old, clear cached values (auto-stop will occur in motor thread)
@@ -139,8 +143,12 @@ try:
             last_target = None
             last_bbox = None
 
-        # Draw the cached bounding box if available
+        # Draw the cached bounding box if available (on the canvas, the frame is read-only)
+        img = frame.image
         if last_bbox is not None:
+            img = canvas
+            np.copyto(img, frame.image)
+            source.stats.copied(img.nbytes)
             x1, y1, x2, y2, class_name, conf = last_bbox
             cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
             center = ((x1 + x2) // 2, (y1 + y2) // 2)
@@ -150,11 +158,15 @@ try:
 
         # Show the video feed with drawing
         cv2.imshow("Detection", img)
+        frame.release()  # done with the shared frame
         if cv2.waitKey(1) == ord('n'):
             break
 
 finally:
     running = False          # Signal threads to finish
+    pipeline.stop()          # Stop capture and inference threads
+    print(pipeline.stats())  # Capture -> detection latency summary
+    print(source.copy_stats())  # Allocations / bytes copied per frame
     motor_thread.join()      # Wait for motor thread to close
-    cap.release()
+    source.close()
     cv2.destroyAllWindows()
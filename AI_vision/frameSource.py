@@ -0,0 +1,396 @@
+"""
+Frame sources: one interface for every way we get images.
+
+    PicameraSource      Pi camera through Picamera2
+    VideoCaptureSource  webcam through cv2.VideoCapture
+    VideoFileSource     recorded video file (timestamps from the file)
+    ImageFolderSource   folder of images (replay of recorded dives)
+
+read() returns (ok, frame, timestamp) with frame a BGR uint8 array of shape
+(height, width, 3). Frames are written into a small ring of reusable buffers, so
+a frame stays valid for buffers - 1 further reads; use buffers=None to get a new
+array for every frame when consumers keep frames around (e.g. threads).
+
+grab() is the zero-copy path for frames shared between threads: it returns a
+reference-counted SharedFrame whose .image is a read-only view of a pooled buffer
+(or, for the Pi camera, of the camera's own DMA buffer). Every holder calls
+retain() / release(), and the buffer is reused once the last one lets go.
+source.stats counts the allocations and copies made per frame.
+
+    source = open_source("picam:0")   # or "0", "dive.mp4", "frames/"
+    ok, frame, t = source.read()
+
+    ok, shared, t = source.grab()
+    detect(shared.image)
+    shared.release()
+"""
+import os
+import time
+import threading
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class CopyStats:
+    """Frame allocations and copies made after startup (preallocated buffers are not counted)."""
+
+    def __init__(self):
+        self.allocations = 0
+        self.bytes_allocated = 0
+        self.copies = 0
+        self.bytes_copied = 0
+
+    def allocated(self, nbytes):
+        self.allocations += 1
+        self.bytes_allocated += nbytes
+
+    def copied(self, nbytes):
+        self.copies += 1
+        self.bytes_copied += nbytes
+
+    def summary(self, frames):
+        n = max(frames, 1)
+        return {
+            "frames": frames,
+            "allocations": self.allocations,
+            "bytes_allocated": self.bytes_allocated,
+            "copies": self.copies,
+            "bytes_copied": self.bytes_copied,
+            "allocations_per_frame": self.allocations / n,
+            "bytes_copied_per_frame": self.bytes_copied / n,
+        }
+
+
+class SharedFrame:
+    """
+    Reference-counted frame. .image is a read-only view for consumers, .array the
+    writable buffer for the producer. on_free runs once the last holder released it.
+    """
+    __slots__ = ("array", "image", "refs", "lock", "on_free")
+
+    def __init__(self, array, on_free, lock):
+        self.array = array
+        self.image = array.view()
+        self.image.flags.writeable = False
+        self.refs = 0
+        self.lock = lock
+        self.on_free = on_free
+
+    def retain(self):
+        with self.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.refs -= 1
+            if self.refs == 0:
+                self.on_free(self)
+
+
+class BufferPool:
+    """Preallocated frame buffers handed out as SharedFrames; grows (and counts it) if all are held."""
+
+    def __init__(self, shape, count, stats):
+        self.shape = shape
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.free = []
+        self.free.extend(self._new() for _ in range(count))
+        self.size = count
+
+    def _new(self):
+        return SharedFrame(np.empty(self.shape, dtype=np.uint8), self.free.append, self.lock)
+
+    def acquire(self):
+        with self.lock:
+            if self.free:
+                frame = self.free.pop()
+            else:
+                frame = self._new()
+                self.size += 1
+                self.stats.allocated(frame.array.nbytes)
+            frame.refs = 1
+        return frame
+
+
+class FrameSource:
+    def __init__(self, size=(640, 480), buffers=3, pool_size=4):
+        self.width, self.height = size
+        self.ring = None if buffers is None else [np.empty((self.height, self.width, 3), dtype=np.uint8)
+                                                  for _ in range(buffers)]
+        self.index = 0
+        self.frames = 0
+        self.stats = CopyStats()
+        self.pool_size = pool_size
+        self.pool = None          # created by the first grab()
+        self.target = None        # pooled buffer the current grab() writes into
+
+    def next_buffer(self):
+        """Buffer to write the next frame into (None: let the backend allocate)."""
+        if self.target is not None:
+            return self.target
+        if self.ring is None:
+            return None
+        buf = self.ring[self.index]
+        self.index = (self.index + 1) % len(self.ring)
+        return buf
+
+    def store(self, image):
+        """Put an image coming from the backend into the next buffer (resized if needed)."""
+        buf = self.next_buffer()
+        if image.shape[:2] != (self.height, self.width):
+            if buf is None:
+                self.stats.allocated(self.height * self.width * 3)
+            self.stats.copied(self.height * self.width * 3)
+            return cv2.resize(image, (self.width, self.height), dst=buf)
+        if buf is None:
+            return image
+        np.copyto(buf, image)
+        self.stats.copied(image.nbytes)
+        return buf
+
+    def read(self):
+        raise NotImplementedError
+
+    def grab(self):
+        """
+        Next frame as (ok, SharedFrame, timestamp), written straight into a pooled
+        buffer. The caller owns one reference and must release() it.
+        """
+        if self.pool is None:
+            self.pool = BufferPool((self.height, self.width, 3), self.pool_size, self.stats)
+        shared = self.pool.acquire()
+        self.target = shared.array
+        try:
+            ok, image, t = self.read()
+        finally:
+            self.target = None
+        if not ok:
+            shared.release()
+            return False, None, t
+        if image.ctypes.data != shared.array.ctypes.data:
+            # The backend could not write in place
+            np.copyto(shared.array, image)
+            self.stats.copied(image.nbytes)
+        return True, shared, t
+
+    def copy_stats(self):
+        return self.stats.summary(self.frames)
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        while True:
+            ok, frame, t = self.read()
+            if not ok:
+                return
+            yield frame, t
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PicameraSource(FrameSource):
+    """
+    grab() hands out views of the camera's own buffers: the capture request is only
+    released back to the camera when the last holder releases the frame. At most
+    camera_buffers - 2 requests are held so the camera can keep streaming; past
+    that, frames are copied into the pool (and counted).
+
+    Timestamps are the sensor timestamps of the frames (start of exposure), moved
+    to the time.time() clock, so frames of two cameras can be compared. fps fixes
+    the frame duration instead of letting the exposure change it.
+    """
+
+    def __init__(self, camera_num=0, size=(640, 480), buffers=3, pool_size=4, camera_buffers=6, fps=None):
+        from picamera2 import Picamera2, MappedArray
+        super().__init__(size, buffers, pool_size)
+        self.MappedArray = MappedArray
+        self.picam2 = Picamera2(camera_num=camera_num)
+        # "RGB888" is stored as B, G, R bytes: frames are already BGR for OpenCV and
+        # the detector, at the size the pipeline works with, so nothing is converted
+        controls = {}
+        if fps:
+            period = int(1e6 / fps)
+            controls["FrameDurationLimits"] = (period, period)
+        config = self.picam2.create_preview_configuration(main={"format": "RGB888", "size": size},
+                                                          buffer_count=camera_buffers, controls=controls)
+        self.picam2.configure(config)
+        self.picam2.start()
+        self.lock = threading.Lock()
+        self.max_held = max(camera_buffers - 2, 0)
+        self.held = 0
+
+    def _capture(self):
+        request = self.picam2.capture_request()
+        mapped = self.MappedArray(request, "main", write=False)
+        return request, mapped, mapped.__enter__().array
+
+    @staticmethod
+    def _timestamp(request):
+        """Sensor timestamp (ns, CLOCK_BOOTTIME) of the request on the time.time() clock."""
+        sensor = request.get_metadata().get("SensorTimestamp")
+        now = time.time()
+        if sensor is None:
+            return now
+        return now - (time.clock_gettime_ns(time.CLOCK_BOOTTIME) - sensor) / 1e9
+
+    def read(self):
+        request, mapped, array = self._capture()
+        t = self._timestamp(request)
+        try:
+            buf = self.next_buffer()
+            if buf is None:
+                self.stats.allocated(array.nbytes)
+                image = array.copy()
+            else:
+                np.copyto(buf, array)
+                image = buf
+            self.stats.copied(array.nbytes)
+        finally:
+            mapped.__exit__(None, None, None)
+            request.release()
+        self.frames += 1
+        return True, image, t
+
+    def grab(self):
+        with self.lock:
+            zero_copy = self.held < self.max_held
+            if zero_copy:
+                self.held += 1
+        if not zero_copy:
+            return super().grab()
+        request, mapped, array = self._capture()
+        t = self._timestamp(request)
+
+        def give_back(frame):
+            # Called under self.lock by the last release()
+            mapped.__exit__(None, None, None)
+            request.release()
+            self.held -= 1
+
+        shared = SharedFrame(array, give_back, self.lock)
+        shared.refs = 1
+        self.frames += 1
+        return True, shared, t
+
+    def close(self):
+        self.picam2.stop()
+
+
+class VideoCaptureSource(FrameSource):
+    def __init__(self, index=0, size=(640, 480), buffers=3, pool_size=4):
+        super().__init__(size, buffers, pool_size)
+        self.cap = cv2.VideoCapture(index)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open camera {index}")
+
+    def _grab(self):
+        # Decode straight into our buffer when the size matches
+        buf = self.next_buffer()
+        ok, image = self.cap.read(buf) if buf is not None else self.cap.read()
+        if not ok:
+            return ok, image
+        if buf is None or image.ctypes.data != buf.ctypes.data:
+            self.stats.allocated(image.nbytes)
+        if image.shape[:2] != (self.height, self.width):
+            # The camera ignored the requested size: the decoder allocated, resize into our buffer
+            image = cv2.resize(image, (self.width, self.height), dst=buf)
+            self.stats.copied(image.nbytes)
+        return ok, image
+
+    def read(self):
+        ok, image = self._grab()
+        if not ok:
+            return False, None, time.time()
+        self.frames += 1
+        return True, image, time.time()
+
+    def close(self):
+        self.cap.release()
+
+
+class VideoFileSource(VideoCaptureSource):
+    """Recorded video; timestamps come from the file, realtime=True paces reads to them."""
+
+    def __init__(self, path, size=(640, 480), buffers=3, realtime=False, start_time=0.0, pool_size=4):
+        FrameSource.__init__(self, size, buffers, pool_size)
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.realtime = realtime
+        self.start_time = start_time          # timestamp of the first frame
+        self.wall_start = None
+
+    def read(self):
+        ok, image = self._grab()
+        if not ok:
+            return False, None, None
+        msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        t = self.start_time + (msec / 1000.0 if msec > 0 else self.frames / self.fps)
+        self.frames += 1
+        if self.realtime:
+            if self.wall_start is None:
+                self.wall_start = time.time() - (t - self.start_time)
+            delay = self.wall_start + (t - self.start_time) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return True, image, t
+
+
+class ImageFolderSource(FrameSource):
+    """Images of a folder in name order, timestamped at fps."""
+
+    def __init__(self, folder, size=(640, 480), buffers=3, fps=30.0, loop=False, pool_size=4):
+        super().__init__(size, buffers, pool_size)
+        self.paths = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = fps
+        self.loop = loop
+        self.position = 0
+
+    def read(self):
+        # Unreadable files are skipped, for at most one pass over the folder
+        image = None
+        for _ in range(len(self.paths)):
+            if self.position >= len(self.paths):
+                if not self.loop:
+                    break
+                self.position = 0
+            image = cv2.imread(self.paths[self.position])
+            self.position += 1
+            if image is not None:
+                break
+        if image is None:
+            return False, None, None
+        self.stats.allocated(image.nbytes)   # decoded by imread
+        t = self.frames / self.fps
+        self.frames += 1
+        return True, self.store(image), t
+
+
+def open_source(spec, **kwargs):
+    """
+    "picam" / "picam:1"  -> PicameraSource
+    "0", "1"             -> VideoCaptureSource (webcam index)
+    folder               -> ImageFolderSource
+    anything else        -> VideoFileSource
+    """
+    spec = str(spec)
+    if spec.startswith("picam"):
+        return PicameraSource(int(spec.partition(":")[2] or 0), **kwargs)
+    if spec.isdigit():
+        return VideoCaptureSource(int(spec), **kwargs)
+    if os.path.isdir(spec):
+        return ImageFolderSource(spec, **kwargs)
+    return VideoFileSource(spec, **kwargs)
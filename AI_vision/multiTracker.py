@@ -0,0 +1,138 @@
+"""
+Multi-object tracking over the detector output, with a sticky target policy.
+
+Detections are associated to existing tracks by IoU (Hungarian assignment when
+SciPy is available, greedy otherwise), so each object keeps its track id across
+frames. select() keeps steering toward the same track as long as it exists
+instead of taking whichever box comes first.
+
+    mot = MultiTracker()
+    mot.update(detections)      # list of (x1, y1, x2, y2, conf, cls)
+    target = mot.select()       # Track or None
+"""
+import numpy as np
+from boxes import iou_matrix
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+def greedy_assignment(cost):
+    """Fallback for linear_sum_assignment: repeatedly take the cheapest pair."""
+    rows, cols = [], []
+    if cost.size == 0:
+        return np.array(rows, dtype=int), np.array(cols, dtype=int)
+    # Pairs with cost >= 1 (no overlap) can never be matched, skip them
+    candidates = np.flatnonzero(cost < 1.0)
+    order = candidates[np.argsort(cost.ravel()[candidates])]
+    used_r, used_c = set(), set()
+    n = min(cost.shape)
+    for r, c in zip(*np.unravel_index(order, cost.shape)):
+        if r not in used_r and c not in used_c:
+            used_r.add(r)
+            used_c.add(c)
+            rows.append(r)
+            cols.append(c)
+            if len(rows) == n:
+                break
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
+class Track:
+    __slots__ = ("id", "box", "conf", "cls", "hits", "age", "misses")
+
+    def __init__(self, id, detection):
+        self.id = id
+        self.box = tuple(detection[:4])
+        self.conf = detection[4]
+        self.cls = detection[5]
+        self.hits = 1        # detections associated so far
+        self.age = 1         # updates since creation
+        self.misses = 0      # consecutive updates without detection
+
+    def update(self, detection):
+        self.box = tuple(detection[:4])
+        # Smooth the confidence so one weak frame doesn't drop the target
+        self.conf = 0.7 * self.conf + 0.3 * detection[4]
+        self.hits += 1
+        self.misses = 0
+
+    @property
+    def center(self):
+        x1, y1, x2, y2 = self.box
+        return int((x1 + x2) // 2), int((y1 + y2) // 2)
+
+
+class MultiTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=5, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses    # updates a track survives without detection
+        self.min_hits = min_hits        # detections before a track can become the target
+        self.tracks = []
+        self.next_id = 1
+        self.target_id = None
+
+    def update(self, detections):
+        """Associate a new batch of detections, returns the live tracks."""
+        for track in self.tracks:
+            track.age += 1
+            track.misses += 1
+
+        if detections and self.tracks:
+            det = np.array([d[:4] for d in detections], dtype=np.float32)
+            trk = np.array([t.box for t in self.tracks], dtype=np.float32)
+            iou = iou_matrix(trk, det)
+            # Only boxes of the same class can continue a track
+            same_cls = np.array([t.cls for t in self.tracks])[:, None] == np.array([d[5] for d in detections])[None, :]
+            iou = np.where(same_cls, iou, 0.0)
+            assign = linear_sum_assignment or greedy_assignment
+            rows, cols = assign(1.0 - iou)
+            matched = iou[rows, cols] >= self.iou_threshold
+            rows, cols = rows[matched], cols[matched]
+        else:
+            rows = cols = np.zeros(0, dtype=int)
+
+        for r, c in zip(rows, cols):
+            self.tracks[r].update(detections[c])
+        assigned = set(cols.tolist())
+        for i, d in enumerate(detections):
+            if i not in assigned:
+                self.tracks.append(Track(self.next_id, d))
+                self.next_id += 1
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return self.tracks
+
+    @property
+    def target(self):
+        for track in self.tracks:
+            if track.id == self.target_id:
+                return track
+        return None
+
+    def select(self):
+        """Stick with the current target while its track lives, else pick the best confirmed track."""
+        track = self.target
+        if track is not None:
+            return track
+        confirmed = [t for t in self.tracks if t.hits >= self.min_hits and t.misses == 0]
+        if not confirmed:
+            self.target_id = None
+            return None
+        track = max(confirmed, key=lambda t: (t.conf, t.hits))
+        self.target_id = track.id
+        return track
+
+    def match_target(self, detections):
+        """Detection overlapping the current target the most (best confidence if no target yet)."""
+        if not detections:
+            return None
+        track = self.target
+        if track is None:
+            return max(detections, key=lambda d: d[4])
+        iou = iou_matrix(np.array([track.box], dtype=np.float32),
+                         np.array([d[:4] for d in detections], dtype=np.float32))[0]
+        best = int(iou.argmax())
+        return detections[best] if iou[best] > 0 else None
@@ -0,0 +1,175 @@
+"""
+PID steering for the motor loop, with slew-rate limiting and change suppression.
+
+MotorController turns the target position into (mot1, mot2, mot3) like
+tracking.direc, but through two PID axes (yaw -> differential side motors,
+depth -> vertical motor). Outputs are rate-limited, and update() returns None
+when no motor changed by more than change_threshold, so the serial link only
+carries meaningful commands (plus a keepalive).
+
+Run this file to tune gains against a simulated plant:
+
+    python pid.py --kp 0.2 --ki 0.05 --kd 0.02
+"""
+import argparse
+
+
+class PID:
+    def __init__(self, kp, ki=0.0, kd=0.0, kf=0.0, limit=255, slew_rate=None, integral_limit=None):
+        self.kp, self.ki, self.kd, self.kf = kp, ki, kd, kf
+        self.limit = limit
+        self.slew_rate = slew_rate          # max output change per second (None = unlimited)
+        self.integral_limit = integral_limit if integral_limit is not None else limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.prev_error = None
+        self.output = 0.0
+
+    def update(self, error, dt, feedforward=0.0):
+        if dt <= 0:
+            return self.output
+        derivative = 0.0 if self.prev_error is None else (error - self.prev_error) / dt
+        self.prev_error = error
+
+        # Anti-windup: clamp the integral contribution to integral_limit
+        if self.ki:
+            self.integral += error * dt
+            bound = self.integral_limit / abs(self.ki)
+            self.integral = max(-bound, min(bound, self.integral))
+
+        out = self.kp * error + self.ki * self.integral + self.kd * derivative + self.kf * feedforward
+        out = max(-self.limit, min(self.limit, out))
+        if self.slew_rate is not None:
+            step = self.slew_rate * dt
+            out = max(self.output - step, min(self.output + step, out))
+        self.output = out
+        return out
+
+
+class MotorController:
+    def __init__(self, yaw=None, depth=None, center=(320, 240), dead_band=10,
+                 change_threshold=4, keepalive=1.0, period=0.05):
+        # Default gains start from the proportional law of tracking.direc
+        self.yaw = yaw or PID(kp=255 / 1280, ki=0.02, kd=0.01, slew_rate=600)
+        self.depth = depth or PID(kp=255 / 480, ki=0.05, kd=0.02, slew_rate=600)
+        self.center = center
+        self.dead_band = dead_band
+        self.change_threshold = change_threshold
+        self.keepalive = keepalive          # resend unchanged commands at least this often (s)
+        self.period = period                # nominal motor tick (s), the dt of the first update
+        self.last_time = None
+        self.last_sent = None
+        self.last_sent_time = 0.0
+        # Stats
+        self.updates = 0
+        self.suppressed = 0
+
+    def reset(self):
+        self.yaw.reset()
+        self.depth.reset()
+        self.last_time = None
+
+    def override(self):
+        """Someone else drove the motors (manual control): forget state and the last command sent."""
+        self.reset()
+        self.last_sent = None
+
+    def _emit(self, speeds, t):
+        """Return the command if it differs enough from the last one sent, else None."""
+        self.updates += 1
+        if (self.last_sent is not None and t - self.last_sent_time < self.keepalive
+                and max(abs(a - b) for a, b in zip(speeds, self.last_sent)) < self.change_threshold):
+            self.suppressed += 1
+            return None
+        self.last_sent = speeds
+        self.last_sent_time = t
+        return tuple((i + 1, s) for i, s in enumerate(speeds))
+
+    def update(self, target, t):
+        """target: (x, y) in the image. Returns ((1, m1), (2, m2), (3, m3)) or None if suppressed."""
+        # First tick after a reset: one nominal period, so the output is still clamped
+        # and slewed from the previous one (0 after a stop)
+        dt = self.period if self.last_time is None else t - self.last_time
+        self.last_time = t
+        dx = self.center[0] - target[0]
+        dy = self.center[1] - target[1]
+        dx = dx if abs(dx) > self.dead_band else 0
+        dy = dy if abs(dy) > self.dead_band else 0
+        # Inside the dead-band the integral is cleared, otherwise it keeps pushing and hunts
+        if dx == 0:
+            self.yaw.integral = 0.0
+        if dy == 0:
+            self.depth.integral = 0.0
+        turn = self.yaw.update(dx, dt)
+        climb = self.depth.update(dy, dt)
+        speeds = (round(turn), round(-turn), round(climb))
+        return self._emit(speeds, t)
+
+    def stop(self, t):
+        """Stop command, or None if the motors were already stopped recently."""
+        self.reset()
+        return self._emit((0, 0, 0), t)
+
+
+# ================================================
+# Simulated plant for offline tuning
+# ================================================
+class Plant:
+    """
+    One axis of the vehicle seen from the camera: the motor command accelerates the
+    yaw rate (first-order lag tau), which moves the target in the image.
+    """
+
+    def __init__(self, offset=200.0, gain=3.0, tau=0.4, drag=1.5):
+        self.offset = offset      # target position relative to the image center (px)
+        self.rate = 0.0           # px/s
+        self.gain = gain
+        self.tau = tau
+        self.drag = drag
+
+    def step(self, command, dt):
+        accel = (self.gain * command - self.drag * self.rate) / self.tau
+        self.rate += accel * dt
+        self.offset += self.rate * dt
+        return self.offset
+
+
+def simulate(controller, plant, duration=10.0, dt=0.05):
+    """Run the yaw axis in closed loop, returns (trace, commands_sent)."""
+    trace, sent, t = [], 0, 0.0
+    command = 0
+    while t < duration:
+        cmd = controller.update((controller.center[0] + plant.offset, controller.center[1]), t)
+        if cmd is not None:
+            command = cmd[0][1]
+            sent += 1
+        trace.append((t, plant.step(command, dt), command))
+        t += dt
+    return trace, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the yaw PID against a simulated plant")
+    parser.add_argument("--kp", type=float, default=255 / 1280)
+    parser.add_argument("--ki", type=float, default=0.02)
+    parser.add_argument("--kd", type=float, default=0.01)
+    parser.add_argument("--slew", type=float, default=600)
+    parser.add_argument("--offset", type=float, default=200, help="initial target offset (px)")
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    controller = MotorController(yaw=PID(args.kp, args.ki, args.kd, slew_rate=args.slew))
+    trace, sent = simulate(controller, Plant(offset=args.offset), args.duration)
+
+    overshoot = max(0.0, -min(o for _, o, _ in trace)) if args.offset > 0 else max(0.0, max(o for _, o, _ in trace))
+    settled = next((t for t, _, _ in trace
+                    if all(abs(o) <= controller.dead_band for tt, o, _ in trace if tt >= t)), None)
+    print(f"final offset {trace[-1][1]:.1f} px, overshoot {overshoot:.1f} px, "
+          f"settling time {settled if settled is None else round(settled, 2)} s")
+    print(f"{sent} commands sent over {len(trace)} ticks ({controller.suppressed} suppressed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Capture -> inference pipeline shared by the main scripts.
+
+    capture thread --> frames (latest frame slot) --> inference thread --> results (latest result slot)
+
+The capture loop never waits for the model: it overwrites the frame slot, and
+the inference worker always picks the freshest frame when it is ready for a new
+one, so detection runs as fast as the model allows instead of every N frames.
+
+With a FrameSource, frames are shared without copies (FrameSource.grab()): the
+frame slot holds one reference, and whoever gets a frame from it holds another
+until it calls frame.release(), so the buffer is reused only once nobody reads it.
+
+With a DetectionScheduler (scheduler.py), the worker only runs the model on the
+frames the scheduler picks, to meet its latency and CPU budgets.
+
+With a Telemetry (telemetry.py), the capture, inference and capture -> result
+latency of every frame go into its stage histograms. Frames a MotionGate answers
+with its previous detections (infer.reused) are counted apart, not timed.
+"""
+import time
+import threading
+from collections import deque
+
+
+class LatestSlot:
+    """
+    Single-slot buffer: put() overwrites, get() waits for something newer.
+    refcounted=True: items have retain()/release(); the slot owns the reference
+    put() hands it, and get()/peek() retain the item for the caller.
+    """
+
+    def __init__(self, refcounted=False):
+        self.cond = threading.Condition()
+        self.item = None
+        self.version = 0
+        self.refcounted = refcounted
+
+    def put(self, item):
+        with self.cond:
+            old, self.item = self.item, item
+            self.version += 1
+            self.cond.notify_all()
+            if self.refcounted and old is not None:
+                old.release()
+
+    def _take(self):
+        if self.refcounted and self.item is not None:
+            self.item.retain()
+        return self.version, self.item
+
+    def get(self, after=0, timeout=None):
+        """Return (version, item) once version > after, or (after, None) on timeout."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.version > after, timeout):
+                return after, None
+            return self._take()
+
+    def peek(self):
+        with self.cond:
+            return self._take()
+
+    def clear(self):
+        self.put(None)
+
+
+class Frame:
+    __slots__ = ("id", "timestamp", "image", "buffer")
+
+    def __init__(self, id, timestamp, image, buffer=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.image = image
+        self.buffer = buffer      # SharedFrame holding image, None for plain arrays
+
+    def retain(self):
+        if self.buffer is not None:
+            self.buffer.retain()
+        return self
+
+    def release(self):
+        if self.buffer is not None:
+            self.buffer.release()
+
+
+class Result:
+    __slots__ = ("frame_id", "frame_timestamp", "timestamp", "detections", "inference_time")
+
+    def __init__(self, frame_id, frame_timestamp, timestamp, detections, inference_time):
+        self.frame_id = frame_id
+        self.frame_timestamp = frame_timestamp   # capture time of the frame used
+        self.timestamp = timestamp               # time the detections became available
+        self.detections = detections
+        self.inference_time = inference_time
+
+    @property
+    def latency(self):
+        return self.timestamp - self.frame_timestamp
+
+
+class DetectionPipeline:
+    """
+    capture: a FrameSource (frameSource.py), or a callable returning the next image
+             (None ends the stream). Frames from a source are read-only shared views:
+             call frame.release() on every frame got from self.frames.
+    infer: callable image -> list of (x1, y1, x2, y2, conf, cls)
+    scheduler: optional DetectionScheduler deciding which frames go through the model
+               (feed it the target with scheduler.update_target()).
+    telemetry: optional Telemetry receiving the stage timings.
+    """
+
+    def __init__(self, capture, infer, history=100, scheduler=None, telemetry=None):
+        self.capture = capture
+        self.infer = infer
+        self.scheduler = scheduler
+        self.telemetry = telemetry
+        self.frames = LatestSlot(refcounted=True)
+        self.results = LatestSlot()
+        self.running = False
+        self.threads = []
+        # Stats
+        self.frames_captured = 0
+        self.inferences = 0
+        self.reused = 0           # frames answered by a MotionGate without running the model
+        self.frames_skipped = 0   # captured frames the model never saw
+        self.detections = 0
+        self.latencies = deque(maxlen=history)
+        self.inference_times = deque(maxlen=history)
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                        threading.Thread(target=self._inference_loop, daemon=True)]
+        for t in self.threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        for t in self.threads:
+            t.join(timeout=2)
+        self.frames.clear()
+
+    def _capture_loop(self):
+        frame_id = 0
+        grab = getattr(self.capture, "grab", None)
+        telemetry = self.telemetry
+        while self.running:
+            if telemetry is not None:
+                t0 = time.perf_counter()
+            if grab is not None:
+                ok, shared, timestamp = grab()
+                if not ok:
+                    break
+                frame = Frame(frame_id + 1, timestamp, shared.image, shared)
+            else:
+                image = self.capture()
+                if image is None:
+                    break
+                frame = Frame(frame_id + 1, time.time(), image)
+            frame_id += 1
+            self.frames_captured += 1
+            if telemetry is not None:
+                telemetry.lap("capture", t0)
+            if self.scheduler is not None:
+                self.scheduler.frame(frame.timestamp)
+            self.frames.put(frame)   # the slot takes over our reference
+        self.running = False
+
+    def _inference_loop(self):
+        last_version = 0
+        last_frame_id = 0
+        while self.running:
+            last_version, frame = self.frames.get(last_version, timeout=0.5)
+            if frame is None:
+                continue
+            if self.scheduler is not None and not self.scheduler.should_detect(frame.timestamp):
+                frame.release()
+                continue
+            self.frames_skipped += frame.id - last_frame_id - 1
+            last_frame_id = frame.id
+            t0 = time.time()
+            try:
+                detections = self.infer(frame.image)
+            finally:
+                frame.release()
+            t1 = time.time()
+            result = Result(frame.id, frame.timestamp, t1, detections, t1 - t0)
+            reused = getattr(self.infer, "reused", False)
+            self.detections += len(detections)
+            if self.scheduler is not None:
+                self.scheduler.record_inference(frame.timestamp, result.inference_time, reused)
+            # Reused detections cost nothing: kept out of the model timings, like in the scheduler
+            if reused:
+                self.reused += 1
+            else:
+                self.inferences += 1
+                if self.telemetry is not None:
+                    self.telemetry.add("inference", result.inference_time)
+                    self.telemetry.add("detection_latency", result.latency)
+                self.latencies.append(result.latency)
+                self.inference_times.append(result.inference_time)
+            self.results.put(result)
+
+    def stats(self):
+        """Latency is capture -> detections available, in seconds, over the frames the model ran on."""
+        lat = sorted(self.latencies)
+        return {
+            "frames_captured": self.frames_captured,
+            "inferences": self.inferences,
+            "reused": self.reused,
+            "frames_skipped": self.frames_skipped,
+            "detections": self.detections,
+            "inference_mean": sum(self.inference_times) / len(self.inference_times) if self.inference_times else 0.0,
+            "latency_mean": sum(lat) / len(lat) if lat else 0.0,
+            "latency_p95": lat[int(0.95 * (len(lat) - 1))] if lat else 0.0,
+        }
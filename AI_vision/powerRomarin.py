@@ -88,17 +88,13 @@ try:
                 
                 mot1, mot2, mot3 = tr.direc(center_x, center_y, 320, 240)
                 # Optionally send commands multiple times based on the frame count and skip interval
-                tr.send_command(mot1)
-                tr.send_command(mot2)
-                tr.send_command(mot3)
+                tr.send_motors(mot1, mot2, mot3)
 
         # Display the detection window
         cv2.imshow("Detection", img)
         # Check if the 'n' key was pressed to break the loop
         if cv2.waitKey(1) == ord('n'):
-            tr.send_command((1, 0))
-            tr.send_command((2, 0))
-            tr.send_command((3, 0))
+            tr.send_motors((1, 0), (2, 0), (3, 0))
             break
 
 finally:
@@ -0,0 +1,75 @@
+"""
+Binary motor command protocol shared with Arduino/motor_control/motor_control.ino
+
+One frame carries the three motor speeds of a control tick (10 bytes):
+
+    0xAA 0x55 | seq (uint8) | mot1 mot2 mot3 (int16, little endian) | checksum (uint8)
+
+The checksum is the XOR of the seq byte and the six payload bytes.
+"""
+import struct
+
+SYNC = b"\xAA\x55"
+FRAME_SIZE = 10
+MAX_SPEED = 255
+
+_body = struct.Struct("<Bhhh")
+
+
+def checksum(data):
+    c = 0
+    for b in data:
+        c ^= b
+    return c
+
+
+def encode_motors(speeds, seq):
+    """Build one frame from the (mot1, mot2, mot3) speeds."""
+    for speed in speeds:
+        if not -MAX_SPEED <= speed <= MAX_SPEED:
+            raise ValueError(f"speed out of range: {speed}")
+    body = _body.pack(seq & 0xFF, *(int(s) for s in speeds))
+    return SYNC + body + bytes([checksum(body)])
+
+
+def decode_motors(frame):
+    """Return (seq, (mot1, mot2, mot3)) from a complete frame."""
+    if len(frame) != FRAME_SIZE or frame[:2] != SYNC:
+        raise ValueError("bad frame header")
+    body = frame[2:-1]
+    if checksum(body) != frame[-1]:
+        raise ValueError("bad checksum")
+    seq, m1, m2, m3 = _body.unpack(body)
+    return seq, (m1, m2, m3)
+
+
+class FrameParser:
+    """Incremental parser: feed raw serial bytes, get back decoded frames."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.errors = 0
+
+    def feed(self, data):
+        self.buffer += data
+        decoded = []
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                # Keep the last byte, it may be the first half of the sync
+                del self.buffer[:-1]
+                break
+            del self.buffer[:start]
+            if len(self.buffer) < FRAME_SIZE:
+                break
+            try:
+                decoded.append(decode_motors(bytes(self.buffer[:FRAME_SIZE])))
+            except ValueError:
+                # Resynchronize on the next sync sequence
+                self.errors += 1
+                del self.buffer[:1]
+                continue
+            self.frames += 1
+            del self.buffer[:FRAME_SIZE]
+        return decoded
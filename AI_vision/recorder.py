@@ -0,0 +1,406 @@
+"""
+Dive recorder: video and a time-indexed log of everything the control loop saw and did.
+
+Hot-path calls only copy into a preallocated buffer (frames) or append a tuple
+(events) and return; a background thread encodes and writes. Both queues are
+bounded: what doesn't fit is dropped and counted, the loop is never slowed down.
+
+A dive is a folder of fixed-length segments, so any timestamp of a multi-hour
+dive is reached by opening one segment:
+
+    dives/20250612-101500/
+        meta.json                 frame size, codec, drop counts
+        index.jsonl               one line per segment: time range, first frame, files
+        segment_00000.avi         MJPG video (every frame is a keyframe: exact seeks)
+        segment_00000.npz         columnar log: <stream>.<column> arrays, sorted by time
+        segment_00001.partial.npz log of the segment being recorded, rewritten every
+        partial.json              checkpoint seconds with its index entry
+
+A segment's log only becomes segment_*.npz when the segment closes; until then
+the partial files are the crash copy, so a crash or power loss costs at most the
+last checkpoint seconds of log (and the open segment's video if its container
+can't be read). DiveReader opens such a dive, including one that crashed before
+its first segment closed.
+
+Streams: frames (t, frame), inferences (t, at, count), detections (t, x1, y1, x2,
+y2, conf, cls), tracker (t, at, x1, y1, x2, y2, vx, vy; NaN when lost), keys (t,
+state: bit i set when key i of tracking.telecom is pressed), ticks (t) of the motor
+loop and commands (t, motor, speed), the last one fed by tracking.send_command.
+t is the frame capture time, at the time the control loop used it (NaN if unknown):
+with the motor ticks, that is what replay.py needs to reproduce the command stream.
+
+    recorder = DiveRecorder("dives").start()
+    tr.recorder = recorder                 # log every motor command
+    recorder.frame(image, t)
+    recorder.detections(t, detections)
+    recorder.close()
+
+    dive = DiveReader("dives/20250612-101500")
+    t, image = dive.seek(dive.start + 3600)
+    commands = dive.table("commands", t0, t1)
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+# Log format, in meta.json. 1: no ticks stream, no "at" column (DiveReader fills
+# missing streams and columns: no rows, NaN or 0). 2: ticks and "at" added.
+FORMAT = 2
+
+STREAMS = {
+    "frames": (("t", np.float64), ("frame", np.int64)),
+    "inferences": (("t", np.float64), ("at", np.float64), ("count", np.int16)),
+    "detections": (("t", np.float64), ("x1", np.float32), ("y1", np.float32), ("x2", np.float32),
+                   ("y2", np.float32), ("conf", np.float32), ("cls", np.int16)),
+    "tracker": (("t", np.float64), ("at", np.float64), ("x1", np.float64), ("y1", np.float64),
+                ("x2", np.float64), ("y2", np.float64), ("vx", np.float32), ("vy", np.float32)),
+    "keys": (("t", np.float64), ("state", np.uint8)),
+    "ticks": (("t", np.float64),),
+    "commands": (("t", np.float64), ("motor", np.int8), ("speed", np.int16)),
+}
+
+
+class DiveRecorder:
+    """
+    root: folder the dive folder is created in (named after the start time).
+    segment: seconds per segment. max_frames / max_events: queue bounds.
+    checkpoint: seconds between two saves of the open segment's log.
+    """
+
+    def __init__(self, root="dives", segment=60.0, fps=30.0, codec="MJPG", quality=80,
+                 max_frames=8, max_events=100000, checkpoint=5.0):
+        self.path = os.path.join(root, time.strftime("%Y%m%d-%H%M%S"))
+        n = 1
+        while os.path.exists(self.path if n == 1 else f"{self.path}-{n}"):
+            n += 1
+        self.path = self.path if n == 1 else f"{self.path}-{n}"
+        self.segment = segment
+        self.fps = fps
+        self.codec = codec
+        self.quality = quality
+        self.max_events = max_events
+        self.checkpoint = checkpoint
+        self.last_checkpoint = 0.0
+        self.frames = deque()              # (t, buffer) waiting for the writer
+        self.free = []                     # frame buffers, allocated on the first frame
+        self.max_frames = max_frames
+        self.events = deque()              # (stream, row)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        # Writer state
+        self.size = None
+        self.video = None
+        self.rows = {}
+        self.segments = 0
+        self.segment_start = None
+        self.segment_frame0 = 0
+        self.frame_count = 0
+        # Stats
+        self.frames_dropped = 0
+        self.events_dropped = 0
+        self.events_recorded = 0
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._write_meta()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    # ------------------------------------------------
+    # Hot path
+    # ------------------------------------------------
+    def frame(self, image, t):
+        """Queue a copy of a BGR frame taken at t; dropped (and counted) if the writer is behind."""
+        with self.lock:
+            if self.size is None:
+                self.size = (image.shape[1], image.shape[0])
+                self.free = [np.empty_like(image) for _ in range(self.max_frames)]
+            if not self.free or image.shape[1::-1] != self.size:
+                self.frames_dropped += 1
+                return
+            buffer = self.free.pop()
+        np.copyto(buffer, image)
+        self.frames.append((t, buffer))
+        self.wake.set()
+
+    def _event(self, stream, row):
+        if len(self.events) >= self.max_events:
+            self.events_dropped += 1
+            return
+        self.events.append((stream, row))
+
+    def detections(self, t, detections, at=np.nan):
+        """Result of one model run on the frame taken at t, used by the control loop at at."""
+        self._event("inferences", (t, at, len(detections)))
+        for (x1, y1, x2, y2, conf, cls) in detections:
+            self._event("detections", (t, x1, y1, x2, y2, conf, cls))
+
+    def tracker(self, t, box, velocity=(0.0, 0.0), at=np.nan):
+        """Tracked target box (x1, y1, x2, y2) of the frame taken at t, or None when there is no target."""
+        if box is None:
+            self._event("tracker", (t, at) + (np.nan,) * 6)
+        else:
+            self._event("tracker", (t, at) + tuple(box[:4]) + tuple(velocity))
+
+    def keys(self, t, state):
+        """Manual control keys state (tracking.telecom order), stored as a bitmask."""
+        self._event("keys", (t, sum(1 << i for i, pressed in enumerate(state) if pressed)))
+
+    def tick(self, t):
+        """One motor loop iteration at t."""
+        self._event("ticks", (t,))
+
+    def command(self, t, motor, speed):
+        self._event("commands", (t, motor, speed))
+
+    # ------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------
+    def _run(self):
+        while self.running or self.frames:
+            self.wake.wait(0.2)
+            self.wake.clear()
+            self._drain()
+            if self.segment_start is not None and time.monotonic() - self.last_checkpoint >= self.checkpoint:
+                self._write_partial()
+        self._drain()
+        self._close_segment()
+
+    def _drain(self):
+        while self.frames:
+            t, buffer = self.frames.popleft()
+            self._drain_events(t)
+            self._roll(t)
+            if self.video is None:
+                self._open_video()
+            self.video.write(buffer)
+            self.rows["frames"].append((t, self.frame_count))
+            self.frame_count += 1
+            with self.lock:
+                self.free.append(buffer)
+        self._drain_events()
+
+    def _drain_events(self, until=None):
+        """Log the queued events up to time until (all of them by default)."""
+        while self.events and (until is None or self.events[0][1][0] <= until):
+            stream, row = self.events.popleft()
+            self._roll(row[0])
+            self.rows[stream].append(row)
+            self.events_recorded += 1
+
+    def _name(self, ext):
+        return f"segment_{self.segments:05d}.{ext}"
+
+    def _roll(self, t):
+        """Start a new segment for an item at t if needed."""
+        if self.segment_start is not None and t - self.segment_start >= self.segment:
+            self._close_segment()
+        if self.segment_start is None:
+            self.segment_start = t
+            self.segment_frame0 = self.frame_count
+            self.rows = {stream: [] for stream in STREAMS}
+
+    def _open_video(self):
+        self.video = cv2.VideoWriter(os.path.join(self.path, self._name("avi")),
+                                     cv2.VideoWriter_fourcc(*self.codec), self.fps, self.size)
+        self.video.set(cv2.VIDEOWRITER_PROP_QUALITY, self.quality)
+
+    def _segment(self, log):
+        """Columns and index entry of the open segment, its log stored in file log."""
+        columns = {}
+        times = []
+        for stream, rows in self.rows.items():
+            rows.sort(key=lambda row: row[0])
+            for i, (name, dtype) in enumerate(STREAMS[stream]):
+                columns[f"{stream}.{name}"] = np.array([row[i] for row in rows], dtype=dtype)
+            if rows:
+                times += [rows[0][0], rows[-1][0]]
+        entry = {"segment": self.segments, "t0": min(times, default=self.segment_start),
+                 "t1": max(times, default=self.segment_start), "frame0": self.segment_frame0,
+                 "frames": self.frame_count - self.segment_frame0,
+                 "video": self._name("avi") if self.rows["frames"] else None, "log": log}
+        return columns, entry
+
+    def _replace(self, name, write):
+        """Write a file through a temporary one, so a crash never leaves it half written."""
+        path = os.path.join(self.path, name)
+        with open(path + ".tmp", "wb") as f:
+            write(f)
+        os.replace(path + ".tmp", path)
+
+    def _write_partial(self):
+        """Checkpoint of the open segment's log, what a crash would leave."""
+        columns, entry = self._segment(self._name("partial.npz"))
+        entry["partial"] = True
+        self._replace(entry["log"], lambda f: np.savez(f, **columns))
+        self._replace("partial.json", lambda f: f.write(json.dumps(entry).encode()))
+        self._write_meta()
+        self.last_checkpoint = time.monotonic()
+
+    def _close_segment(self):
+        if self.segment_start is None:
+            return
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+        columns, entry = self._segment(self._name("npz"))
+        np.savez_compressed(os.path.join(self.path, entry["log"]), **columns)
+        with open(os.path.join(self.path, "index.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        for name in ("partial.json", self._name("partial.npz")):
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        self.segments += 1
+        self.segment_start = None
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {"format": FORMAT, "size": self.size, "fps": self.fps, "codec": self.codec, "segment": self.segment,
+                "segments": self.segments, "frames": self.frame_count, **self.stats()}
+        self._replace("meta.json", lambda f: f.write(json.dumps(meta, indent=1).encode()))
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def stats(self):
+        return {
+            "frames_recorded": self.frame_count,
+            "frames_dropped": self.frames_dropped,
+            "events_recorded": self.events_recorded,
+            "events_dropped": self.events_dropped,
+        }
+
+
+class DiveReader:
+    """
+    Random access to a recorded dive: segments are found from index.jsonl by time.
+    A dive that was not closed (crash) ends with the last checkpoint of its open segment.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = []
+        if os.path.exists(os.path.join(path, "index.jsonl")):
+            with open(os.path.join(path, "index.jsonl")) as f:
+                for line in f:
+                    try:
+                        self.index.append(json.loads(line))
+                    except ValueError:
+                        break       # last line cut by a crash
+        partial = os.path.join(path, "partial.json")
+        if os.path.exists(partial):
+            with open(partial) as f:
+                entry = json.load(f)
+            if entry["segment"] == len(self.index):
+                self.index.append(entry)
+        self.meta = {}
+        if os.path.exists(os.path.join(path, "meta.json")):
+            with open(os.path.join(path, "meta.json")) as f:
+                self.meta = json.load(f)
+        self.format = self.meta.get("format", 1)
+        self.ends = [entry["t1"] for entry in self.index]
+        self.start = self.index[0]["t0"] if self.index else 0.0
+        self.end = self.index[-1]["t1"] if self.index else 0.0
+        self.cache = {}
+
+    def segment_at(self, t):
+        """Index of the first segment ending at or after t (None past the end)."""
+        i = bisect.bisect_left(self.ends, t)
+        return i if i < len(self.index) else None
+
+    def log(self, segment):
+        """Columns of one segment, {"<stream>.<column>": array}."""
+        if segment not in self.cache:
+            with np.load(os.path.join(self.path, self.index[segment]["log"])) as data:
+                self.cache = {segment: {name: data[name] for name in data.files}}
+        return self.cache[segment]
+
+    def table(self, stream, t0=None, t1=None):
+        """{column: array} of a stream between t0 and t1 (inclusive), over all segments needed."""
+        t0 = self.start if t0 is None else t0
+        t1 = self.end if t1 is None else t1
+        first = self.segment_at(t0)
+        parts = {name: [] for name, _ in STREAMS[stream]}
+        if first is not None:
+            for segment in range(first, len(self.index)):
+                if self.index[segment]["t0"] > t1:
+                    break
+                log = self.log(segment)
+                t = log.get(f"{stream}.t")
+                if t is None:
+                    continue        # stream added after this dive was recorded
+                lo, hi = np.searchsorted(t, t0, "left"), np.searchsorted(t, t1, "right")
+                for name, dtype in STREAMS[stream]:
+                    column = log.get(f"{stream}.{name}")
+                    if column is None:
+                        # Column added after this dive was recorded: NaN (0 for integers)
+                        column = np.full(len(t), np.nan if np.issubdtype(dtype, np.floating) else 0, dtype)
+                    parts[name].append(column[lo:hi])
+        table = {name: np.concatenate(arrays) if arrays else np.empty(0, dtype)
+                 for (name, dtype), arrays in zip(STREAMS[stream], parts.values())}
+        # Items near a segment boundary may have landed in the next segment
+        order = np.argsort(table["t"], kind="stable")
+        return {name: column[order] for name, column in table.items()}
+
+    def frames(self, t0=None, t1=None):
+        """Yield (t, image) of the recorded frames between t0 and t1, seeking to t0 first."""
+        t0 = self.start if t0 is None else t0
+        t1 = self.end if t1 is None else t1
+        first = self.segment_at(t0)
+        if first is None:
+            return
+        for segment in range(first, len(self.index)):
+            entry = self.index[segment]
+            if entry["t0"] > t1:
+                break
+            if entry["video"] is None:
+                continue
+            times = self.log(segment)["frames.t"]
+            start = int(np.searchsorted(times, t0))
+            if start >= len(times):
+                continue
+            cap = cv2.VideoCapture(os.path.join(self.path, entry["video"]))
+            if start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            try:
+                for t in times[start:]:
+                    if t > t1:
+                        return
+                    ok, image = cap.read()
+                    if not ok:
+                        break
+                    yield float(t), image
+            finally:
+                cap.release()
+
+    def seek(self, t):
+        """First recorded frame at or after t, as (t, image), or (None, None)."""
+        return next(self.frames(t), (None, None))
+
+    def replay_commands(self, send, t0=None, t1=None, speed=1.0):
+        """
+        Send the recorded command stream again, in order: send(motor, speed) e.g.
+        tracking.send_command-like or SerialWriter.submit. speed scales the pacing
+        (0 = as fast as possible).
+        """
+        commands = self.table("commands", t0, t1)
+        wall_start = time.time()
+        for t, motor, value in zip(commands["t"], commands["motor"], commands["speed"]):
+            if speed > 0:
+                delay = (t - commands["t"][0]) / speed - (time.time() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            send(int(motor), int(value))
+        return len(commands["t"])
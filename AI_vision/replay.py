@@ -0,0 +1,337 @@
+"""
+Deterministic replay of a recorded dive (recorder.py) through the decision logic
+of finalRomarin (autopilot.py), as fast as the CPU allows.
+
+Time is virtual: every frame is handled at the time the live control loop handled
+it, the motor loop ticks when it ticked during the dive (20 Hz when the recording
+has no ticks), the model answers after a fixed simulated latency and the manual
+keys are played back from the recording. The motors are driven through
+SerialWriter into a mocked serial port, so the same settings always give the same
+command trace, which is compared with the recorded one (sample-and-hold per motor).
+
+    python replay.py dives/20250612-101500 --detection-timeout 0.5 --sorting "cell phone"
+    python replay.py dives/* --skip-interval 5 --jobs 4 --out replays
+    python replay.py dives/20250612-101500 --recorded-detections   # no model, only the decisions
+    python replay.py dives/20250612-101500 --recorded-detections --recorded-tracker   # no video
+
+The optical flow tracker sees the decoded video, which is close to but not exactly
+what the camera gave (MJPG), so re-running it can move the target by a pixel. With
+--recorded-detections --recorded-tracker the replay reproduces the recorded command
+stream exactly, as long as the decision logic is unchanged.
+
+Each dive gives <out>/<dive>.csv (replayed commands: t, motor, speed) and
+<out>/<dive>.json (settings, stats and the diff).
+"""
+import os
+import json
+import argparse
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+from protocol import FrameParser
+from serialWriter import SerialWriter
+from recorder import DiveReader
+from autopilot import Autopilot
+
+
+class MockSerial:
+    """Serial port stand-in for SerialWriter: decodes and keeps what would go on the wire."""
+
+    def __init__(self):
+        self.parser = FrameParser()
+        self.frames = []            # (seq, (mot1, mot2, mot3))
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.frames += self.parser.feed(data)
+        return len(data)
+
+
+class ClassNames(dict):
+    """Class names when no model is loaded: the class index as a string."""
+
+    def __missing__(self, cls):
+        return str(cls)
+
+
+def hold(times, values, grid):
+    """Sample-and-hold of a command stream on grid (0 before the first command)."""
+    if len(times) == 0:
+        return np.zeros(len(grid), dtype=int)
+    i = np.searchsorted(times, grid, side="right") - 1
+    return np.where(i >= 0, values[np.maximum(i, 0)], 0)
+
+
+def diff_traces(recorded, replayed, tolerance=0):
+    """
+    Compare two command traces ({"t", "motor", "speed"} arrays) motor by motor, on
+    the union of their command times. identical: same (motor, speed) sequence.
+    """
+    identical = (len(recorded["t"]) == len(replayed["t"])
+                 and np.array_equal(recorded["motor"], replayed["motor"])
+                 and np.array_equal(recorded["speed"], replayed["speed"]))
+    result = {"recorded_commands": int(len(recorded["t"])), "replayed_commands": int(len(replayed["t"])),
+              "identical": bool(identical), "first_divergence": None, "motors": {}}
+    for motor in (1, 2, 3):
+        a = recorded["motor"] == motor
+        b = replayed["motor"] == motor
+        grid = np.union1d(recorded["t"][a], replayed["t"][b])
+        if len(grid) == 0:
+            continue
+        va = hold(recorded["t"][a], recorded["speed"][a].astype(int), grid)
+        vb = hold(replayed["t"][b], replayed["speed"][b].astype(int), grid)
+        d = np.abs(va - vb)
+        dt = np.diff(grid, append=grid[-1])
+        differ = d > tolerance
+        total = grid[-1] - grid[0]
+        first = float(grid[differ][0]) if differ.any() else None
+        result["motors"][motor] = {
+            "max_abs": int(d.max()),
+            "mean_abs": float((d * dt).sum() / total) if total > 0 else float(d.mean()),
+            "time_differing": float(dt[differ].sum() / total) if total > 0 else float(differ.mean()),
+            "first_divergence": first,
+        }
+        if first is not None and (result["first_divergence"] is None or first < result["first_divergence"]):
+            result["first_divergence"] = first
+    return result
+
+
+class Replay:
+    """
+    dive: DiveReader. detector: callable image -> detections (e.g. the RoiDetector +
+    MotionGate stack of finalRomarin); None replays the recorded detections instead.
+    skip_interval: run the model every N frames; else scheduler (DetectionScheduler)
+    picks the frames, else every frame the model is free for.
+    latency: simulated model latency (s), results are used on the first frame after.
+    recorded_tracker: use the recorded tracker boxes instead of tracking the video.
+    """
+
+    def __init__(self, dive, autopilot, detector=None, skip_interval=None, scheduler=None,
+                 latency=0.1, recorded_tracker=False, motor_rate=20.0, serial_rate=20.0):
+        self.dive = dive
+        self.autopilot = autopilot
+        self.detector = detector
+        self.skip_interval = skip_interval
+        self.scheduler = scheduler
+        self.latency = latency
+        self.recorded_tracker = recorded_tracker
+        self.motor_period = 1.0 / motor_rate
+        self.port = MockSerial()
+        self.writer = SerialWriter(self.port, serial_rate)     # flushed by hand, never started
+        self.now = dive.start
+        self.commands = []          # (t, motor, speed)
+        keys = dive.table("keys")
+        self.key_times, self.key_states = keys["t"], keys["state"]
+        # Frame t -> time the control loop handled it
+        tracker = dive.table("tracker")
+        self.handled = {float(t): float(at) for t, at in zip(tracker["t"], tracker["at"]) if at == at}
+        # Motor ticks of the dive, else 20 Hz in phase with the recorded commands
+        self.ticks = deque(dive.table("ticks")["t"].tolist())
+        self.recorded_ticks = bool(self.ticks)
+        if self.recorded_ticks:
+            self.next_tick = self.ticks.popleft()
+        else:
+            recorded = dive.table("commands")
+            first = recorded["t"][0] if len(recorded["t"]) else dive.start
+            self.next_tick = first - np.floor((first - dive.start) / self.motor_period) * self.motor_period
+        self.next_flush = self.next_tick
+        # Stats
+        self.frames = 0
+        self.inferences = 0
+
+    def clock(self):
+        return self.now
+
+    def keys_at(self, t):
+        i = np.searchsorted(self.key_times, t, side="right") - 1
+        state = int(self.key_states[i]) if i >= 0 else 0
+        return [(state >> k) & 1 for k in range(8)]
+
+    def send_motors(self, t, command):
+        """tracking.send_motors, into the mocked port."""
+        valid = [(id, speed) for id, speed in command if id in [1, 2, 3] and -255 <= speed <= 255]
+        self.writer.submit_many(valid)
+        self.commands.extend((t, id, speed) for id, speed in valid)
+
+    def _advance(self, t):
+        """Run the motor loop and serial writer ticks before time t."""
+        while min(self.next_tick, self.next_flush) < t:
+            if self.next_tick <= self.next_flush:
+                self.now = self.next_tick
+                command = self.autopilot.motor_step(self.keys_at(self.now), self.now)
+                if command is not None:
+                    self.send_motors(self.now, command)
+                if self.ticks:
+                    self.next_tick = self.ticks.popleft()
+                elif self.recorded_ticks:
+                    self.next_tick = np.inf     # the motor loop stopped
+                else:
+                    self.next_tick += self.motor_period
+            else:
+                self.now = self.next_flush
+                self.writer.flush()
+                self.next_flush += self.writer.period
+
+    def _recorded_detections(self):
+        """[(time used, frame time, detections)] of the recording, in time order."""
+        inferences, detections = self.dive.table("inferences"), self.dive.table("detections")
+        columns = [detections[name] for name in ("x1", "y1", "x2", "y2", "conf", "cls")]
+        runs = []
+        for t, at in zip(inferences["t"], inferences["at"]):
+            lo, hi = np.searchsorted(detections["t"], t, "left"), np.searchsorted(detections["t"], t, "right")
+            runs.append((float(at) if at == at else float(t) + self.latency, float(t),
+                         [(float(x1), float(y1), float(x2), float(y2), float(conf), int(cls))
+                          for x1, y1, x2, y2, conf, cls in zip(*(c[lo:hi] for c in columns))]))
+        runs.sort(key=lambda run: run[0])
+        return runs
+
+    def _steps(self):
+        """(frame time, time handled, image, tracker box) of every frame."""
+        if self.recorded_tracker:
+            tracker = self.dive.table("tracker")
+            boxes = np.column_stack([tracker[name] for name in ("x1", "y1", "x2", "y2")])
+            for t, at, box in zip(tracker["t"], tracker["at"], boxes):
+                yield float(t), float(at) if at == at else float(t), None, \
+                    None if np.isnan(box).any() else tuple(float(v) for v in box)
+        else:
+            for t, image in self.dive.frames():
+                yield t, self.handled.get(float(t), t), image, None
+
+    def run(self):
+        recorded = deque(self._recorded_detections()) if self.detector is None else None
+        pending = []                # (ready time, frame time, detections)
+        busy_until = -np.inf
+        for t, now, image, box in self._steps():
+            self._advance(now)
+            self.now = now
+            self.frames += 1
+            # Results that arrived since the previous frame
+            if recorded is not None:
+                while recorded and recorded[0][0] <= now:
+                    _, frame_t, detections = recorded.popleft()
+                    self.inferences += 1
+                    self.autopilot.on_detections(detections, frame_t)
+            while pending and pending[0][0] <= now:
+                _, frame_t, detections = pending.pop(0)
+                self.autopilot.on_detections(detections, frame_t)
+            if image is None:
+                box = self.autopilot.on_tracked(box, now)
+            else:
+                box = self.autopilot.on_frame(image, t, now)
+            if self.scheduler is not None:
+                bbox = self.autopilot.last_bbox
+                self.scheduler.update_target(bbox[:4] if bbox is not None else None, t,
+                                             self.autopilot.tracker.velocity if box is not None else None)
+            # Model run on this frame?
+            if self.detector is None or image is None:
+                continue
+            if t < busy_until:
+                detections = None
+            elif self.skip_interval:
+                detections = self.detector(image) if self.frames % self.skip_interval == 0 else None
+            elif self.scheduler is not None and not self.scheduler.should_detect(t):
+                detections = None
+            else:
+                detections = self.detector(image)
+                if self.scheduler is not None:
+                    self.scheduler.record_inference(t, self.latency, getattr(self.detector, "reused", False))
+            if detections is not None:
+                self.inferences += 1
+                pending.append((t + self.latency, t, detections))
+                busy_until = t + self.latency
+        self._advance(self.dive.end + 1e-9)
+        self.writer.flush()
+        return self.trace()
+
+    def trace(self):
+        t, motor, speed = zip(*self.commands) if self.commands else ((), (), ())
+        return {"t": np.array(t, dtype=np.float64), "motor": np.array(motor, dtype=np.int8),
+                "speed": np.array(speed, dtype=np.int16)}
+
+    def stats(self):
+        return {"frames": self.frames, "inferences": self.inferences, "commands": len(self.commands),
+                "serial_frames": len(self.port.frames), "serial_bytes": self.port.bytes}
+
+
+def replay_dive(path, args):
+    """Replay one dive with the command line settings, write its trace and report."""
+    from detector import OnnxDetector, RoiDetector, MotionGate
+    from scheduler import DetectionScheduler
+
+    dive = DiveReader(path)
+    model = None
+    if not args.recorded_detections or os.path.exists(args.model):
+        model = OnnxDetector(args.model, threads=args.threads)
+    names = model.names if model is not None else ClassNames()
+    autopilot = Autopilot(names, sorting=args.sorting, detection_timeout=args.detection_timeout)
+    detector = scheduler = None
+    replay = Replay(dive, autopilot, latency=args.latency, recorded_tracker=args.recorded_tracker)
+    if not args.recorded_detections:
+        # Same stack as finalRomarin: ROI crops, then the motion gate (on replay time)
+        detector = RoiDetector(model, select=autopilot.select_target, full_every=10)
+        if args.gate_threshold > 0:
+            detector = MotionGate(detector, threshold=args.gate_threshold, clock=replay.clock)
+        if not args.skip_interval:
+            scheduler = DetectionScheduler(latency_budget=args.latency_budget, cpu_budget=args.cpu_budget)
+    replay.detector, replay.skip_interval, replay.scheduler = detector, args.skip_interval, scheduler
+
+    trace = replay.run()
+    report = {"dive": path, "start": dive.start, "settings": vars(args), "stats": replay.stats(),
+              "diff": diff_traces(dive.table("commands"), trace, args.tolerance)}
+    name = os.path.basename(os.path.normpath(path))
+    os.makedirs(args.out, exist_ok=True)
+    np.savetxt(os.path.join(args.out, name + ".csv"), np.column_stack([trace["t"], trace["motor"], trace["speed"]]),
+               fmt=["%.6f", "%d", "%d"], delimiter=",", header="t,motor,speed", comments="")
+    with open(os.path.join(args.out, name + ".json"), "w") as f:
+        json.dump(report, f, indent=1, default=str)
+    return report
+
+
+def _replay_job(job):
+    return replay_dive(*job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded dives through the detection and motor logic")
+    parser.add_argument("dives", nargs="+", help="dive folders written by recorder.py")
+    parser.add_argument("--model", default="../models/best.onnx")
+    parser.add_argument("--recorded-detections", action="store_true",
+                        help="reuse the recorded detections instead of running the model")
+    parser.add_argument("--recorded-tracker", action="store_true",
+                        help="reuse the recorded tracker boxes instead of tracking the video")
+    parser.add_argument("--sorting", default=None, help="only follow this class (e.g. \"cell phone\")")
+    parser.add_argument("--detection-timeout", type=float, default=1.0)
+    parser.add_argument("--skip-interval", type=int, default=None,
+                        help="run the model every N frames instead of the scheduler")
+    parser.add_argument("--latency-budget", type=float, default=0.3)
+    parser.add_argument("--cpu-budget", type=float, default=0.7)
+    parser.add_argument("--gate-threshold", type=float, default=0.005, help="motion gate threshold, 0 = off")
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated model latency (s)")
+    parser.add_argument("--tolerance", type=int, default=0, help="speed difference ignored by the diff")
+    parser.add_argument("--jobs", type=int, default=1, help="dives replayed in parallel processes")
+    parser.add_argument("--out", default="replays")
+    args = parser.parse_args()
+    args.threads = 1 if args.jobs > 1 else None   # one core per process
+
+    jobs = [(path, args) for path in args.dives]
+    if args.jobs > 1:
+        with Pool(args.jobs) as pool:
+            reports = pool.map(_replay_job, jobs)
+    else:
+        reports = [replay_dive(*job) for job in jobs]
+
+    for report in reports:
+        diff, stats = report["diff"], report["stats"]
+        first = diff["first_divergence"]
+        divergence = "" if first is None else f", first divergence at {first - report['start']:.2f} s"
+        print(f"{report['dive']}: {stats['frames']} frames, {stats['inferences']} inferences, "
+              f"{diff['replayed_commands']} commands (recorded {diff['recorded_commands']}), "
+              f"{'identical' if diff['identical'] else 'differs'}{divergence}")
+        for motor, m in diff["motors"].items():
+            print(f"  motor {motor}: max |diff| {m['max_abs']}, mean {m['mean_abs']:.1f}, "
+                  f"differs {m['time_differing'] * 100:.1f}% of the time")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
-from ultralytics import YOLO
 import cv2
+import os
 import time
-from picamera2 import Picamera2
-import threading
+import numpy as np
 import tracking as tr
-from pynput import keyboard
+from detector import OnnxDetector
+from dualCamera import DualCamera
+from stereo import StereoDepth
+from scheduler import DetectionScheduler
+from viewer import open_viewer, start_keyboard
 import pdb
 import time
 
@@ -28,112 +31,97 @@ def on_release(key):
         pass
 
 # * Use a smaller/faster model for the Pi
-#model = YOLO("../models/best.pt")
-model = YOLO("yolo11n.pt")
+model = OnnxDetector("../models/best.onnx")  # ONNX Runtime, no torch needed
 classNames = model.names
 
-# Démarrer l'écouteur clavier en arrière-plan
-listener = keyboard.Listener(on_press=on_press, on_release=on_release)
-listener.daemon = True
-listener.start()
+# Windows, or headless / MJPEG stream of the detection image (viewer.py)
+viewer = open_viewer("Picamera Detection")
 
-# Initialize main camera (camera 0) for detection
-picam2_main = Picamera2(camera_num=0)
-config_main = picam2_main.create_preview_configuration(main={"size": (640, 480)})
-picam2_main.configure(config_main)
-picam2_main.start()
-time.sleep(1)
+# Démarrer l'écouteur clavier en arrière-plan (aucun en mode headless)
+listener = start_keyboard(on_press, on_release, viewer)
 
-# Initialize second camera (camera 1) for raw display
-picam2_second = Picamera2(camera_num=1)
-config_second = picam2_second.create_preview_configuration(main={"size": (640, 480)})
-picam2_second.configure(config_second)
-picam2_second.start()
+# Camera 0 (detection) and camera 1, frames paired by sensor timestamp
+cameras = DualCamera.picamera(size=(640, 480), fps=30).start()
 time.sleep(1)
 
-# Frame skip logic for YOLO detection
-skip_interval = 5
-frame_count = 0
+# Stereo range to the target (calibrate with stereo.py), forward thrust follows it
+stereo = StereoDepth("../models/stereo.npz") if os.path.exists("../models/stereo.npz") else None
+
+# YOLO detection on the frames picked by the scheduler (latency and CPU budgets, target motion)
+scheduler = DetectionScheduler(latency_budget=0.3, cpu_budget=0.7)
 last_boxes = []
 
-# Shared event to signal shutdown
-stop_event = threading.Event()
-# Shared variable and lock to hold the latest frame from the second camera
-second_frame = None
-second_frame_lock = threading.Lock()
-
-def update_second_camera():
-    """ Continuously capture frames from camera 1 and store the latest frame. """
-    global second_frame
-    while not stop_event.is_set():
-        frame_rgb2 = picam2_second.capture_array()
-        img2 = cv2.cvtColor(frame_rgb2, cv2.COLOR_RGB2BGR)
-        with second_frame_lock:
-            second_frame = img2
-
-# Start the background thread for updating the second camera frame
-thread2 = threading.Thread(target=update_second_camera, daemon=True)
-thread2.start()
+# Drawing buffer, reused every frame (camera frames are read-only)
+img = np.empty((480, 640, 3), dtype=np.uint8)
 
 try:
-    while not stop_event.is_set():
-        # Capture frame from main camera and process detection
-        frame_rgb = picam2_main.capture_array()
-        img = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+    while True:
+        # Capture a synchronized pair and process detection on camera 0
+        ok, pair, now = cameras.grab()
+        if not ok:
+            break
+        draw = viewer.wants_frame()
+        if draw:
+            np.copyto(img, pair.images[0])
         
         if 1 in keys.values():
             tr.telecom(list(keys.values()))
         else:
             tr.telecom(list(keys.values()))
-            results = model(img, stream=True)
 
-            frame_count += 1
-            if frame_count % skip_interval == 0:
-                results = model(img, stream=True)
+            if scheduler.should_detect(now):
                 new_boxes = []
-                for result in results:
-                    for box in result.boxes:
-                        cls = int(box.cls[0])
-                        if not sorting or classNames[cls]== "cell phone":
-                            x1, y1, x2, y2 = box.xyxy[0]
-                            conf = float(box.conf[0])
-                            new_boxes.append((x1, y1, x2, y2, conf, cls))
+                t0 = time.time()
+                detections = model(pair.images[0])
+                scheduler.record_inference(now, time.time() - t0)
+                for (x1, y1, x2, y2, conf, cls) in detections:
+                    if not sorting or classNames[cls]== "cell phone":
+                        # Stereo range of the box (block matching inside the box only)
+                        distance = None
+                        if stereo is not None:
+                            distance = stereo.distance(pair.images[0], pair.images[1], (x1, y1, x2, y2))
+                        new_boxes.append((x1, y1, x2, y2, conf, cls, distance))
 
                 last_boxes = new_boxes
+                # Largest box as the target, its motion drives the detection rate
+                target = max(last_boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), default=None)
+                scheduler.update_target(target[:4] if target is not None else None, now)
 
             # Draw detection boxes on the main image
-            for (x1, y1, x2, y2, conf, cls) in last_boxes:
+            for (x1, y1, x2, y2, conf, cls, distance) in last_boxes:
                 x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
                 center_x = (x1 + x2) // 2
                 center_y = (y1 + y2) // 2
-                cv2.circle(img, (center_x, center_y), 3, (0, 0, 255), -1)
-                confidence = round(conf, 2)
-                class_name = classNames[cls]
-                text = f"{class_name} {confidence}"
-                cv2.putText(img, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX,
-                            0.8, (255, 255, 255), 2)
+                if draw:
+                    cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
+                    cv2.circle(img, (center_x, center_y), 3, (0, 0, 255), -1)
+                    confidence = round(conf, 2)
+                    class_name = classNames[cls]
+                    text = f"{class_name} {confidence}"
+                    if distance is not None:
+                        text += f" {distance:.2f} m"
+                    cv2.putText(img, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX,
+                                0.8, (255, 255, 255), 2)
                 
-                mot1, mot2, mot3 = tr.direc(center_x, center_y, 320, 240)
-                for i in range(frame_count % skip_interval):
-                    tr.send_command(mot1)
-                    tr.send_command(mot2)
-                    tr.send_command(mot3)
-
-            # Display both windows in the main thread
-            cv2.imshow("Picamera Detection", img)
-            with second_frame_lock:
-                if second_frame is not None:
-                    cv2.imshow("Second Camera", second_frame)
-
-            # Use one waitKey call to handle both windows; "q" sets the stop_event
-            if cv2.waitKey(1) == ord('n'):
-                tr.send_command((1, 0))
-                tr.send_command((2, 0))
-                tr.send_command((3, 0))
+                mot1, mot2, mot3 = tr.direc(center_x, center_y, 320, 240, distance=distance)
+                tr.send_motors(mot1, mot2, mot3)
+                scheduler.record_command(time.time())
+
+            # Display both windows in the main thread (only the detection image is streamed)
+            if draw:
+                viewer.show(img)
+                viewer.show(pair.images[1], "Second Camera")
+
+            # Use one waitKey call to handle both windows; "n" stops the motors and quits
+            if viewer.poll() == ord('n'):
+                tr.send_motors((1, 0), (2, 0), (3, 0))
+                pair.release()
                 break
 
+        pair.release()
+
 finally:
-    picam2_main.stop()
-    picam2_second.stop()
-    cv2.destroyAllWindows()
+    print(cameras.stats())
+    print(scheduler.metrics())
+    cameras.close()
+    viewer.close()
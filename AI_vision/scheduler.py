@@ -0,0 +1,237 @@
+"""
+Adaptive detection scheduling: when to run the model instead of every N frames.
+
+The scheduler measures the inference time and the capture period, and picks the
+time between two detections (the interval) from the target state:
+
+    lost    target just lost            -> as often as the CPU budget allows
+    moving  target faster than static_speed -> it may move max_shift px between detections
+    static  target (almost) still       -> interval grows by backoff after each detection
+    search  no target for a while       -> same back-off, up to max_interval
+
+and then bounds it by the two budgets:
+
+    latency  a command steers on a detection at most latency_budget old:
+             interval + inference + frame period <= latency_budget (only with a target)
+    cpu      the model runs at most cpu_budget of the time: interval >= inference / cpu_budget
+
+When both budgets can't be met the CPU budget wins (the conflict is counted).
+
+Sequential loop:
+
+    scheduler = DetectionScheduler(latency_budget=0.25, cpu_budget=0.5)
+    if scheduler.should_detect(t):              # t: frame capture time
+        detections = model(img)
+        scheduler.record_inference(t, duration)
+    scheduler.update_target(box, t, tracker.velocity)   # box None when there is no target
+    scheduler.record_command(time.time())       # when a command is sent from the detections
+    print(scheduler.metrics())
+
+DetectionPipeline(source, model, scheduler=scheduler) does the first three calls itself.
+"""
+import math
+import threading
+from collections import deque
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] if values else 0.0
+
+
+class DetectionScheduler:
+    """
+    latency_budget: max age (s) of the detection behind a command.
+    cpu_budget: max fraction of the time spent in inference.
+    min_interval / max_interval: bounds of the time between detections (s).
+    max_shift: target motion (px) allowed between two detections.
+    static_speed: below this target speed (px/s) the scene is considered static.
+    lost_hold: how long (s) after losing the target detection stays at full rate.
+    backoff: interval growth factor per detection in a static scene.
+    """
+
+    def __init__(self, latency_budget=0.3, cpu_budget=0.6, min_interval=0.0, max_interval=1.0,
+                 max_shift=30.0, static_speed=15.0, lost_hold=1.0, backoff=1.5,
+                 smoothing=0.2, history=100):
+        self.latency_budget = latency_budget
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_shift = max_shift
+        self.static_speed = static_speed
+        self.lost_hold = lost_hold
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+
+        # Measurements
+        self.inference_time = 0.0          # smoothed
+        self.frame_period = 0.0            # median of the recent frame intervals
+        self.frame_intervals = deque(maxlen=31)
+        self.last_frame = None
+        # Target state
+        self.mode = "search"
+        self.speed = 0.0
+        self.last_center = None            # (x, y, t), for a speed without tracker
+        self.lost_since = None
+        self.backoff_interval = 0.0
+        # Decisions
+        self.interval = 0.0
+        self.limit = "none"                # what set the interval
+        self.last_run = None               # capture time of the last frame sent to the model
+        self.detected_at = None            # capture time of the last frame the model finished
+        self.first_run = None
+        self.busy = 0.0                    # total inference time
+        # Stats
+        self.detections = 0
+        self.reused = 0                    # detections answered by a MotionGate
+        self.skipped = 0
+        self.conflicts = 0
+        self.modes = {"lost": 0, "moving": 0, "static": 0, "search": 0}
+        self.inference_times = deque(maxlen=history)
+        self.run_intervals = deque(maxlen=history)
+        self.command_latencies = deque(maxlen=history)
+
+    # ------------------------------------------------
+    # Measurements
+    # ------------------------------------------------
+    def frame(self, t):
+        """A frame was captured at t (called by should_detect() if not already seen)."""
+        with self.lock:
+            self._frame(t)
+
+    def _frame(self, t):
+        if self.last_frame is not None and t <= self.last_frame:
+            return
+        if self.last_frame is not None:
+            # The median ignores the longer intervals when a sequential loop runs the model
+            self.frame_intervals.append(t - self.last_frame)
+            self.frame_period = _percentile(self.frame_intervals, 0.5)
+        self.last_frame = t
+
+    def record_inference(self, t, duration, reused=False):
+        """
+        The model finished the frame captured at t after duration seconds.
+        reused: a MotionGate returned the previous detections instead (still valid
+        for t, but the model didn't run, so the time isn't an inference time).
+        """
+        with self.lock:
+            if reused:
+                self.reused += 1
+            else:
+                a = self.smoothing if self.detections > self.reused else 1.0
+                self.inference_time += a * (duration - self.inference_time)
+                self.inference_times.append(duration)
+            self.busy += duration
+            self.detections += 1
+            self.detected_at = t if self.detected_at is None else max(t, self.detected_at)
+            if self.mode in ("static", "search"):
+                self.backoff_interval = min(max(self.backoff_interval * self.backoff, self.frame_period),
+                                            self.max_interval)
+
+    def update_target(self, box, t, velocity=None):
+        """
+        Current target box (x1, y1, x2, y2) at time t, or None without a target.
+        velocity: (vx, vy) px/s, e.g. TargetTracker.velocity; estimated from the
+        box centers when not given.
+        """
+        with self.lock:
+            if box is None:
+                self.last_center = None
+                self.speed = 0.0
+                if self.mode in ("moving", "static"):
+                    self.lost_since = t
+                if self.lost_since is not None and t - self.lost_since < self.lost_hold:
+                    self._set_mode("lost")
+                else:
+                    self.lost_since = None
+                    self._set_mode("search")
+                return
+            x1, y1, x2, y2 = box
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            if velocity is not None:
+                self.speed = math.hypot(*velocity)
+            elif self.last_center is not None and t > self.last_center[2]:
+                px, py, pt = self.last_center
+                self.speed = math.hypot(cx - px, cy - py) / (t - pt)
+            self.last_center = (cx, cy, t)
+            self.lost_since = None
+            self._set_mode("moving" if self.speed >= self.static_speed else "static")
+
+    def _set_mode(self, mode):
+        if mode in ("lost", "moving") or (mode == "static" and self.mode == "search"):
+            self.backoff_interval = 0.0    # back off again from full rate once things settle
+        self.mode = mode
+
+    def record_command(self, t):
+        """A motor command based on the detections was sent at t."""
+        with self.lock:
+            if self.detected_at is not None:
+                self.command_latencies.append(t - self.detected_at)
+
+    # ------------------------------------------------
+    # Decision
+    # ------------------------------------------------
+    def _update_interval(self):
+        if self.mode == "lost":
+            interval, limit = self.min_interval, "lost"
+        elif self.mode == "moving":
+            interval, limit = self.max_shift / self.speed, "motion"
+        else:
+            interval, limit = self.backoff_interval, self.mode
+        if interval >= self.max_interval:
+            interval, limit = self.max_interval, "max_interval"
+        if self.mode != "search":
+            ceiling = self.latency_budget - self.inference_time - self.frame_period
+            if interval > ceiling:
+                interval, limit = ceiling, "latency"
+        cpu_floor = self.inference_time / self.cpu_budget
+        if interval < cpu_floor:
+            if limit == "latency":
+                self.conflicts += 1
+            interval, limit = cpu_floor, "cpu"
+        if interval < self.min_interval:
+            interval, limit = self.min_interval, "min_interval"
+        self.interval, self.limit = interval, limit
+
+    def should_detect(self, t):
+        """Whether to run the model on the frame captured at t."""
+        with self.lock:
+            self._frame(t)
+            self._update_interval()
+            # Detect on the frame closest to the scheduled time
+            due = self.last_run is None or t - self.last_run >= self.interval - self.frame_period / 2
+            if not due:
+                self.skipped += 1
+                return False
+            if self.last_run is not None:
+                self.run_intervals.append(t - self.last_run)
+            if self.first_run is None:
+                self.first_run = t
+            self.last_run = t
+            self.modes[self.mode] += 1
+            return True
+
+    def metrics(self):
+        """Times in seconds; modes counts the detections run in each mode."""
+        with self.lock:
+            elapsed = (self.last_frame - self.first_run) if self.first_run is not None else 0.0
+            return {
+                "mode": self.mode,
+                "interval": self.interval,
+                "limit": self.limit,
+                "target_speed": self.speed,
+                "frame_period": self.frame_period,
+                "detections": self.detections,
+                "reused": self.reused,
+                "skipped": self.skipped,
+                "detection_rate": len(self.run_intervals) / sum(self.run_intervals) if self.run_intervals else 0.0,
+                "duty_cycle": self.busy / elapsed if elapsed > 0 else 0.0,
+                "budget_conflicts": self.conflicts,
+                "modes": dict(self.modes),
+                "inference_mean": sum(self.inference_times) / len(self.inference_times) if self.inference_times else 0.0,
+                "inference_p95": _percentile(self.inference_times, 0.95),
+                "command_latency_mean": (sum(self.command_latencies) / len(self.command_latencies)
+                                         if self.command_latencies else 0.0),
+                "command_latency_p95": _percentile(self.command_latencies, 0.95),
+            }
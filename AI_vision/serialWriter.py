@@ -0,0 +1,106 @@
+"""
+Background writer that owns the Arduino serial port.
+
+Callers only submit speeds (never blocking on the port); the writer keeps the
+newest speed per motor and sends one protocol frame per period when something
+changed, so superseded commands never reach the wire.
+"""
+import time
+import threading
+import protocol
+
+
+class SerialWriter:
+    def __init__(self, port, rate=20.0):
+        self.port = port
+        self.period = 1.0 / rate
+        self.speeds = [0, 0, 0]
+        self.pending = {}   # motor id -> newest speed not yet sent
+        self.dirty = False  # last frame failed to reach the port: resend self.speeds
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.telemetry = None     # optional Telemetry (telemetry.py): time of each port write
+        # Stats
+        self.submitted = 0
+        self.superseded = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, motor_id, speed):
+        with self.lock:
+            if motor_id in self.pending:
+                self.superseded += 1
+            self.pending[motor_id] = speed
+            self.submitted += 1
+
+    def submit_many(self, commands):
+        """Several (motor_id, speed) at once, so they always go out in the same frame."""
+        with self.lock:
+            for motor_id, speed in commands:
+                if motor_id in self.pending:
+                    self.superseded += 1
+                self.pending[motor_id] = speed
+                self.submitted += 1
+
+    def flush(self):
+        """Send pending speeds now (from the writer thread or after stop)."""
+        with self.lock:
+            if not self.pending and not self.dirty:
+                return
+            for motor_id, speed in self.pending.items():
+                self.speeds[motor_id - 1] = speed
+            self.pending.clear()
+            frame = protocol.encode_motors(self.speeds, self.seq)
+            self.seq = (self.seq + 1) & 0xFF
+        t0 = time.perf_counter()
+        try:
+            self.port.write(frame)
+        except OSError:
+            # Stalled or unplugged port: the next period resends, with fresher speeds if any
+            with self.lock:
+                self.dirty = True
+            self.write_errors += 1
+            return
+        with self.lock:
+            self.dirty = False
+        self.frames_written += 1
+        self.bytes_written += len(frame)
+        if self.telemetry is not None:
+            self.telemetry.lap("serial_write", t0)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self.running:
+            self.flush()
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self.wake.wait(delay)
+            else:
+                next_tick = time.monotonic()  # fell behind, don't burst to catch up
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "superseded": self.superseded,
+            "frames_written": self.frames_written,
+            "bytes_written": self.bytes_written,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,277 @@
+"""
+Closed-loop simulator for the vision -> motor stack, no camera, Arduino or pool needed.
+
+    scene renderer --frame--> detection / tracking / control --protocol frames--> virtual Arduino
+          ^                                                                             |
+          +---------------------------- vehicle dynamics <------------------------------+
+
+The loop runs on a simulated clock (no sleeps), so it goes as fast as the CPU
+allows. Commands go through the real SerialWriter coalescing and protocol
+encoding, the virtual Arduino decodes them and drives a simple vehicle model,
+and the resulting camera pose renders the next frame.
+
+    python simulator.py --runs 20 --controller pid
+    python simulator.py --controller direc --skip 1 --json results.json
+"""
+import math
+import time
+import json
+import argparse
+import cv2
+import numpy as np
+import protocol
+from serialWriter import SerialWriter
+from control import ControlLaw
+from pid import MotorController
+from tracker import TargetTracker
+
+
+# ================================================
+# Virtual Arduino and vehicle
+# ================================================
+class VirtualArduino:
+    """File-like port: decodes the protocol frames written to it, like motor_control.ino."""
+
+    def __init__(self):
+        self.parser = protocol.FrameParser()
+        self.speeds = (0, 0, 0)
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        for _, speeds in self.parser.feed(data):
+            self.speeds = speeds
+        return len(data)
+
+
+class Vehicle:
+    """
+    Planar heading + depth + forward motion with first-order thruster lag.
+    Motor 1/2 positive difference turns left, their mean pushes forward, motor 3 climbs.
+    """
+
+    def __init__(self, yaw_rate=2.0, climb_rate=1.0, speed=0.6, tau=0.3):
+        self.max_yaw_rate = yaw_rate      # rad/s at full differential
+        self.max_climb_rate = climb_rate  # m/s at full vertical thrust
+        self.max_speed = speed            # m/s at full forward thrust
+        self.tau = tau
+        self.x = self.z = 0.0             # position (m), z forward at start
+        self.altitude = 0.0
+        self.heading = 0.0                # rad, positive to the right
+        self.rates = np.zeros(3)          # yaw rate, climb rate, forward speed
+
+    def step(self, speeds, dt):
+        m1, m2, m3 = (s / 255.0 for s in speeds)
+        target = np.array([-(m1 - m2) / 2 * self.max_yaw_rate,
+                           m3 * self.max_climb_rate,
+                           (m1 + m2) / 2 * self.max_speed])
+        self.rates += (target - self.rates) * min(dt / self.tau, 1.0)
+        self.heading += self.rates[0] * dt
+        self.altitude += self.rates[1] * dt
+        self.x += math.sin(self.heading) * self.rates[2] * dt
+        self.z += math.cos(self.heading) * self.rates[2] * dt
+
+
+# ================================================
+# Scene
+# ================================================
+class SceneRenderer:
+    """Renders what the camera sees: murky water and a colored target moving on a path."""
+
+    def __init__(self, size=(640, 480), fov=math.radians(62), seed=0, distance=4.0, motion=0.4):
+        self.width, self.height = size
+        self.focal = self.width / 2 / math.tan(fov / 2)
+        rng = np.random.default_rng(seed)
+        base = np.array([90, 70, 20], dtype=np.int16)  # BGR, greenish blue water
+        noise = rng.normal(0, 6, (self.height, self.width, 1)).astype(np.int16)
+        self.background = np.clip(base + noise, 0, 255).astype(np.uint8)
+        self.frame = np.empty_like(self.background)
+        self.distance = distance
+        self.motion = motion              # amplitude (m) of the target wandering
+        self.phase = rng.uniform(0, 2 * math.pi, 3)
+        self.start = rng.uniform(-1, 1, 2) * np.array([1.5, 0.8])
+        self.radius = 0.15                # m
+
+    def target_position(self, t):
+        """World position (x, y, z) of the target at time t."""
+        x = self.start[0] + self.motion * math.sin(0.3 * t + self.phase[0])
+        y = self.start[1] + 0.5 * self.motion * math.sin(0.2 * t + self.phase[1])
+        z = self.distance + 0.5 * self.motion * math.sin(0.1 * t + self.phase[2])
+        return x, y, z
+
+    def project(self, vehicle, t):
+        """Image position (u, v) and radius (px) of the target, or None if behind the camera."""
+        tx, ty, tz = self.target_position(t)
+        dx, dz = tx - vehicle.x, tz - vehicle.z
+        dist = math.hypot(dx, dz)
+        rel = math.atan2(dx, dz) - vehicle.heading
+        if abs(rel) >= math.pi / 2:
+            return None
+        u = self.width / 2 + self.focal * math.tan(rel)
+        v = self.height / 2 - self.focal * (ty - vehicle.altitude) / dist
+        return u, v, self.focal * self.radius / dist
+
+    def render(self, vehicle, t):
+        np.copyto(self.frame, self.background)
+        projected = self.project(vehicle, t)
+        if projected is not None:
+            u, v, r = projected
+            cv2.circle(self.frame, (int(u), int(v)), max(int(r), 2), (0, 80, 230), -1)
+        return self.frame, projected
+
+
+class ColorDetector:
+    """Cheap stand-in for the model: the orange target blob, as (x1, y1, x2, y2, conf, cls)."""
+
+    names = {0: "target"}
+
+    def __init__(self, lower=(0, 40, 180), upper=(60, 140, 255)):
+        self.lower = np.array(lower, dtype=np.uint8)
+        self.upper = np.array(upper, dtype=np.uint8)
+
+    def __call__(self, img):
+        mask = cv2.inRange(img, self.lower, self.upper)
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            return []
+        return [(float(x), float(y), float(x + w), float(y + h), 1.0, 0)]
+
+
+# ================================================
+# Closed loop
+# ================================================
+def run(controller="pid", duration=30.0, fps=30, control_rate=20, skip=5, seed=0,
+        detector=None, tolerance=30, hold=1.0, use_tracker=True):
+    """
+    Simulate one dive. controller: "pid" (finalRomarin motor loop) or "direc"
+    (webcamV2, direc on every detection). The run has converged once the target
+    stays within tolerance px of the image center for hold seconds.
+    Returns a dict of metrics.
+    """
+    scene = SceneRenderer(seed=seed)
+    vehicle = Vehicle()
+    arduino = VirtualArduino()
+    writer = SerialWriter(arduino)        # flushed by hand on the simulated clock
+    detector = detector or ColorDetector()
+    tracker = TargetTracker(use_flow=False) if use_tracker else None
+    pid = MotorController()
+    law = ControlLaw()
+    law.build_lut()
+
+    dt = 1.0 / fps
+    control_period = 1.0 / control_rate
+    next_control = 0.0
+    last_target, last_detection_time = None, -1.0
+    errors = []
+    frames = inferences = control_ticks = 0
+    wall_start = time.perf_counter()
+
+    t = 0.0
+    while t < duration:
+        img, truth = scene.render(vehicle, t)
+        frames += 1
+
+        # Detection every `skip` frames, tracker in between
+        if frames % skip == 0:
+            inferences += 1
+            detections = detector(img)
+            if detections:
+                x1, y1, x2, y2 = detections[0][:4]
+                last_target = (int((x1 + x2) // 2), int((y1 + y2) // 2))
+                last_detection_time = t
+                if tracker is not None:
+                    tracker.seed((x1, y1, x2, y2), t)
+                if controller == "direc":
+                    writer_submit(writer, law.direc(*last_target))
+        if tracker is not None:
+            box = tracker.update(img, t)
+            if box is not None:
+                last_target = tracker.center
+
+        # Motor loop at control_rate
+        if t >= next_control:
+            next_control += control_period
+            control_ticks += 1
+            fresh = last_target is not None and t - last_detection_time < 1.0
+            if controller == "pid":
+                command = pid.update(last_target, t) if fresh else pid.stop(t)
+                if command is not None:
+                    writer_submit(writer, command)
+            elif not fresh:
+                writer_submit(writer, ((1, 0), (2, 0), (3, 0)))
+            writer.flush()
+
+        vehicle.step(arduino.speeds, dt)
+
+        # Convergence: target center within tolerance of the image center until the end
+        if truth is not None:
+            err = math.hypot(truth[0] - scene.width / 2, truth[1] - scene.height / 2)
+        else:
+            err = float("inf")
+        errors.append(err)
+        t += dt
+
+    converged_at, inside = None, 0
+    hold_frames = max(int(hold * fps), 1)
+    for i, err in enumerate(errors):
+        inside = inside + 1 if err <= tolerance else 0
+        if inside == hold_frames:
+            converged_at = (i - hold_frames + 1) * dt
+            break
+
+    wall = time.perf_counter() - wall_start
+    finite = [e for e in errors if math.isfinite(e)]
+    return {
+        "seed": seed,
+        "controller": controller,
+        "sim_time": duration,
+        "wall_time": wall,
+        "realtime_factor": duration / wall if wall else 0.0,
+        "control_rate": control_ticks / wall if wall else 0.0,
+        "frames": frames,
+        "inferences": inferences,
+        "convergence_time": converged_at,
+        "final_error": errors[-1],
+        "mean_error": sum(finite) / len(finite) if finite else None,
+        "commands_submitted": writer.submitted,
+        "frames_written": writer.frames_written,
+        "bytes_written": arduino.bytes,
+        "bad_frames": arduino.parser.errors,
+    }
+
+
+def writer_submit(writer, command):
+    writer.submit_many(command)
+
+
+def run_batch(runs=10, **kwargs):
+    return [run(seed=seed, **kwargs) for seed in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop simulation of the vision -> motor stack")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--controller", choices=["pid", "direc"], default="pid")
+    parser.add_argument("--skip", type=int, default=5, help="run detection every N frames")
+    parser.add_argument("--no-tracker", action="store_true")
+    parser.add_argument("--json", help="save the per-run results to this file")
+    args = parser.parse_args()
+
+    results = run_batch(args.runs, controller=args.controller, duration=args.duration,
+                        skip=args.skip, use_tracker=not args.no_tracker)
+    for r in results:
+        conv = "never" if r["convergence_time"] is None else f"{r['convergence_time']:.1f} s"
+        print(f"seed {r['seed']:3d}: converged {conv:>7}, mean error {r['mean_error'] or 0:6.1f} px, "
+              f"{r['frames_written']:4d} frames / {r['bytes_written']:5d} B sent, "
+              f"x{r['realtime_factor']:.0f} real time")
+    converged = [r["convergence_time"] for r in results if r["convergence_time"] is not None]
+    print(f"{len(converged)}/{len(results)} converged"
+          + (f", mean {sum(converged) / len(converged):.1f} s" if converged else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
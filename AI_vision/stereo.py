@@ -0,0 +1,186 @@
+"""
+Stereo ranging with the two Pi cameras.
+
+1. Calibrate once from checkerboard pairs (press 'c' in CameraScripts/doubleCamera.py
+   to save pairs into calib/left and calib/right):
+
+    python stereo.py calib/left calib/right --pattern 9x6 --square 0.025
+
+2. At run time, StereoDepth rectifies and block-matches only the detection ROI of
+   a synchronized pair (dualCamera.py), which costs a few ms instead of a full
+   disparity map:
+
+    stereo = StereoDepth("../models/stereo.npz")
+    distance = stereo.distance(left, right, (x1, y1, x2, y2))   # meters or None
+
+The rectification maps are computed once and cached next to the calibration file.
+"""
+import os
+import glob
+import argparse
+import cv2
+import numpy as np
+
+CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 1e-5)
+
+
+# ================================================
+# Offline calibration
+# ================================================
+def find_corners(img, pattern):
+    """Checkerboard inner corners (N, 1, 2) refined to subpixel, or None."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    found, corners = cv2.findChessboardCorners(
+        gray, pattern, flags=cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), CRITERIA)
+
+
+def calibrate(pairs, pattern=(9, 6), square=0.025):
+    """
+    pairs: iterable of (left, right) images of the checkerboard.
+    pattern: inner corners per row and column, square: side of a square (m).
+    Returns a dict with both cameras' intrinsics, the stereo extrinsics and the
+    rectification (R1, R2, P1, P2, Q).
+    """
+    grid = np.zeros((pattern[0] * pattern[1], 3), np.float32)
+    grid[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2) * square
+    objects, left_points, right_points = [], [], []
+    size = None
+    for left, right in pairs:
+        size = (left.shape[1], left.shape[0])
+        corners_left, corners_right = find_corners(left, pattern), find_corners(right, pattern)
+        if corners_left is None or corners_right is None:
+            continue
+        objects.append(grid)
+        left_points.append(corners_left)
+        right_points.append(corners_right)
+    if len(objects) < 3:
+        raise ValueError(f"Checkerboard found in only {len(objects)} pairs, need at least 3")
+
+    _, K1, D1, _, _ = cv2.calibrateCamera(objects, left_points, size, None, None)
+    _, K2, D2, _, _ = cv2.calibrateCamera(objects, right_points, size, None, None)
+    rms, K1, D1, K2, D2, R, T, _, _ = cv2.stereoCalibrate(
+        objects, left_points, right_points, K1, D1, K2, D2, size,
+        criteria=CRITERIA, flags=cv2.CALIB_FIX_INTRINSIC)
+    R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(K1, D1, K2, D2, size, R, T, alpha=0)
+    return {"size": np.array(size), "K1": K1, "D1": D1, "K2": K2, "D2": D2, "R": R, "T": T,
+            "R1": R1, "R2": R2, "P1": P1, "P2": P2, "Q": Q,
+            "rms": rms, "pairs": len(objects)}
+
+
+def load_pairs(left_dir, right_dir):
+    """Images with the same file name in both folders."""
+    for left_path in sorted(glob.glob(os.path.join(left_dir, "*"))):
+        right_path = os.path.join(right_dir, os.path.basename(left_path))
+        left, right = cv2.imread(left_path), cv2.imread(right_path)
+        if left is not None and right is not None:
+            yield left, right
+
+
+# ================================================
+# Run time: range of a detection
+# ================================================
+class StereoDepth:
+    """
+    num_disparities / block_size: StereoBM settings (num_disparities sets the
+    closest range, f * baseline / num_disparities). A range needs at least
+    min_valid of the ROI pixels with a disparity >= min_disparity.
+    """
+
+    def __init__(self, calibration, num_disparities=64, block_size=15, min_disparity=1.0, min_valid=0.05):
+        calib = np.load(calibration)
+        self.size = tuple(int(v) for v in calib["size"])
+        self.K1, self.D1, self.R1, self.P1 = calib["K1"], calib["D1"], calib["R1"], calib["P1"]
+        self.focal = float(calib["P1"][0, 0])
+        self.baseline = abs(float(calib["P2"][0, 3]) / float(calib["P2"][0, 0]))   # m
+        self.maps = self._maps(calibration, calib)
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.min_disparity = min_disparity
+        self.min_valid = min_valid
+        self.matcher = cv2.StereoBM_create(numDisparities=num_disparities, blockSize=block_size)
+        # Stats
+        self.runs = 0
+        self.misses = 0
+
+    def _maps(self, calibration, calib):
+        """Fixed-point rectification maps for both cameras, cached in <calibration>.maps.npz."""
+        cache = os.path.splitext(calibration)[0] + ".maps.npz"
+        if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(calibration):
+            maps = np.load(cache)
+            return (maps["left1"], maps["left2"]), (maps["right1"], maps["right2"])
+        left = cv2.initUndistortRectifyMap(calib["K1"], calib["D1"], calib["R1"], calib["P1"],
+                                           self.size, cv2.CV_16SC2)
+        right = cv2.initUndistortRectifyMap(calib["K2"], calib["D2"], calib["R2"], calib["P2"],
+                                            self.size, cv2.CV_16SC2)
+        np.savez(cache, left1=left[0], left2=left[1], right1=right[0], right2=right[1])
+        return left, right
+
+    def rectify_box(self, box):
+        """Box (x1, y1, x2, y2) of the raw left image -> integer box in the rectified image."""
+        x1, y1, x2, y2 = box
+        corners = np.array([[[x1, y1]], [[x2, y1]], [[x1, y2]], [[x2, y2]]], dtype=np.float32)
+        points = cv2.undistortPoints(corners, self.K1, self.D1, R=self.R1, P=self.P1).reshape(-1, 2)
+        w, h = self.size
+        rx1, ry1 = np.floor(points.min(axis=0)).astype(int)
+        rx2, ry2 = np.ceil(points.max(axis=0)).astype(int)
+        return max(rx1, 0), max(ry1, 0), min(rx2, w), min(ry2, h)
+
+    def _rectified(self, img, maps, x0, y0, x1, y1):
+        """Rectified gray window [y0:y1, x0:x1]: remap only reads the pixels it needs."""
+        window = cv2.remap(img, maps[0][y0:y1, x0:x1], maps[1][y0:y1, x0:x1], cv2.INTER_LINEAR)
+        return cv2.cvtColor(window, cv2.COLOR_BGR2GRAY) if window.ndim == 3 else window
+
+    def disparity(self, left, right, box):
+        """Disparity (px, float32) over the rectified box, invalid pixels < min_disparity; or None."""
+        bx1, by1, bx2, by2 = self.rectify_box(box)
+        if bx2 - bx1 < 2 or by2 - by1 < 2:
+            return None
+        # Matching a pixel needs the block around it and num_disparities columns to its left
+        pad = self.block_size // 2
+        w, h = self.size
+        x0, x1 = max(bx1 - self.num_disparities - pad, 0), min(bx2 + pad, w)
+        y0, y1 = max(by1 - pad, 0), min(by2 + pad, h)
+        if x1 - x0 <= self.num_disparities + self.block_size:
+            return None
+        left_window = self._rectified(left, self.maps[0], x0, y0, x1, y1)
+        right_window = self._rectified(right, self.maps[1], x0, y0, x1, y1)
+        disparity = self.matcher.compute(left_window, right_window).astype(np.float32) / 16.0
+        return disparity[by1 - y0:by2 - y0, bx1 - x0:bx2 - x0]
+
+    def distance(self, left, right, box):
+        """Range (m) to the object in box (raw left image coordinates), or None if unreliable."""
+        self.runs += 1
+        disparity = self.disparity(left, right, box)
+        if disparity is not None:
+            valid = disparity[disparity >= self.min_disparity]
+            if valid.size >= self.min_valid * disparity.size:
+                return self.focal * self.baseline / float(np.median(valid))
+        self.misses += 1
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stereo calibration from checkerboard image pairs")
+    parser.add_argument("left", help="folder of left camera (camera 0) images")
+    parser.add_argument("right", help="folder of right camera (camera 1) images, same file names")
+    parser.add_argument("--pattern", default="9x6", help="inner corners, columns x rows")
+    parser.add_argument("--square", type=float, default=0.025, help="square side (m)")
+    parser.add_argument("--output", default="../models/stereo.npz")
+    args = parser.parse_args()
+
+    pattern = tuple(int(v) for v in args.pattern.lower().split("x"))
+    calib = calibrate(load_pairs(args.left, args.right), pattern, args.square)
+    np.savez(args.output, **calib)
+    baseline = abs(calib["P2"][0, 3] / calib["P2"][0, 0])
+    print(f"{calib['pairs']} pairs used, reprojection RMS {calib['rms']:.3f} px, "
+          f"baseline {baseline * 100:.1f} cm, focal {calib['P1'][0, 0]:.1f} px")
+    if calib["T"][0, 0] > 0:
+        print("Warning: camera 1 is on the left of camera 0, swap the folders (StereoDepth expects camera 0 left)")
+    print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Live metrics of the running vehicle: stage timers, counters and the stats of the
+pipeline parts, readable during a dive without the imshow window.
+
+    telemetry = Telemetry()
+    t0 = time.perf_counter()
+    ...                                     # one stage of a loop
+    t0 = telemetry.lap("capture", t0)       # records the duration, returns now
+    telemetry.count("commands")
+    telemetry.watch("serial", writer.stats) # called only when a snapshot is taken
+    telemetry.serve(8765)                   # http://127.0.0.1:8765/
+    telemetry.dump(5.0)                     # or the same text printed every 5 s
+
+Every stage keeps its last durations in a ring buffer (history samples); the
+percentiles and the histogram are computed from it when someone asks, so the
+hot path only stores a float. Disabled telemetry is None: the loops check
+`if telemetry is not None`, like the recorder.
+
+Endpoints: / (text), /metrics (JSON) and /events (Server-Sent Events, one JSON
+snapshot per second: new EventSource("http://<pi>:8765/events") in a browser).
+"""
+import os
+import sys
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+
+# Histogram bucket upper bounds (ms), the last bucket is everything above
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class StageHistogram:
+    """Last `history` durations of a stage (s), in a ring buffer."""
+
+    def __init__(self, history=512):
+        self.values = [0.0] * history
+        self.size = history
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, duration):
+        self.values[self.count % self.size] = duration
+        self.count += 1
+        self.total += duration
+
+    def summary(self):
+        n = min(self.count, self.size)
+        if n == 0:
+            return {"count": 0}
+        ms = np.array(self.values[:n]) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        buckets = np.bincount(np.searchsorted(BUCKETS, ms), minlength=len(BUCKETS) + 1)
+        return {"count": self.count, "mean": self.total / self.count * 1000, "p50": float(p50),
+                "p95": float(p95), "p99": float(p99), "max": float(ms.max()),
+                "histogram": dict(zip([f"<{b}" for b in BUCKETS] + [f">={BUCKETS[-1]}"], buckets.tolist()))}
+
+
+class Telemetry:
+    def __init__(self, history=512):
+        self.history = history
+        self.stages = {}
+        self.counters = {}
+        self.watches = {}
+        self.start = time.time()
+        self.server = None
+        self.running = True
+
+    @classmethod
+    def from_env(cls):
+        """
+        ROMARIN_TELEMETRY=<port> serves the endpoints, ROMARIN_TELEMETRY_DUMP=<seconds>
+        prints the text dump; None (disabled) when neither is set.
+        """
+        port, period = os.environ.get("ROMARIN_TELEMETRY"), os.environ.get("ROMARIN_TELEMETRY_DUMP")
+        if not port and not period:
+            return None
+        telemetry = cls()
+        if port:
+            telemetry.serve(int(port), os.environ.get("ROMARIN_TELEMETRY_HOST", "127.0.0.1"))
+        if period:
+            telemetry.dump(float(period))
+        return telemetry
+
+    def add(self, stage, duration):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = StageHistogram(self.history)
+        histogram.add(duration)
+
+    def lap(self, stage, since):
+        """Record the time spent in stage since `since` (perf_counter), return now."""
+        now = time.perf_counter()
+        self.add(stage, now - since)
+        return now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def watch(self, name, stats):
+        """stats: callable returning a dict, merged into every snapshot under name."""
+        self.watches[name] = stats
+
+    def snapshot(self):
+        uptime = time.time() - self.start
+        snapshot = {"time": time.time(), "uptime": uptime, "counters": dict(self.counters),
+                    "rates": {name: value / uptime for name, value in self.counters.items()} if uptime > 0 else {},
+                    "stages": {name: histogram.summary() for name, histogram in list(self.stages.items())}}
+        for name, stats in list(self.watches.items()):
+            try:
+                snapshot[name] = stats()
+            except Exception as e:      # a broken watch must not take the endpoint down
+                snapshot[name] = {"error": repr(e)}
+        return snapshot
+
+    def text(self, snapshot=None):
+        s = snapshot or self.snapshot()
+        lines = [f"uptime {s['uptime']:.0f} s"]
+        if s["counters"]:
+            lines.append("counters: " + ", ".join(f"{name} {value} ({s['rates'].get(name, 0):.1f}/s)"
+                                                  for name, value in s["counters"].items()))
+        for name, h in s["stages"].items():
+            if h["count"]:
+                lines.append(f"  {name:<18} p50 {h['p50']:7.2f}  p95 {h['p95']:7.2f}  p99 {h['p99']:7.2f}  "
+                             f"max {h['max']:7.2f} ms  ({h['count']})")
+        for name in self.watches:
+            stats = s.get(name, {})
+            lines.append(f"{name}: " + ", ".join(f"{k} {v:.3g}" if isinstance(v, float) else f"{k} {v}"
+                                                 for k, v in stats.items()))
+        return "\n".join(lines)
+
+    # ================================================
+    # Outputs
+    # ================================================
+    def serve(self, port=8765, host="127.0.0.1"):
+        """HTTP endpoints in a daemon thread (host="0.0.0.0" to reach them from the surface)."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, content_type):
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    self._send(json.dumps(telemetry.snapshot()), "application/json")
+                elif self.path == "/events":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.send_header("Access-Control-Allow-Origin", "*")
+                    self.end_headers()
+                    try:
+                        while telemetry.running:
+                            self.wfile.write(f"data: {json.dumps(telemetry.snapshot())}\n\n".encode())
+                            self.wfile.flush()
+                            time.sleep(1.0)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                elif self.path == "/":
+                    self._send(telemetry.text() + "\n", "text/plain; charset=utf-8")
+                else:
+                    self.send_error(404)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def dump(self, period=5.0, stream=None):
+        """Print the text snapshot every period seconds (stdout by default), for headless runs."""
+        stream = stream or sys.stdout
+
+        def run():
+            while self.running:
+                time.sleep(period)
+                print(self.text(), file=stream, flush=True)
+
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def close(self):
+        self.running = False
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
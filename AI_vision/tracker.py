@@ -0,0 +1,170 @@
+"""
+Inter-frame target tracker filling the gaps between detections.
+
+A constant-velocity Kalman filter on the box (cx, cy, w, h) predicts the target
+on every captured frame; optionally the box patch is followed with sparse optical
+flow (Lucas-Kanade) for a cheap measurement between detections. Every detection
+re-seeds the filter; a detection of an older frame (the model runs behind the
+capture) is first moved forward to the current state time.
+
+    tracker = TargetTracker()
+    tracker.seed((x1, y1, x2, y2), t)          # on each detection
+    box = tracker.update(frame, t)             # on every frame -> (x1, y1, x2, y2) or None
+"""
+import cv2
+import numpy as np
+
+
+class TargetTracker:
+    def __init__(self, use_flow=True, timeout=1.0, process_noise=50.0,
+                 detection_noise=4.0, flow_noise=16.0):
+        self.use_flow = use_flow
+        self.timeout = timeout              # seconds without detection before the track is dropped
+        self.process_noise = process_noise
+        self.detection_noise = detection_noise
+        self.flow_noise = flow_noise
+
+        self.kf = cv2.KalmanFilter(6, 4)    # state: cx, cy, w, h, vx, vy
+        self.kf.measurementMatrix = np.hstack([np.eye(4), np.zeros((4, 2))]).astype(np.float32)
+        self.active = False
+        self.last_time = 0.0
+        self.last_detection_time = 0.0
+        self.prev_gray = None
+        self.points = None
+
+    # ------------------------------------------------
+    # Kalman helpers
+    # ------------------------------------------------
+    def _predict(self, t):
+        dt = max(t - self.last_time, 0.0)
+        self.last_time = max(t, self.last_time)
+        if dt == 0:
+            return
+        F = np.eye(6, dtype=np.float32)
+        F[0, 4] = F[1, 5] = dt
+        self.kf.transitionMatrix = F
+        q = self.process_noise ** 2
+        # Velocity random walk, integrated into position
+        Q = np.zeros((6, 6), dtype=np.float32)
+        Q[[4, 5], [4, 5]] = q * dt
+        Q[[0, 1], [0, 1]] = q * dt ** 3 / 3
+        Q[[0, 1], [4, 5]] = Q[[4, 5], [0, 1]] = q * dt ** 2 / 2
+        Q[[2, 3], [2, 3]] = q * dt * 0.1
+        self.kf.processNoiseCov = Q
+        self.kf.predict()
+
+    def _sync_prior(self):
+        # cv2 correct() starts from statePre / errorCovPre, which are only refreshed by
+        # predict(): without this a correction at an unchanged time (dt == 0, late
+        # detection) would drop the corrections already applied since the last predict
+        self.kf.statePre = self.kf.statePost.copy()
+        self.kf.errorCovPre = self.kf.errorCovPost.copy()
+
+    def _correct(self, box, noise):
+        x1, y1, x2, y2 = box
+        z = np.array([[(x1 + x2) / 2], [(y1 + y2) / 2], [x2 - x1], [y2 - y1]], dtype=np.float32)
+        self.kf.measurementNoiseCov = np.eye(4, dtype=np.float32) * noise ** 2
+        self._sync_prior()
+        self.kf.correct(z)
+
+    def _advance(self, box, t):
+        """
+        Late detection (from a frame older than the state): moved forward to
+        last_time along the tracked velocity, with the noise grown by the velocity
+        uncertainty and the process noise over the lag. The state is never pulled
+        back to an old position.
+        """
+        lag = self.last_time - t
+        vx, vy = self.velocity
+        x1, y1, x2, y2 = box
+        dx, dy = vx * lag, vy * lag
+        var = (self.detection_noise ** 2 + float(self.kf.errorCovPost[4, 4]) * lag ** 2
+               + self.process_noise ** 2 * lag ** 3 / 3)
+        return (x1 + dx, y1 + dy, x2 + dx, y2 + dy), var ** 0.5
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.kf.statePost[:4, 0]
+        return (float(cx - w / 2), float(cy - h / 2), float(cx + w / 2), float(cy + h / 2))
+
+    @property
+    def center(self):
+        cx, cy = self.kf.statePost[:2, 0]
+        return int(cx), int(cy)
+
+    @property
+    def velocity(self):
+        vx, vy = self.kf.statePost[4:, 0]
+        return float(vx), float(vy)
+
+    # ------------------------------------------------
+    # Public API
+    # ------------------------------------------------
+    def seed(self, box, t):
+        """Feed a detection (x1, y1, x2, y2) taken at time t (may be older than the last frame)."""
+        if not self.active:
+            x1, y1, x2, y2 = box
+            self.kf.statePost = np.array([[(x1 + x2) / 2], [(y1 + y2) / 2], [x2 - x1], [y2 - y1], [0], [0]],
+                                         dtype=np.float32)
+            self.kf.errorCovPost = np.diag([self.detection_noise ** 2] * 4 + [200.0 ** 2] * 2).astype(np.float32)
+            self.last_time = t
+            self.active = True
+        elif t >= self.last_time:
+            self._predict(t)
+            self._correct(box, self.detection_noise)
+        else:
+            self._correct(*self._advance(box, t))
+        self.last_detection_time = max(t, self.last_detection_time)
+        self.points = None  # re-pick flow features on the new box
+
+    def update(self, frame, t):
+        """Advance the track to frame time t, returns the predicted box or None if lost."""
+        if not self.active:
+            return None
+        if t - self.last_detection_time > self.timeout:
+            self.reset()
+            return None
+        prev_box = self.box
+        self._predict(t)
+        if self.use_flow:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            measured = self._flow(gray, prev_box)
+            if measured is not None:
+                self._correct(measured, self.flow_noise)
+            self.prev_gray = gray
+            if self.points is None:
+                self._pick_points(gray)
+        return self.box
+
+    def reset(self):
+        self.active = False
+        self.prev_gray = None
+        self.points = None
+
+    # ------------------------------------------------
+    # Optical flow on the box patch
+    # ------------------------------------------------
+    def _pick_points(self, gray):
+        x1, y1, x2, y2 = (int(v) for v in self.box)
+        h, w = gray.shape
+        x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return
+        points = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], maxCorners=30, qualityLevel=0.01, minDistance=4)
+        if points is not None:
+            self.points = points + np.array([x1, y1], dtype=np.float32)
+
+    def _flow(self, gray, prev_box):
+        """Box measured by moving prev_box with the median feature displacement."""
+        if self.prev_gray is None or self.points is None or len(self.points) < 4:
+            return None
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None,
+                                                   winSize=(15, 15), maxLevel=2)
+        ok = status.ravel() == 1
+        if ok.sum() < 4:
+            self.points = None
+            return None
+        shift = np.median((moved[ok] - self.points[ok]).reshape(-1, 2), axis=0)
+        self.points = moved[ok].reshape(-1, 1, 2)
+        x1, y1, x2, y2 = prev_box
+        return (x1 + shift[0], y1 + shift[1], x2 + shift[0], y2 + shift[1])
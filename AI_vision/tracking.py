@@ -1,34 +1,51 @@
 import cv2
 import numpy as np
 import os
+import time
+import atexit
 import serial
-from pynput import keyboard
+from serialWriter import SerialWriter
+from control import ControlLaw, manual_commands
 
-arduino = serial.Serial(port='COM6', baudrate=9600, timeout=1)
+# Port can be overridden, e.g. with the pty of fakeArduino.py
+arduino = serial.Serial(port=os.environ.get("ROMARIN_PORT", "COM6"), baudrate=9600, timeout=1, write_timeout=0.5)
+
+# The writer thread owns the port; commands are coalesced to the newest speed per motor
+writer = SerialWriter(arduino, rate=float(os.environ.get("ROMARIN_SERIAL_RATE", 20))).start()
+atexit.register(writer.stop)  # flush the last (stop) command on exit
+
+# Control law with dead-band, gains and saturation; direc() is a lookup in its precomputed table
+law = ControlLaw()
+law.build_lut()
+
+# Optional DiveRecorder (recorder.py): every command sent is logged
+recorder = None
 
 def send_command(mot):
     id, speed = (mot)
     if id in [1, 2, 3] and -255 <= speed <= 255:
-        command = f"{id},{speed}\n"
-        arduino.write(command.encode()) # Envoyer la commande encodée en bytes
-
-def direc(x, y, x0, y0, x1, y1, x2, y2):
-    dx, dy = -(x-x0), -(y-y0)
-    tx, ty = abs(x1-x2), abs(y1-y2)
-    if (tx or ty) < 50:
-        if(dx<-10 or dx>10):
-            mot1, mot2 = (1, round(dx*(255/1280))), (2, round(-dx*(255/1280)))
-        if(dy<-10 or dy>10):
-            mot3 = (3,round(dy*(255/480)))
-    else:
-        if(dx<-10 or dx>10):
-            mot1, mot2 = (1, round((dx*(255/1280)/2)+127)), (2, round((-dx*(255/1280))/2+127))
-        if(dy<-10 or dy>10):
-            mot3 = (3,round(dy*(255/480)))
-    return (mot1, mot2, mot3)
+        writer.submit(id, speed)
+        if recorder is not None:
+            recorder.command(time.time(), id, speed)
+
+def send_motors(mot1, mot2, mot3):
+    # One submit for the three motors: the writer never sends half of a command
+    valid = [(id, speed) for id, speed in (mot1, mot2, mot3) if id in [1, 2, 3] and -255 <= speed <= 255]
+    writer.submit_many(valid)
+    if recorder is not None:
+        t = time.time()
+        for id, speed in valid:
+            recorder.command(t, id, speed)
+
+def direc(x, y, x0, y0, x1=None, y1=None, x2=None, y2=None, distance=None):
+    # Target (x, y) -> motor commands; optional box (x1, y1, x2, y2) adds forward thrust when close,
+    # a stereo range (m, see stereo.py) makes the forward thrust follow the distance instead
+    if (x0, y0) != law.center:
+        law.center = (x0, y0)
+        law.lut = None
+    # Box size as the old "(tx or ty) < 50" test: the width, the height only when the width is 0
+    size = None if x1 is None else (abs(x1-x2) or abs(y1-y2))
+    return law.direc(x, y, size, distance)
 
 def telecom(keys):
-    z, q, s, d, c, v, Z, S = keys
-    send_command((3, (c-v)*200))
-    send_command((1, (z+(2*Z)-s-(2*S)+q-d)*125))
-    send_command((2, (z+(2*Z)-s-(2*S)+d-q)*125))
\ No newline at end of file
+    send_motors(*manual_commands(keys))
\ No newline at end of file
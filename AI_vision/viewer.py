@@ -0,0 +1,214 @@
+"""
+Where the annotated frames go: a window, nowhere (headless), or a low-bandwidth
+MJPEG stream that only costs something while someone watches it.
+
+    viewer = open_viewer("Detection")      # from ROMARIN_HEADLESS / ROMARIN_STREAM
+    ...
+    if viewer.wants_frame():               # skip the drawing entirely otherwise
+        draw(img)
+        viewer.show(img)
+    if viewer.poll() == ord('n'):          # waitKey in a window, -1 headless (Ctrl+C to stop)
+        break
+    ...
+    viewer.close()
+
+    listener = start_keyboard(on_press, on_release, viewer)   # manual keys, or None
+
+The stream encodes at most fps frames per second, downscaled to size, on its own
+thread: the main loop only resizes into a small buffer. Open http://<pi>:8080/
+in a browser, or use http://<pi>:8080/stream as an <img> or VLC source.
+"""
+import os
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import cv2
+
+PAGE = b"""<html><head><title>Romarin</title></head>
+<body style="margin:0;background:#000"><img src="/stream" style="width:100%"></body></html>"""
+
+
+class Viewer:
+    """Headless: nothing is drawn or shown."""
+
+    def wants_frame(self):
+        return False
+
+    def show(self, img, name=None):
+        pass
+
+    def poll(self):
+        return -1
+
+    def close(self):
+        pass
+
+
+class WindowViewer(Viewer):
+    """cv2.imshow windows, what the scripts always did."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def wants_frame(self):
+        return True
+
+    def show(self, img, name=None):
+        cv2.imshow(name or self.name, img)
+
+    def poll(self):
+        return cv2.waitKey(1) & 0xFF
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class StreamViewer(Viewer):
+    """
+    MJPEG over HTTP. wants_frame() is True only while a client is connected and
+    the last streamed frame is older than 1 / fps. Only the main image (name None)
+    is streamed.
+    """
+
+    def __init__(self, port=8080, host="0.0.0.0", fps=5.0, size=(320, 240), quality=60):
+        self.period = 1.0 / fps
+        self.size = size
+        self.quality = quality
+        self.next_time = 0.0
+        self.clients = 0
+        self.cond = threading.Condition()
+        self.pending = None       # downscaled frame waiting for the encoder
+        self.jpeg = None
+        self.version = 0
+        self.running = True
+        # Stats
+        self.frames_encoded = 0
+        self.bytes_sent = 0
+        self.encoder = threading.Thread(target=self._encode_loop, daemon=True)
+        self.encoder.start()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def wants_frame(self):
+        return self.clients > 0 and time.monotonic() >= self.next_time
+
+    def show(self, img, name=None):
+        if name is not None or not self.wants_frame():
+            return
+        self.next_time = time.monotonic() + self.period
+        small = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        with self.cond:
+            self.pending = small
+            self.cond.notify_all()
+
+    def _encode_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while self.running:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending is not None or not self.running)
+                small, self.pending = self.pending, None
+            if small is None:
+                continue
+            ok, jpeg = cv2.imencode(".jpg", small, params)
+            if not ok:
+                continue
+            with self.cond:
+                self.jpeg = jpeg.tobytes()
+                self.version += 1
+                self.frames_encoded += 1
+                self.cond.notify_all()
+
+    def _next_jpeg(self, after, timeout=1.0):
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > after or not self.running, timeout)
+            return self.version, self.jpeg
+
+    def _handler(self):
+        viewer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(PAGE)))
+                    self.end_headers()
+                    self.wfile.write(PAGE)
+                elif self.path == "/stream":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    with viewer.cond:
+                        viewer.clients += 1
+                    try:
+                        version = 0
+                        while viewer.running:
+                            new, jpeg = viewer._next_jpeg(version)
+                            if new == version or jpeg is None:
+                                continue
+                            version = new
+                            self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                                             + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                            viewer.bytes_sent += len(jpeg)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+                    finally:
+                        with viewer.cond:
+                            viewer.clients -= 1
+                else:
+                    self.send_error(404)
+
+        return Handler
+
+    def stats(self):
+        return {"clients": self.clients, "frames_encoded": self.frames_encoded, "bytes_sent": self.bytes_sent}
+
+    def close(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_keyboard(on_press, on_release, viewer=None):
+    """
+    pynput listener for the manual control keys, started in the background, or None
+    when headless (nobody at the keyboard) or when pynput can't load: its X backend
+    raises at import time without a display, so it is only imported here.
+    """
+    if viewer is not None and type(viewer) is Viewer:
+        return None
+    try:
+        from pynput import keyboard
+        listener = keyboard.Listener(on_press=on_press, on_release=on_release)
+    except Exception as e:
+        print(f"Manual keys disabled: {e!r}")
+        return None
+    listener.daemon = True
+    listener.start()
+    return listener
+
+
+def open_viewer(name):
+    """
+    ROMARIN_STREAM=<port> streams the annotated frames (ROMARIN_STREAM_FPS,
+    ROMARIN_STREAM_WIDTH, default 5 fps at 320 px wide), ROMARIN_HEADLESS=1 shows
+    nothing; otherwise a window, unless there is no display to open it on.
+    """
+    port = os.environ.get("ROMARIN_STREAM")
+    if port:
+        width = int(os.environ.get("ROMARIN_STREAM_WIDTH", 320))
+        return StreamViewer(int(port), fps=float(os.environ.get("ROMARIN_STREAM_FPS", 5)),
+                            size=(width, width * 3 // 4))
+    no_display = sys.platform.startswith("linux") and not (os.environ.get("DISPLAY")
+                                                           or os.environ.get("WAYLAND_DISPLAY"))
+    if os.environ.get("ROMARIN_HEADLESS", "0") != "0" or no_display:
+        return Viewer()
+    return WindowViewer(name)
@@ -1,11 +1,18 @@
-from ultralytics import YOLO
 import cv2
 import math
 import tracking as tr
 import threading
-from pynput import keyboard
 import pdb
 import time
+from detector import OnnxDetector, MotionGate
+from frameSource import VideoCaptureSource
+from tracker import TargetTracker
+from multiTracker import MultiTracker
+from scheduler import DetectionScheduler
+from viewer import open_viewer, start_keyboard
+
+# Enable sorting (only track "cell phone" detections)
+sorting = True
 
 # mode de controle
 keys = {'z': 0, 'q': 0, 's': 0, 'd': 0, 'c': 0, 'v': 0, 'Z': 0, 'S': 0}
@@ -24,76 +31,85 @@ def on_release(key):
     except AttributeError:
         pass
 
-# Démarrer l'écouteur clavier en arrière-plan
-listener = keyboard.Listener(on_press=on_press, on_release=on_release)
-listener.daemon = True
-listener.start()
+# Window, or headless / MJPEG stream (viewer.py): nothing is drawn when nobody watches
+viewer = open_viewer('Webcam')
+
+# Démarrer l'écouteur clavier en arrière-plan (aucun en mode headless)
+listener = start_keyboard(on_press, on_release, viewer)
 
 # start webcam
-cap = cv2.VideoCapture(0)
-cap.set(3, 640)
-cap.set(4, 480)
+source = VideoCaptureSource(0, size=(640, 480))
 
-model = YOLO("yolov8n.pt")
-# model = YOLO("best.pt")
+model = OnnxDetector("../models/best.onnx")  # ONNX Runtime, no torch needed
+# Reuse the previous detections while the scene doesn't change (at most 1 s)
+gate = MotionGate(model, threshold=0.005, max_staleness=1.0)
 
 # object classes
 classNames = model.names
 
+# The scheduler picks the frames that go through the model (latency and CPU
+# budgets, target motion), the tracker updates the target in between
+scheduler = DetectionScheduler(latency_budget=0.3, cpu_budget=0.7)
+tracker = TargetTracker()
+# Persistent track ids: stick with the same object instead of the first box found
+mot = MultiTracker()
+target_id = None
+target_label = None
+
 while True:
     if 1 in keys.values():
             tr.telecom(list(keys.values()))
     
     else:
         tr.telecom(list(keys.values()))
-        success, img = cap.read()
-        results = model(img, stream=True)
-
-        # coordinates
-        for r in results:
-            boxes = r.boxes
-
-            for box in boxes:
-                cls = int(box.cls[0])
-                if classNames[cls] == "cell phone":
-                    # bounding box
-                    x1, y1, x2, y2 = box.xyxy[0]
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)  # convert to int values
-
-                    # draw bounding box
-                    cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
-
-                    # compute and draw center point
-                    center_x = int((x1 + x2) / 2)
-                    center_y = int((y1 + y2) / 2)
-                    cv2.circle(img, (center_x, center_y), radius=3, color=(0, 0, 255), thickness=-1)
-
-                    mot1, mot2, mot3 = tr.direc(center_x, center_y, 320, 240)
-                    tr.send_command(mot1)
-                    tr.send_command(mot2)
-                    tr.send_command(mot3)
-
-                    # confidence
-                    confidence = math.ceil((box.conf[0] * 100)) / 100
-                    #print("Confidence --->", confidence)
-
-                    # class name
-                    #print("Class name -->", classNames[cls])
-
-                    # object details text
-                    org = [x1, y1]
-                    font = cv2.FONT_HERSHEY_SIMPLEX
-                    fontScale = 1
-                    color = (255, 255, 255)
-                    thickness = 2
-                    cv2.putText(img, classNames[cls], org, font, fontScale, color, thickness)
-
-    cv2.imshow('Webcam', img)
-    if cv2.waitKey(1) == ord('n'):
-        tr.send_command((1, 0))
-        tr.send_command((2, 0))
-        tr.send_command((3, 0))
+        success, img, now = source.read()
+
+        if scheduler.should_detect(now):
+            # coordinates
+            t0 = time.time()
+            detections = gate(img)
+            scheduler.record_inference(now, time.time() - t0, gate.reused)
+            mot.update([det for det in detections if not sorting or classNames[det[5]] == "cell phone"])
+            track = mot.select()
+            if track is not None and track.misses == 0:
+                if track.id != target_id:
+                    target_id = track.id
+                    tracker.reset()
+                tracker.seed(track.box, now)
+                target_label = f"{classNames[track.cls]} #{track.id}"
+
+        box = tracker.update(img, now)
+        scheduler.update_target(box, now, tracker.velocity if box is not None else None)
+        if box is not None:
+            # bounding box
+            x1, y1, x2, y2 = (int(v) for v in box)  # convert to int values
+
+            # compute center point
+            center_x, center_y = tracker.center
+
+            mot1, mot2, mot3 = tr.direc(center_x, center_y, 320, 240)
+            tr.send_motors(mot1, mot2, mot3)
+            scheduler.record_command(time.time())
+
+            if viewer.wants_frame():
+                # draw bounding box and center point
+                cv2.rectangle(img, (x1, y1), (x2, y2), (255, 0, 0), 3)
+                cv2.circle(img, (center_x, center_y), radius=3, color=(0, 0, 255), thickness=-1)
+
+                # object details text
+                org = [x1, y1]
+                font = cv2.FONT_HERSHEY_SIMPLEX
+                fontScale = 1
+                color = (255, 255, 255)
+                thickness = 2
+                cv2.putText(img, target_label, org, font, fontScale, color, thickness)
+
+        viewer.show(img)
+    if viewer.poll() == ord('n'):
+        tr.send_motors((1, 0), (2, 0), (3, 0))
         break
 
-cap.release()
-cv2.destroyAllWindows()
+print(scheduler.metrics())
+print(gate.stats())
+source.close()
+viewer.close()
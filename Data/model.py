@@ -4,6 +4,13 @@ import os
 # Load the YOLOv8 model
 model = YOLO("../models/best.pt")
 
+# Smaller input export, used by the runtime on ROI crops around a locked target
+roi_export = model.export(format="onnx", opset=12, imgsz=320)
+roi_export = roi_export if isinstance(roi_export, str) else roi_export[0]
+roi_path = os.path.join(os.path.dirname(roi_export), "best_320.onnx")
+os.replace(roi_export, roi_path)
+print(f"✅ ROI model exported to ONNX format: {roi_path}")
+
 # Export to ONNX format
 exported_model = model.export(format="onnx", opset=12)
 
@@ -11,6 +18,7 @@ exported_model = model.export(format="onnx", opset=12)
 onnx_path = exported_model if isinstance(exported_model, str) else exported_model[0]
 
 print(f"✅ Model exported to ONNX format: {onnx_path}")
+print("ℹ️ Run 'python quantize.py --frames <recorded frames>' to build the INT8 model and its accuracy report.")
 
 # OPTIONAL: Launch Netron to visualize the model
 try:
@@ -0,0 +1,186 @@
+"""
+Static INT8 quantization of the exported ONNX model, with an accuracy report.
+
+    python quantize.py --frames ../dataset/frames
+
+Frames are split into a calibration set and a held-out set. The held-out set is
+run through both the FP32 and INT8 models: if YOLO label files exist next to the
+frames (<frames>/labels/<name>.txt) they are the ground truth, otherwise the FP32
+detections are. The report (mAP@0.5, recall, latency) is saved as JSON next to
+the INT8 model.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                      quantize_static, CalibrationMethod)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AI_vision"))
+from detector import OnnxDetector
+from boxes import iou_matrix
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def list_frames(folder):
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+class FrameReader(CalibrationDataReader):
+    """Feeds letterboxed frames to the calibrator, using the detector's own preprocessing."""
+
+    def __init__(self, detector, paths):
+        self.detector = detector
+        self.input_name = detector.session.get_inputs()[0].name
+        self.paths = iter(paths)
+
+    def get_next(self):
+        path = next(self.paths, None)
+        if path is None:
+            return None
+        self.detector.preprocess(cv2.imread(path))
+        return {self.input_name: self.detector.input.copy()}
+
+
+def load_labels(path, shape):
+    """YOLO label file (cls cx cy w h, normalized) -> (N, 4) xyxy boxes and (N,) classes."""
+    if not os.path.exists(path):
+        return None
+    data = np.loadtxt(path, ndmin=2)
+    if data.size == 0:
+        return np.zeros((0, 4)), np.zeros(0, dtype=int)
+    h, w = shape[:2]
+    cx, cy, bw, bh = data[:, 1] * w, data[:, 2] * h, data[:, 3] * w, data[:, 4] * h
+    boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+    return boxes, data[:, 0].astype(int)
+
+
+def evaluate(predictions, ground_truth, iou_threshold=0.5):
+    """
+    predictions / ground_truth: per image, (boxes, classes[, scores]).
+    Returns mAP@iou_threshold and recall over all classes.
+    """
+    classes = set()
+    for boxes, cls in ground_truth:
+        classes.update(cls.tolist())
+    aps, hits, total = [], 0, 0
+    for c in sorted(classes):
+        scores, matched, n_gt = [], [], 0
+        for (pb, pc, ps), (gb, gc) in zip(predictions, ground_truth):
+            pb, ps = pb[pc == c], ps[pc == c]
+            gb = gb[gc == c]
+            n_gt += len(gb)
+            order = ps.argsort()[::-1]
+            pb, ps = pb[order], ps[order]
+            used = np.zeros(len(gb), dtype=bool)
+            ious = iou_matrix(pb, gb) if len(pb) and len(gb) else np.zeros((len(pb), 0))
+            for i in range(len(pb)):
+                j = ious[i].argmax() if ious.shape[1] else -1
+                ok = j >= 0 and ious[i, j] >= iou_threshold and not used[j]
+                if ok:
+                    used[j] = True
+                scores.append(ps[i])
+                matched.append(ok)
+        if n_gt == 0:
+            continue
+        order = np.argsort(scores)[::-1]
+        tp = np.cumsum(np.array(matched, dtype=float)[order])
+        fp = np.cumsum(1 - np.array(matched, dtype=float)[order])
+        recall = tp / n_gt
+        precision = tp / np.maximum(tp + fp, 1e-9)
+        # All-point interpolated AP
+        r = np.concatenate([[0], recall, [1]])
+        p = np.concatenate([[1], precision, [0]])
+        p = np.maximum.accumulate(p[::-1])[::-1]
+        aps.append(float(np.sum((r[1:] - r[:-1]) * p[1:])))
+        hits += int(tp[-1]) if len(tp) else 0
+        total += n_gt
+    return {"mAP50": float(np.mean(aps)) if aps else 0.0,
+            "recall": hits / total if total else 0.0}
+
+
+def run_model(detector, paths):
+    """Returns per image (boxes, classes, scores) and the mean latency in ms."""
+    predictions, times = [], []
+    for path in paths:
+        img = cv2.imread(path)
+        t0 = time.perf_counter()
+        dets = detector(img)
+        times.append(time.perf_counter() - t0)
+        arr = np.array(dets, dtype=np.float64).reshape(-1, 6)
+        predictions.append((arr[:, :4], arr[:, 5].astype(int), arr[:, 4]))
+    return predictions, 1000 * float(np.mean(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static INT8 quantization of the ONNX detector")
+    parser.add_argument("--model", default="../models/best.onnx")
+    parser.add_argument("--output", default="../models/best_int8.onnx")
+    parser.add_argument("--frames", default="../dataset/frames", help="folder of recorded frames")
+    parser.add_argument("--calibration", type=int, default=200, help="max frames used for calibration")
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of frames kept for evaluation")
+    args = parser.parse_args()
+
+    paths = list_frames(args.frames)
+    if len(paths) < 2:
+        sys.exit(f"Need recorded frames in {args.frames}")
+    # Spread held-out frames over the whole dive instead of taking the tail
+    step = max(2, round(1 / args.holdout))
+    heldout = paths[::step]
+    held = set(heldout)
+    calibration = [p for p in paths if p not in held][:args.calibration]
+    print(f"{len(calibration)} calibration frames, {len(heldout)} held-out frames")
+
+    fp32 = OnnxDetector(args.model)
+    quantize_static(args.model, args.output, FrameReader(fp32, calibration),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax)
+    print(f"✅ INT8 model written to {args.output}")
+
+    int8 = OnnxDetector(args.output)
+    fp32_pred, fp32_ms = run_model(fp32, heldout)
+    int8_pred, int8_ms = run_model(int8, heldout)
+
+    label_dir = os.path.join(args.frames, "labels")
+    ground_truth = []
+    for path, (boxes, cls, _) in zip(heldout, fp32_pred):
+        name = os.path.splitext(os.path.basename(path))[0] + ".txt"
+        labels = load_labels(os.path.join(label_dir, name), cv2.imread(path).shape)
+        ground_truth.append(labels)
+    if all(labels is not None for labels in ground_truth):
+        reference = "labels"
+    else:
+        reference = "fp32"
+        ground_truth = [(boxes, cls) for boxes, cls, _ in fp32_pred]
+
+    report = {
+        "reference": reference,
+        "frames": len(heldout),
+        "fp32": {**evaluate(fp32_pred, ground_truth), "latency_ms": fp32_ms},
+        "int8": {**evaluate(int8_pred, ground_truth), "latency_ms": int8_ms},
+    }
+    report["speedup"] = fp32_ms / int8_ms if int8_ms else 0.0
+    report["mAP50_drift"] = report["int8"]["mAP50"] - report["fp32"]["mAP50"]
+    report["recall_drift"] = report["int8"]["recall"] - report["fp32"]["recall"]
+
+    report_path = os.path.splitext(args.output)[0] + "_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Reference: {reference} ({len(heldout)} frames)")
+    for name in ("fp32", "int8"):
+        r = report[name]
+        print(f"  {name}: mAP50 {r['mAP50']:.3f}  recall {r['recall']:.3f}  {r['latency_ms']:.1f} ms/frame")
+    print(f"  speedup x{report['speedup']:.2f}, mAP50 drift {report['mAP50_drift']:+.3f}, "
+          f"recall drift {report['recall_drift']:+.3f}")
+    print(f"📄 Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AI_vision"))
+from tracker import TargetTracker
+
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+FPS = 30
+
+
+def flow_tracked(flow_noise=2.0):
+    """
+    Track still at x1 = 150 for 1 s, then followed by the flow only (no detection)
+    to x1 = 196 in 0.2 s, the state the late detections of that motion arrive on.
+    """
+    tracker = TargetTracker(flow_noise=flow_noise)
+    tracker._flow = lambda gray, prev_box: None
+    tracker.seed((150, 200, 190, 240), 0.0)
+    for i in range(1, FPS + 1):
+        tracker.update(FRAME, i / FPS)
+        if i % 3 == 0:
+            tracker.seed((150, 200, 190, 240), i / FPS)
+    for i in range(1, 7):
+        x = 150 + 46 * i / 6
+        tracker._flow = lambda gray, prev_box, x=x: (x, 200, x + 40, 240)
+        tracker.update(FRAME, 1 + i / FPS)
+    return tracker, 1 + 6 / FPS
+
+
+def consistent(tracker, lag):
+    """Detection at last_time - lag exactly on the current track."""
+    vx, vy = tracker.velocity
+    x1, y1, x2, y2 = tracker.box
+    return (x1 - vx * lag, y1 - vy * lag, x2 - vx * lag, y2 - vy * lag)
+
+
+def test_detection_on_the_track_keeps_the_flow_correction():
+    for lag in (0.0, 0.1, 0.2):
+        tracker, t = flow_tracked()
+        before = tracker.box
+        tracker.seed(consistent(tracker, lag), t - lag)
+        assert np.allclose(tracker.box, before, atol=0.5), (lag, before, tracker.box)
+
+
+def test_late_seeds_do_not_overshoot():
+    for lag in (0.0, 0.1, 0.2):
+        tracker, t = flow_tracked()
+        before = tracker.box[0]
+        x1 = consistent(tracker, lag)[0] + 10   # detection 10 px ahead of the track
+        tracker.seed((x1, 200, x1 + 40, 240), t - lag)
+        assert before <= tracker.box[0] <= before + 10, (lag, before, tracker.box)